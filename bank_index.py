@@ -0,0 +1,337 @@
+import argparse
+import json
+import os
+import re
+import sqlite3
+import zipfile
+from collections import namedtuple
+
+from file_scan import chunks, file_digest, find_files, map_chunks
+
+# Default database, kept in the working directory
+DEFAULT_DB = "vitalbanks.sqlite"
+_INDEX_VERSION = 1
+
+# Banks per task handed to each worker process
+_CHUNK_SIZE = 4
+
+OPERATORS = ("=", "!=", "<", "<=", ">", ">=")
+_CONDITION_RE = re.compile(r"^\s*(\w+)\s*(<=|>=|!=|=|<|>)\s*(\S+)\s*$")
+
+# Built after the bulk load on a fresh index, which is far faster than keeping it up to date row by row
+_SETTINGS_VALUE_INDEX = "CREATE INDEX IF NOT EXISTS settings_value ON settings (key_id, value)"
+_CACHE_KIB = 65536
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS banks ("
+    "id INTEGER PRIMARY KEY, path TEXT UNIQUE NOT NULL, size INTEGER NOT NULL, "
+    "mtime_ns INTEGER NOT NULL, digest TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS presets ("
+    "id INTEGER PRIMARY KEY, bank_id INTEGER NOT NULL, member TEXT NOT NULL, preset_style TEXT)",
+    "CREATE INDEX IF NOT EXISTS presets_bank ON presets (bank_id)",
+    "CREATE INDEX IF NOT EXISTS presets_style ON presets (preset_style)",
+    "CREATE TABLE IF NOT EXISTS setting_keys (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS settings ("
+    "preset_id INTEGER NOT NULL, key_id INTEGER NOT NULL, value REAL NOT NULL, "
+    "PRIMARY KEY (preset_id, key_id)) WITHOUT ROWID",
+    "CREATE TABLE IF NOT EXISTS modulations ("
+    "preset_id INTEGER NOT NULL, destination TEXT NOT NULL, source TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS modulations_preset ON modulations (preset_id)",
+    "CREATE INDEX IF NOT EXISTS modulations_source ON modulations (source, destination)",
+    "CREATE INDEX IF NOT EXISTS modulations_destination ON modulations (destination)",
+)
+
+class PresetRef(namedtuple("PresetRef", ["bank", "member", "preset_style"])):
+    """A preset inside an indexed bank, read from the bank only when asked"""
+    __slots__ = ()
+
+    def read(self):
+        """The member's raw .vital bytes"""
+        with zipfile.ZipFile(self.bank) as zipf:
+            return zipf.read(self.member)
+
+    def load(self):
+        """The parsed preset dict"""
+        return json.loads(self.read())
+
+def _is_preset_member(name):
+    return name.endswith(".vital") and "/Presets/" in f"/{name}"
+
+def read_bank(filepath):
+    """Parse every Presets/*.vital member of a bank.
+
+    Returns a list of (member, preset_style, [(setting, value), ...],
+    [(destination, source), ...]) with every numeric scalar setting and
+    every non-empty modulation routing. Members are read one at a time.
+    """
+    presets = []
+    with zipfile.ZipFile(filepath) as zipf:
+        for zinfo in zipf.infolist():
+            if not _is_preset_member(zinfo.filename):
+                continue
+            preset = json.loads(zipf.read(zinfo))
+            settings = preset.get("settings", {})
+            values = [(key, float(value)) for key, value in settings.items()
+                      if type(value) in (float, int, bool)]
+            routings = [(modulation.get("destination", ""), modulation.get("source", ""))
+                        for modulation in settings.get("modulations", ())]
+            presets.append((zinfo.filename, preset.get("preset_style"), values,
+                            [routing for routing in routings if routing[0] and routing[1]]))
+    return presets
+
+def _read_banks(items):
+    """Hash and read_bank each (path, size, mtime_ns, known digest) of a worker's chunk.
+
+    Returns (path, (size, mtime_ns, digest), presets, error) per bank, with
+    presets None for a bank whose digest is still the known one and error
+    a string for a bank that could not be read.
+    """
+    results = []
+    for path, size, mtime_ns, known_digest in items:
+        try:
+            digest = file_digest(path)
+            presets = None if digest == known_digest else read_bank(path)
+            results.append((path, (size, mtime_ns, digest), presets, None))
+        except Exception as e:
+            results.append((path, None, None, str(e)))
+    return results
+
+def find_banks(root_dir):
+    """Yield every .vitalbank file under `root_dir`"""
+    return find_files(root_dir, (".vitalbank",))
+
+class BankIndex:
+    """SQLite index of the presets inside .vitalbank files.
+
+    Each indexed preset keeps its bank and member name, its preset_style,
+    every numeric scalar setting and every modulation routing, so queries
+    run against indexes instead of opening banks. Banks are re-read only
+    when their content hash changes. A bank whose size and mtime still
+    match is not even hashed.
+    """
+
+    def __init__(self, path=DEFAULT_DB, rebuild=False):
+        self.path = path
+        self._db = sqlite3.connect(path)
+        if rebuild or self._db.execute("PRAGMA user_version").fetchone()[0] != _INDEX_VERSION:
+            for table in ("banks", "presets", "setting_keys", "settings", "modulations"):
+                self._db.execute(f"DROP TABLE IF EXISTS {table}")
+        for statement in _SCHEMA:
+            self._db.execute(statement)
+        self._db.execute(_SETTINGS_VALUE_INDEX)
+        self._db.execute(f"PRAGMA cache_size = -{_CACHE_KIB}")
+        self._db.execute(f"PRAGMA user_version = {_INDEX_VERSION}")
+        self._db.commit()
+        self._key_ids = dict(self._db.execute("SELECT name, id FROM setting_keys"))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self._db.commit()
+        self._db.close()
+
+    def _key_id(self, name):
+        key_id = self._key_ids.get(name)
+        if key_id is None:
+            key_id = self._key_ids[name] = self._db.execute(
+                "INSERT INTO setting_keys (name) VALUES (?)", (name,)).lastrowid
+        return key_id
+
+    def _remove_bank(self, bank_id):
+        preset_ids = "SELECT id FROM presets WHERE bank_id = ?"
+        self._db.execute(f"DELETE FROM settings WHERE preset_id IN ({preset_ids})", (bank_id,))
+        self._db.execute(f"DELETE FROM modulations WHERE preset_id IN ({preset_ids})", (bank_id,))
+        self._db.execute("DELETE FROM presets WHERE bank_id = ?", (bank_id,))
+        self._db.execute("DELETE FROM banks WHERE id = ?", (bank_id,))
+
+    def _store_bank(self, path, entry, presets):
+        """Replace whatever is indexed for `path` with `presets` (see read_bank)"""
+        row = self._db.execute("SELECT id FROM banks WHERE path = ?", (path,)).fetchone()
+        if row is not None:
+            self._remove_bank(row[0])
+        bank_id = self._db.execute("INSERT INTO banks (path, size, mtime_ns, digest) VALUES (?, ?, ?, ?)",
+                                   (path, *entry)).lastrowid
+        key_ids = self._key_ids
+        setting_rows = []
+        routing_rows = []
+        for member, preset_style, values, routings in presets:
+            preset_id = self._db.execute("INSERT INTO presets (bank_id, member, preset_style) VALUES (?, ?, ?)",
+                                         (bank_id, member, preset_style)).lastrowid
+            setting_rows.extend((preset_id, key_ids.get(key) or self._key_id(key), value) for key, value in values)
+            routing_rows.extend((preset_id, destination, source) for destination, source in routings)
+        self._db.executemany("INSERT OR REPLACE INTO settings VALUES (?, ?, ?)", setting_rows)
+        self._db.executemany("INSERT INTO modulations VALUES (?, ?, ?)", routing_rows)
+
+    def update(self, paths, jobs=None, prune=False):
+        """Index new and changed banks among `paths` in `jobs` processes (default: one per CPU).
+
+        Banks indexed before are kept unless `prune` is given: True forgets
+        every indexed bank that is not among `paths`, a directory only
+        those under it.
+
+        Returns a summary counting banks scanned, indexed, unchanged (same
+        size and mtime, or same content hash), removed (by `prune`) and
+        failed, the presets indexed, and (path, error) for every failure.
+        A bank that fails to read loses whatever was indexed for it before.
+        """
+        jobs = jobs or os.cpu_count() or 1
+        summary = {"scanned": 0, "indexed": 0, "unchanged": 0, "removed": 0, "failed": 0, "presets": 0, "errors": []}
+        known = {path: (bank_id, (size, mtime_ns, digest)) for bank_id, path, size, mtime_ns, digest
+                 in self._db.execute("SELECT id, path, size, mtime_ns, digest FROM banks")}
+        seen = set()
+        if not known:
+            self._db.execute("DROP INDEX IF EXISTS settings_value")
+
+        def pending():
+            for path in paths:
+                path = os.path.abspath(path)
+                if path in seen:
+                    continue
+                seen.add(path)
+                summary["scanned"] += 1
+                bank_id, entry = known.get(path, (None, None))
+                try:
+                    st = os.stat(path)
+                except OSError as e:
+                    # Deleted or unreadable since the scan found it
+                    fail(path, bank_id, str(e))
+                    continue
+                if entry is not None and entry[:2] == (st.st_size, st.st_mtime_ns):
+                    summary["unchanged"] += 1
+                    continue
+                # Hashed in the worker, which skips reading a bank that was only touched
+                yield path, st.st_size, st.st_mtime_ns, entry[2] if entry is not None else None
+
+        def fail(path, bank_id, error):
+            # A bank that can no longer be read keeps none of its old rows
+            if bank_id is not None:
+                self._remove_bank(bank_id)
+            summary["failed"] += 1
+            summary["errors"].append((path, error))
+
+        def store(results):
+            for path, entry, presets, error in results:
+                bank_id = known.get(path, (None,))[0]
+                if error is not None:
+                    fail(path, bank_id, error)
+                    continue
+                if presets is None:
+                    # Touched but not changed
+                    self._db.execute("UPDATE banks SET size = ?, mtime_ns = ? WHERE id = ?", (*entry[:2], bank_id))
+                    summary["unchanged"] += 1
+                    continue
+                self._store_bank(path, entry, presets)
+                summary["indexed"] += 1
+                summary["presets"] += len(presets)
+            self._db.commit()
+
+        for results in map_chunks(_read_banks, chunks(pending(), _CHUNK_SIZE), jobs):
+            store(results)
+
+        if prune is not False:
+            root = None if prune is True else os.path.join(os.path.abspath(prune), "")
+            for path, (bank_id, _) in known.items():
+                if path not in seen and (root is None or path.startswith(root)):
+                    self._remove_bank(bank_id)
+                    summary["removed"] += 1
+        self._db.execute(_SETTINGS_VALUE_INDEX)
+        self._db.commit()
+        return summary
+
+    def update_dir(self, root_dir, jobs=None):
+        """update() with every bank under `root_dir`, forgetting indexed banks under it that are gone"""
+        return self.update(find_banks(root_dir), jobs, prune=root_dir)
+
+    def query(self, preset_style=None, conditions=(), routings=(), limit=None):
+        """Return PresetRefs of the indexed presets that match every filter.
+
+        `conditions` are (setting, operator, value) with an operator from
+        OPERATORS, e.g. ("filter_1_cutoff", "<", 40). `routings` are
+        (destination, source) pairs that must all be routed, either side
+        None to match any. Results are ordered by bank and member.
+        """
+        clauses = []
+        params = []
+        if preset_style is not None:
+            clauses.append("p.preset_style = ?")
+            params.append(preset_style)
+        for key, operator, value in conditions:
+            if operator not in OPERATORS:
+                raise ValueError(f"Unknown operator: {operator}")
+            key_id = self._key_ids.get(key)
+            if key_id is None:
+                return []
+            clauses.append(f"p.id IN (SELECT preset_id FROM settings WHERE key_id = ? AND value {operator} ?)")
+            params.extend((key_id, value))
+        for destination, source in routings:
+            match = []
+            if destination is not None:
+                match.append("destination = ?")
+                params.append(destination)
+            if source is not None:
+                match.append("source = ?")
+                params.append(source)
+            if match:
+                clauses.append(f"p.id IN (SELECT preset_id FROM modulations WHERE {' AND '.join(match)})")
+            else:
+                clauses.append("p.id IN (SELECT preset_id FROM modulations)")
+        sql = ("SELECT b.path, p.member, p.preset_style FROM presets p JOIN banks b ON b.id = p.bank_id"
+               + (" WHERE " + " AND ".join(clauses) if clauses else "")
+               + " ORDER BY b.path, p.member")
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [PresetRef(*row) for row in self._db.execute(sql, params)]
+
+    def stats(self):
+        """Number of banks, presets and setting values indexed"""
+        return {table: self._db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ("banks", "presets", "settings", "modulations")}
+
+def parse_condition(text):
+    """Parse a "setting<op>value" condition such as "filter_1_cutoff<40" into (setting, op, value)"""
+    match = _CONDITION_RE.match(text)
+    if match is None:
+        raise ValueError(f"Expected SETTING<op>VALUE with op one of {' '.join(OPERATORS)}: {text!r}")
+    key, operator, value = match.groups()
+    return key, operator, float(value)
+
+def parse_routing(text):
+    """Parse "destination:source" into a routing filter; an empty or * side matches any"""
+    destination, _, source = text.partition(":")
+    return destination if destination not in ("", "*") else None, source if source not in ("", "*") else None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Index the presets inside .vitalbank files and query them")
+    parser.add_argument("--db", default=DEFAULT_DB, help=f"index database (default: {DEFAULT_DB})")
+    commands = parser.add_subparsers(dest="command", required=True)
+    index_parser = commands.add_parser("index", help="index new and changed banks under a directory")
+    index_parser.add_argument("root", help="directory to scan for .vitalbank files")
+    index_parser.add_argument("-j", "--jobs", type=int, default=None, help="worker processes (default: one per CPU)")
+    index_parser.add_argument("--rebuild", action="store_true", help="discard the index and re-read every bank")
+    query_parser = commands.add_parser("query", help="list bank and member of every matching preset")
+    query_parser.add_argument("--style", default=None, help="preset_style to match")
+    query_parser.add_argument("--where", action="append", default=[], type=parse_condition, metavar="SETTING<op>VALUE",
+                              help="setting condition, e.g. 'filter_1_cutoff<40' (repeatable)")
+    query_parser.add_argument("--routing", action="append", default=[], type=parse_routing, metavar="DESTINATION:SOURCE",
+                              help="modulation routing, either side * for any (repeatable)")
+    query_parser.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    with BankIndex(args.db, rebuild=args.command == "index" and args.rebuild) as index:
+        if args.command == "index":
+            summary = index.update_dir(args.root, args.jobs)
+            for path, error in summary["errors"]:
+                print(f"Error indexing {path}: {error}")
+            print(f"Scanned {summary['scanned']} banks: {summary['indexed']} indexed ({summary['presets']} presets), "
+                  f"{summary['unchanged']} unchanged, {summary['removed']} removed, {summary['failed']} failed")
+        else:
+            for ref in index.query(args.style, args.where, args.routing, args.limit):
+                print(f"{ref.bank}\t{ref.member}")
+
+if __name__ == "__main__":
+    main()
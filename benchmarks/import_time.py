@@ -0,0 +1,84 @@
+"""Import-time benchmark for the generator modules.
+
+Imports each module in fresh interpreters and prints JSON with the median and
+minimum cumulative import time reported by `python -X importtime`, with and
+without cached bytecode, plus the time to the first generated preset (which
+includes loading the wavetable payload).
+
+    python benchmarks/import_time.py [--runs N]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ["random_vital_preset", "random_preset_generator_app"]
+
+FIRST_PRESET = (
+    "import time; t = time.perf_counter(); import random_vital_preset as r; "
+    "r.generate_random_preset(seed=0); print((time.perf_counter() - t) * 1e6)"
+)
+
+def _run(args, cache_dir):
+    """Run the interpreter with bytecode cached in `cache_dir`, or without bytecode when None"""
+    env = dict(os.environ)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    if cache_dir:
+        # Private cache dir so runs neither reuse nor leave stale .pyc files
+        env["PYTHONPYCACHEPREFIX"] = cache_dir
+    else:
+        env["PYTHONDONTWRITEBYTECODE"] = "1"
+        env.pop("PYTHONPYCACHEPREFIX", None)
+    return subprocess.run([sys.executable, *args], cwd=REPO_ROOT, env=env,
+                          capture_output=True, text=True, check=True)
+
+def import_time_us(module, cache_dir):
+    """Cumulative import time of `module` in microseconds"""
+    result = _run(["-X", "importtime", "-c", f"import {module}"], cache_dir)
+    for line in reversed(result.stderr.splitlines()):
+        fields = [field.strip() for field in line.split("|")]
+        if len(fields) == 3 and fields[2] == module:
+            return int(fields[1])
+    raise RuntimeError(f"no importtime line for {module}")
+
+def first_preset_us(cache_dir):
+    return float(_run(["-c", FIRST_PRESET], cache_dir).stdout)
+
+def _summary(samples):
+    return {"median_us": statistics.median(samples), "min_us": min(samples), "runs": len(samples)}
+
+def run(runs=10):
+    results = {"python": sys.version.split()[0], "modules": {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode, cache_dir in (("bytecode", tmp), ("no_bytecode", None)):
+            if cache_dir:
+                # Warm the bytecode cache once
+                for module in MODULES:
+                    try:
+                        import_time_us(module, cache_dir)
+                    except subprocess.CalledProcessError:
+                        pass
+            for module in MODULES:
+                entry = results["modules"].setdefault(module, {})
+                try:
+                    entry[mode] = _summary([import_time_us(module, cache_dir) for _ in range(runs)])
+                except subprocess.CalledProcessError as e:
+                    # e.g. tkinter missing on a headless box
+                    entry[mode] = {"error": e.stderr.strip().splitlines()[-1]}
+            results.setdefault("first_preset", {})[mode] = _summary([first_preset_us(cache_dir) for _ in range(runs)])
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args(argv)
+    json.dump(run(args.runs), sys.stdout, indent=2)
+    print()
+
+if __name__ == "__main__":
+    main()
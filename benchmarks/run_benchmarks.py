@@ -0,0 +1,349 @@
+"""Benchmark suite for preset generation, serialization and bank packaging.
+
+Every case runs in a fresh interpreter so its peak RSS is its own, and the
+results are printed as JSON (sorted keys, fixed seeds) for trend tracking:
+
+    python benchmarks/run_benchmarks.py                 # every case
+    python benchmarks/run_benchmarks.py bank/100 lfo    # selected cases
+    python benchmarks/run_benchmarks.py --list
+"""
+import argparse
+import importlib.util
+import io
+import json
+import os
+import random
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+SEED = 1234
+STYLES = ["Random", "Keys", "Bass", "Lead", "Pad", "Pluck", "FX", "Drums", "Sequence"]
+
+CASES = {}
+
+def case(name):
+    def register(func):
+        CASES[name] = func
+        return func
+    return register
+
+def _timed(func, repeat):
+    """Best and median wall time of `repeat` calls"""
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return min(times), statistics.median(times), result
+
+def _peak_rss_bytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def _rate(count, seconds):
+    return count / seconds if seconds else None
+
+# Generation
+
+def _preset_case(style):
+    def run(args):
+        from random_vital_preset import generate_random_preset
+        from preset_serializer import serialize_preset
+        n = args.presets
+        rng = random.Random(SEED)
+        best, median, presets = _timed(lambda: [generate_random_preset(style, rng=rng) for _ in range(n)], args.repeat)
+        size = sum(len(serialize_preset(p)) for p in presets)
+        return {"presets": n, "presets_per_sec": _rate(n, best), "median_s": median, "bytes_per_preset": size / n}
+    return run
+
+for _style in STYLES:
+    case(f"preset/{_style}")(_preset_case(_style))
+
+def _component_case(func_name, count_per_preset, *func_args):
+    def run(args):
+        import random_vital_preset
+        func = getattr(random_vital_preset, func_name)
+        n = args.presets * count_per_preset
+        rng = random.Random(SEED)
+        best, median, _ = _timed(lambda: [func(*func_args, rng=rng) for _ in range(n)], args.repeat)
+        return {"calls": n, "calls_per_sec": _rate(n, best), "median_s": median}
+    return run
+
+case("lfo")(_component_case("generate_random_lfo", 8))
+case("modulation")(_component_case("generate_random_modulation", 64, 70))
+case("wavetable")(_component_case("generate_random_wavetable", 3))
+
+def _held_bytes(func):
+    """Bytes still allocated by what func() returns, and its result"""
+    import gc
+    import tracemalloc
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = func()
+        return tracemalloc.get_traced_memory()[0] - before, result
+    finally:
+        tracemalloc.stop()
+
+def _held_case(generate):
+    def run(args):
+        import numpy as np
+        from random_vital_preset import load_wavetable_data
+        load_wavetable_data()  # shared by every preset; keep it out of the per-preset figure
+        n = args.presets
+        best, median, _ = _timed(lambda: generate(n, np.random.default_rng(SEED)), args.repeat)
+        held, _ = _held_bytes(lambda: generate(n, np.random.default_rng(SEED)))
+        return {"presets": n, "presets_per_sec": _rate(n, best), "median_s": median, "held_bytes_per_preset": held / n}
+    return run
+
+def _dict_batch(n, rng):
+    from preset_batch import generate_preset_batch
+    return generate_preset_batch(n, rng=rng)
+
+def _compact_batch(n, rng):
+    from compact_preset import generate_compact_batch
+    return generate_compact_batch(n, rng=rng)
+
+case("batch/dict")(_held_case(_dict_batch))
+case("batch/compact")(_held_case(_compact_batch))
+
+# Serialization
+
+def _serialize_case(encode):
+    def run(args):
+        from random_vital_preset import generate_random_preset
+        rng = random.Random(SEED)
+        presets = [generate_random_preset(rng=rng) for _ in range(args.presets)]
+        best, median, sizes = _timed(lambda: [len(encode(p)) for p in presets], args.repeat)
+        return {"presets": len(presets), "presets_per_sec": _rate(len(presets), best),
+                "median_s": median, "bytes_per_preset": sum(sizes) / len(sizes)}
+    return run
+
+# The stdlib baseline the generators used before preset_serializer
+case("serialize/json_dumps")(_serialize_case(lambda p: json.dumps(p, indent=2).encode("utf-8")))
+
+def _serializer(compact, backend):
+    def encode(preset):
+        from preset_serializer import serialize_preset
+        return serialize_preset(preset, compact, backend)
+    return encode
+
+# orjson is optional; only benchmark it where it is installed
+for _backend in ("json", "orjson") if importlib.util.find_spec("orjson") else ("json",):
+    for _compact in (False, True):
+        case(f"serialize/{_backend}{'_compact' if _compact else ''}")(_serialize_case(_serializer(_compact, _backend)))
+
+# Bank packaging
+
+def _serialized_bank(num_presets):
+    from random_vital_preset import _generate_serialized_presets
+    return [data for _, data in _generate_serialized_presets(SEED, 0, num_presets)]
+
+def _bank_case(num_presets):
+    def run(args):
+        from random_vital_preset import StageProfiler, generate_vitalbank
+
+        def bank():
+            out = io.BytesIO()
+            generate_vitalbank(num_presets, output=out, seed=SEED)
+            return len(out.getvalue())
+
+        best, median, bank_bytes = _timed(bank, args.repeat)
+
+        # One more, untimed run split by pipeline stage
+        with StageProfiler(keep_events=False) as profiler:
+            bank()
+        stages = {stage: {"calls": row["calls"], "total_s": row["total_s"]}
+                  for stage, row in profiler.summary().items()}
+        uncompressed = sum(len(p) for p in _serialized_bank(num_presets))
+
+        return {"presets": num_presets, "presets_per_sec": _rate(num_presets, best), "median_s": median,
+                "bank_bytes_per_preset": bank_bytes / num_presets,
+                "uncompressed_bytes_per_preset": uncompressed / num_presets,
+                "stages": stages}
+    return run
+
+for _count in (1, 100, 1000):
+    case(f"bank/{_count}")(_bank_case(_count))
+
+def _compression_case(level):
+    def run(args):
+        from datetime import datetime
+        from vitalbank import COMPRESSION_LEVELS, VitalbankWriter
+        compression, compresslevel = COMPRESSION_LEVELS[level]
+        presets = _serialized_bank(args.presets)
+        uncompressed = sum(map(len, presets))
+
+        def write(compress_jobs):
+            out = io.BytesIO()
+            with VitalbankWriter(out, timestamp=datetime(2024, 1, 1), compression=compression,
+                                 compresslevel=compresslevel, compress_jobs=compress_jobs) as writer:
+                for i, data in enumerate(presets):
+                    writer.add_serialized_preset(f"{i:08d}", data)
+            return len(out.getvalue())
+
+        result = {"presets": len(presets), "uncompressed_bytes_per_preset": uncompressed / len(presets)}
+        for compress_jobs in sorted({1, os.cpu_count() or 1}):
+            best, median, bank_bytes = _timed(lambda: write(compress_jobs), args.repeat)
+            result[f"jobs_{compress_jobs}"] = {"mb_per_sec": _rate(uncompressed / 1e6, best), "median_s": median}
+        result["bank_bytes_per_preset"] = bank_bytes / len(presets)
+        result["ratio"] = bank_bytes / uncompressed
+        return result
+    return run
+
+for _level in ("store", "fast", "default", "best"):
+    case(f"compress/{_level}")(_compression_case(_level))
+
+# Modulation matrix
+
+@case("modulations/uniform_loop")
+def _modulations_loop(args):
+    from random_vital_preset import PRESET_SCHEMA, generate_random_modulation
+    rng = random.Random(SEED)
+    slots = PRESET_SCHEMA.num_modulations
+    best, median, _ = _timed(lambda: [[generate_random_modulation(70, rng) for _ in range(slots)]
+                                      for _ in range(args.presets)], args.repeat)
+    return {"presets": args.presets, "presets_per_sec": _rate(args.presets, best), "median_s": median}
+
+def _sampler_case(unique):
+    def run(args):
+        from modulation_sampler import ModulationSampler
+        sampler = ModulationSampler(matrix_targets=False, unique=unique)
+        best, median, _ = _timed(lambda: sampler.sample_matrix(args.presets, 70, SEED), args.repeat)
+        return {"presets": args.presets, "presets_per_sec": _rate(args.presets, best), "median_s": median}
+    return run
+
+case("modulations/alias_matrix")(_sampler_case(False))
+case("modulations/alias_matrix_unique")(_sampler_case(True))
+
+# Variants
+
+def _variant_case(sections):
+    def run(args):
+        from preset_serializer import serialize_preset
+        from preset_variants import VariantGenerator
+        from random_vital_preset import generate_random_preset
+        generator = VariantGenerator(generate_random_preset(seed=SEED), sections, backend="json")
+        best, median, sizes = _timed(lambda: [len(data) for _, data in generator.iter_serialized(args.presets, SEED)],
+                                     args.repeat)
+        # The same variants serialized whole, as if they were unrelated presets
+        presets = [generator.variant(seed=i) for i in range(args.presets)]
+        whole = _timed(lambda: [serialize_preset(p, False, "json") for p in presets], args.repeat)[0]
+        return {"presets": len(sizes), "presets_per_sec": _rate(len(sizes), best), "median_s": median,
+                "whole_serialize_per_sec": _rate(len(presets), whole)}
+    return run
+
+case("variants/lfos_modulations")(_variant_case(("lfos", "modulations")))
+case("variants/oscillators_envelopes")(_variant_case(("oscillators", "envelopes")))
+
+# Validation
+
+@case("validate")
+def _validate(args):
+    from preset_validator import validate_presets
+    from random_vital_preset import generate_random_preset
+    rng = random.Random(SEED)
+    presets = [generate_random_preset(rng=rng) for _ in range(args.presets)]
+    best, median, report = _timed(lambda: validate_presets(presets), args.repeat)
+    return {"presets": len(presets), "presets_per_sec": _rate(len(presets), best), "median_s": median,
+            "invalid_fraction": len(report.invalid) / len(presets)}
+
+# Cleaning
+
+@case("clean_preset")
+def _clean_preset(args):
+    import clean_presets
+    from random_vital_preset import generate_random_preset
+
+    rng = random.Random(SEED)
+    tmp = tempfile.mkdtemp()
+    try:
+        # Presets as Vital saves them: a sample and per-keyframe wave data to strip
+        payloads = []
+        for _ in range(args.presets):
+            preset = generate_random_preset(rng=rng)
+            preset["settings"]["sample"]["samples"] = "A" * 4096
+            for table in preset["settings"]["wavetables"]:
+                for keyframe in table["groups"][0]["components"][0]["keyframes"]:
+                    keyframe["wave_data"] = "B" * 2048
+            payloads.append(json.dumps(preset, indent=2))
+        paths = [os.path.join(tmp, f"{i}.vital") for i in range(len(payloads))]
+
+        def clean():
+            for path, payload in zip(paths, payloads):
+                with open(path, "w") as f:
+                    f.write(payload)
+            start = time.perf_counter()
+            clean_presets.clean_files(paths, jobs=1)
+            return time.perf_counter() - start
+
+        elapsed = [clean() for _ in range(args.repeat)]
+        bytes_saved = sum(map(len, payloads)) - sum(os.path.getsize(p) for p in paths)
+        # A second pass over the now clean files only has to scan them
+        rescan = _timed(lambda: clean_presets.clean_files(paths, jobs=1), args.repeat)[0]
+        return {"files": len(paths), "files_per_sec": _rate(len(paths), min(elapsed)),
+                "median_s": statistics.median(elapsed),
+                "clean_rescan_files_per_sec": _rate(len(paths), rescan),
+                "bytes_saved_per_file": bytes_saved / len(paths)}
+    finally:
+        shutil.rmtree(tmp)
+
+def run_case(name, args):
+    result = CASES[name](args)
+    result["peak_rss_bytes"] = _peak_rss_bytes()
+    return result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("cases", nargs="*", help="case names (default: all)")
+    parser.add_argument("--presets", type=int, default=200, help="presets per generation/serialization case")
+    parser.add_argument("--repeat", type=int, default=3, help="timed repetitions per case (best is reported)")
+    parser.add_argument("--list", action="store_true", help="list case names and exit")
+    parser.add_argument("--in-process", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.list:
+        print("\n".join(CASES))
+        return
+
+    names = args.cases or list(CASES)
+    unknown = [name for name in names if name not in CASES]
+    if unknown:
+        parser.error(f"unknown case(s): {', '.join(unknown)}")
+
+    if args.in_process:
+        results = {name: run_case(name, args) for name in names}
+    else:
+        results = {}
+        for name in names:
+            # One interpreter per case keeps peak RSS and warm caches independent
+            out = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), name, "--in-process",
+                 "--presets", str(args.presets), "--repeat", str(args.repeat)],
+                capture_output=True, text=True, check=True).stdout
+            results.update(json.loads(out)["cases"])
+
+    report = {
+        "python": sys.version.split()[0],
+        "platform": sys.platform,
+        "seed": SEED,
+        "presets": args.presets,
+        "repeat": args.repeat,
+        "cases": results,
+    }
+    json.dump(report, sys.stdout, indent=2, sort_keys=True)
+    print()
+
+if __name__ == "__main__":
+    main()
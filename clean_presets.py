@@ -1,48 +1,318 @@
+import argparse
 import json
-import glob
+import hashlib
 import os
+import re
+import stat
+import tempfile
+from collections import namedtuple
 
-def clean_preset(filepath):
-    print(f"Cleaning {filepath}")
+from file_scan import chunks, file_digest, find_files, map_chunks
+from preset_serializer import serialize_preset
+
+CLEANED = "cleaned"
+SKIPPED = "skipped"
+FAILED = "failed"
+
+# `entry` is the file's (size, mtime_ns, digest) after cleaning, for the manifest
+CleanResult = namedtuple("CleanResult", ["path", "status", "bytes_saved", "error", "entry"], defaults=(None,))
+
+# A non-empty sample payload (samples, samples_stereo) or keyframe wave_data
+_PAYLOAD_RE = re.compile(rb'"(?:samples\w*|wave_data)"\s*:\s*"[^"]')
+# What clean_preset_data leaves behind: the empty sample block and an empty
+# wave_data in every keyframe (keyframes are the dicts with a "position")
+_SAMPLE_KEY_RE = re.compile(rb'"sample"\s*:')
+_EMPTY_SAMPLE_RE = re.compile(
+    rb'"sample"\s*:\s*\{\s*"length"\s*:\s*0\s*,\s*"name"\s*:\s*""\s*,'
+    rb'\s*"sample_rate"\s*:\s*44100\s*,\s*"samples"\s*:\s*""\s*\}')
+_KEYFRAME_RE = re.compile(rb'"position"\s*:')
+_EMPTY_WAVE_DATA_RE = re.compile(rb'"wave_data"\s*:\s*""')
+
+# Files per task handed to each worker process
+_CHUNK_SIZE = 64
+
+# Manifest of already clean files, kept in the scanned root
+MANIFEST_NAME = ".clean_presets.sqlite"
+_MANIFEST_VERSION = 1
+
+def _count(pattern, raw):
+    return sum(1 for _ in pattern.finditer(raw))
+
+def is_clean(raw):
+    """True if the raw preset bytes are already normalized the way clean_preset_data leaves them.
+
+    That is: no sample or wave data, every sample block empty and every
+    keyframe with an empty wave_data. Checked on the bytes, without
+    parsing; files that fail it are parsed and cleaned, and only rewritten
+    if that changes them.
+    """
+    return (_PAYLOAD_RE.search(raw) is None
+            and _count(_SAMPLE_KEY_RE, raw) == _count(_EMPTY_SAMPLE_RE, raw)
+            and _count(_KEYFRAME_RE, raw) == _count(_EMPTY_WAVE_DATA_RE, raw))
+
+def _digest(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def _entry(st, digest):
+    return (st.st_size, st.st_mtime_ns, digest)
+
+def clean_preset_data(data):
+    """Strip the sample and wavetable wave data from a parsed preset in place"""
+    # Clean sample data
+    if "settings" in data and "sample" in data["settings"]:
+        data["settings"]["sample"] = {"length": 0, "name": "", "sample_rate": 44100, "samples": ""}
+
+    # Clean wave data in wavetables
+    if "settings" in data and "wavetables" in data["settings"]:
+        for table in data["settings"]["wavetables"]:
+            for group in table.get("groups", []):
+                for component in group.get("components", []):
+                    for keyframe in component.get("keyframes", []):
+                        keyframe["wave_data"] = ""
+    return data
+
+def _replace_atomically(filepath, data):
+    """Write `data` next to `filepath` and rename it over the original, keeping its mode"""
+    mode = stat.S_IMODE(os.stat(filepath).st_mode)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(filepath) or ".", prefix=".clean-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def clean_preset(filepath, known_digest=None):
+    """Clean one .vital file in place and return a CleanResult.
+
+    Already clean files (or files whose content hash is `known_digest`) are
+    left untouched, including their mtime; others are rewritten via a temp
+    file and rename, so a reader never sees a half-written preset.
+    """
     try:
-        with open(filepath, "r") as f:
-            data = json.load(f)
-        
-        # Clean sample data
-        if "settings" in data and "sample" in data["settings"]:
-            data["settings"]["sample"] = {"length": 0, "name": "", "sample_rate": 44100, "samples": ""}
-        
-        # Clean wave data in wavetables
-        if "settings" in data and "wavetables" in data["settings"]:
-            for table in data["settings"]["wavetables"]:
-                for group in table.get("groups", []):
-                    for component in group.get("components", []):
-                        for keyframe in component.get("keyframes", []):
-                            keyframe["wave_data"] = ""
-        
-        # Save cleaned data
-        with open(filepath, "w") as f:
-            json.dump(data, f, indent=2)
-        print(f"Successfully cleaned {filepath}")
+        with open(filepath, "rb") as f:
+            # Stat the file we read, so the manifest never pairs a new mtime with old content
+            st = os.fstat(f.fileno())
+            raw = f.read()
+        digest = _digest(raw)
+        if digest == known_digest or is_clean(raw):
+            return CleanResult(filepath, SKIPPED, 0, None, _entry(st, digest))
+
+        # stdlib backend keeps json.dump's exact formatting
+        data = serialize_preset(clean_preset_data(json.loads(raw)), backend="json")
+        if data == raw:
+            return CleanResult(filepath, SKIPPED, 0, None, _entry(st, digest))
+        _replace_atomically(filepath, data)
+        return CleanResult(filepath, CLEANED, len(raw) - len(data), None, _entry(os.stat(filepath), _digest(data)))
+    except Exception as e:
+        return CleanResult(filepath, FAILED, 0, str(e))
+
+def clean_vitalbank(filepath, known_digest=None):
+    """Clean every preset inside a .vitalbank in place and return a CleanResult.
+
+    The bank is rewritten member by member into a temp file, so only one
+    member is held in memory at a time. Every preset is decompressed to
+    check it for sample or wave data; clean presets and non-preset members
+    are then copied still compressed (see vitalbank.read_raw_member), so
+    only presets that carry data are cleaned and recompressed. A bank whose
+    content hash is `known_digest` is skipped without being opened, and
+    one with nothing to clean is left untouched.
+    """
+    import zipfile
+    from vitalbank import copy_member
+
+    tmp_path = None
+    try:
+        st = os.stat(filepath)
+        digest = file_digest(filepath)
+        if digest == known_digest:
+            return CleanResult(filepath, SKIPPED, 0, None, _entry(st, digest))
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(filepath) or ".", prefix=".clean-", suffix=".tmp")
+        cleaned = 0
+        with zipfile.ZipFile(filepath) as src, os.fdopen(fd, "wb") as f, zipfile.ZipFile(f, "w") as dest:
+            for zinfo in src.infolist():
+                if zinfo.filename.endswith(".vital"):
+                    raw = src.read(zinfo)
+                    data = None if is_clean(raw) else serialize_preset(clean_preset_data(json.loads(raw)), backend="json")
+                    if data is not None and data != raw:
+                        # Same name, date and attributes; only the content changes
+                        cleaned_info = zipfile.ZipInfo(zinfo.filename, zinfo.date_time)
+                        cleaned_info.compress_type = zinfo.compress_type
+                        cleaned_info.external_attr = zinfo.external_attr
+                        cleaned_info.comment = zinfo.comment
+                        dest.writestr(cleaned_info, data)
+                        cleaned += 1
+                        continue
+                copy_member(src, zinfo, dest)
+            dest.comment = src.comment
+        if not cleaned:
+            os.unlink(tmp_path)
+            return CleanResult(filepath, SKIPPED, 0, None, _entry(st, digest))
+        bytes_saved = st.st_size - os.path.getsize(tmp_path)
+        os.chmod(tmp_path, stat.S_IMODE(st.st_mode))
+        os.replace(tmp_path, filepath)
+        return CleanResult(filepath, CLEANED, bytes_saved, None, _entry(os.stat(filepath), file_digest(filepath)))
     except Exception as e:
-        print(f"Error cleaning {filepath}: {str(e)}")
-
-def clean_all_presets():
-    # Get the root directory (where this script is located)
-    root_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-    
-    # Find all .vital files recursively
-    vital_files = []
-    for root, dirs, files in os.walk(root_dir):
-        for file in files:
-            if file.endswith('.vital'):
-                vital_files.append(os.path.join(root, file))
-    
-    print(f"Found {len(vital_files)} preset files to clean")
-    
-    # Clean each preset
-    for file in vital_files:
-        clean_preset(file)
+        if tmp_path and os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        return CleanResult(filepath, FAILED, 0, str(e))
+
+def clean_path(filepath, known_digest=None):
+    """clean_vitalbank for banks, clean_preset for anything else"""
+    if filepath.endswith(".vitalbank"):
+        return clean_vitalbank(filepath, known_digest)
+    return clean_preset(filepath, known_digest)
+
+def _clean_paths(items):
+    return [clean_path(path, known_digest) for path, known_digest in items]
+
+class CleanManifest:
+    """SQLite record of the clean files under `root_dir`.
+
+    Each file's size, mtime and content hash are stored once it is known to
+    be clean. A file whose size and mtime still match is skipped without
+    being opened; one that was only touched is recognised by its hash and
+    not parsed. Use `rebuild` to start from an empty manifest.
+    """
+
+    def __init__(self, root_dir, rebuild=False):
+        import sqlite3
+        self.root_dir = root_dir
+        self.path = os.path.join(root_dir, MANIFEST_NAME)
+        self._db = sqlite3.connect(self.path)
+        if rebuild or self._db.execute("PRAGMA user_version").fetchone()[0] != _MANIFEST_VERSION:
+            self._db.execute("DROP TABLE IF EXISTS files")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, "
+            "digest TEXT NOT NULL, status TEXT NOT NULL)"
+        )
+        self._db.execute(f"PRAGMA user_version = {_MANIFEST_VERSION}")
+        # relative path -> (size, mtime_ns, digest), loaded up front so lookups never hit the database
+        self.entries = {
+            path: (size, mtime_ns, digest)
+            for path, size, mtime_ns, digest in self._db.execute("SELECT path, size, mtime_ns, digest FROM files")
+        }
+        self._seen = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(prune=exc_type is None)
+
+    def _key(self, filepath):
+        return os.path.relpath(filepath, self.root_dir)
+
+    def lookup(self, filepath):
+        """Return (unchanged, known digest) for a file about to be cleaned"""
+        key = self._key(filepath)
+        self._seen.add(key)
+        entry = self.entries.get(key)
+        if entry is None:
+            return False, None
+        st = os.stat(filepath)
+        return (st.st_size, st.st_mtime_ns) == entry[:2], entry[2]
+
+    def record(self, results):
+        """Store the entries of clean (cleaned or skipped) results and forget failed files.
+
+        Committed right away, so an interrupted run keeps every batch it finished.
+        """
+        rows = []
+        failed = []
+        for result in results:
+            key = self._key(result.path)
+            if result.status == FAILED or result.entry is None:
+                failed.append((key,))
+                self.entries.pop(key, None)
+            else:
+                rows.append((key, *result.entry, "clean"))
+                self.entries[key] = result.entry
+        self._db.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)", rows)
+        self._db.executemany("DELETE FROM files WHERE path = ?", failed)
+        self._db.commit()
+
+    def close(self, prune=True):
+        """Commit, dropping files that were not looked up this run when `prune` is set"""
+        if prune:
+            gone = [(key,) for key in self.entries if key not in self._seen]
+            self._db.executemany("DELETE FROM files WHERE path = ?", gone)
+        self._db.commit()
+        self._db.close()
+
+def find_presets(root_dir):
+    """Yield every .vital and .vitalbank file under `root_dir`"""
+    return find_files(root_dir, (".vital", ".vitalbank"))
+
+def clean_files(paths, jobs=None, manifest=None):
+    """Clean .vital and .vitalbank `paths` in `jobs` processes (default: one per CPU) and return a summary.
+
+    The summary counts files scanned, cleaned, skipped (already clean),
+    unchanged (skipped by the `manifest` without being opened) and failed,
+    the bytes saved, and lists (path, error) for every failure.
+    """
+    jobs = jobs or os.cpu_count() or 1
+    summary = {"scanned": 0, "cleaned": 0, "skipped": 0, "unchanged": 0, "failed": 0, "bytes_saved": 0, "errors": []}
+
+    def pending():
+        for path in paths:
+            summary["scanned"] += 1
+            known_digest = None
+            if manifest is not None:
+                unchanged, known_digest = manifest.lookup(path)
+                if unchanged:
+                    summary["unchanged"] += 1
+                    continue
+            yield path, known_digest
+
+    def tally(results):
+        for result in results:
+            summary[result.status] += 1
+            summary["bytes_saved"] += result.bytes_saved
+            if result.status == FAILED:
+                summary["errors"].append((result.path, result.error))
+        if manifest is not None:
+            manifest.record(results)
+
+    # Files are looked up in the manifest as workers free up, not all before the first chunk is sent
+    for results in map_chunks(_clean_paths, chunks(pending(), _CHUNK_SIZE), jobs):
+        tally(results)
+    return summary
+
+def clean_all_presets(root_dir=None, jobs=None, use_index=True, rebuild_index=False):
+    """Clean every .vital and .vitalbank file under `root_dir` and return the clean_files summary.
+
+    With `use_index`, a CleanManifest in `root_dir` limits the work to new and
+    changed files; `rebuild_index` discards it first.
+    """
+    if root_dir is None:
+        # Get the root directory (where this script is located)
+        root_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    if not use_index:
+        return clean_files(find_presets(root_dir), jobs)
+    with CleanManifest(root_dir, rebuild=rebuild_index) as manifest:
+        return clean_files(find_presets(root_dir), jobs, manifest)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Strip sample and wave data from Vital presets and banks")
+    parser.add_argument("root", nargs="?", help="directory to scan (default: three levels above this script)")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("--rebuild-index", action="store_true",
+                        help=f"discard the {MANIFEST_NAME} manifest and re-check every file")
+    parser.add_argument("--no-index", action="store_true", help="neither read nor write the manifest")
+    args = parser.parse_args(argv)
+
+    summary = clean_all_presets(args.root, args.jobs, not args.no_index, args.rebuild_index)
+    for path, error in summary["errors"]:
+        print(f"Error cleaning {path}: {error}")
+    print(f"Scanned {summary['scanned']} preset and bank files: {summary['cleaned']} cleaned, "
+          f"{summary['skipped'] + summary['unchanged']} already clean "
+          f"({summary['unchanged']} unchanged since the last run), {summary['failed']} failed, "
+          f"{summary['bytes_saved']} bytes saved")
 
 if __name__ == "__main__":
-    clean_all_presets() 
\ No newline at end of file
+    main()
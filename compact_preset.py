@@ -0,0 +1,215 @@
+from array import array
+
+from preset_serializer import serialize_preset
+from random_vital_preset import (
+    PRESET_SCHEMA, CONST, LFOS, MODULATIONS, SAMPLE, WAVETABLES, LfoShape,
+    empty_sample, generate_random_preset, wavetable_from_keyframes,
+)
+
+_STRUCTURAL_KINDS = (LFOS, MODULATIONS, SAMPLE, WAVETABLES)
+_PRESET_KEYS = ("author", "comments", "macro1", "macro2", "macro3", "macro4", "preset_style", "synth_version", "settings")
+KEYFRAME_FIELDS = 4  # position, start_position, window_fade, window_size
+_EMPTY = -1  # routing index of an empty modulation slot
+
+class PresetLayout:
+    """Fixed key -> index layout of the scalar settings of a generated preset"""
+
+    def __init__(self, schema):
+        specs = schema.settings_specs + schema.modulation_specs
+        self.keys = tuple(spec.key for spec in specs if spec.kind not in _STRUCTURAL_KINDS)
+        self.index = {key: i for i, key in enumerate(self.keys)}
+        # Constants that are not floats (e.g. osc_*_midi_track) keep their type in the dict form
+        self.typed_consts = tuple((self.index[spec.key], type(spec.low)) for spec in specs
+                                  if spec.kind == CONST and type(spec.low) is not float)
+        # Runs of scalar keys between the structural settings, in settings dict order
+        self.segments = []
+        scalar_keys = []
+        for spec in specs:
+            if spec.kind in _STRUCTURAL_KINDS:
+                if scalar_keys:
+                    self.segments.append((None, tuple(scalar_keys), self.index[scalar_keys[0]]))
+                    scalar_keys = []
+                self.segments.append((spec.kind, spec.key, None))
+            else:
+                scalar_keys.append(spec.key)
+        if scalar_keys:
+            self.segments.append((None, tuple(scalar_keys), self.index[scalar_keys[0]]))
+        self.setting_keys = frozenset(spec.key for spec in specs)
+        self.destinations = schema.mod_destinations
+        self.sources = schema.mod_sources
+        self.destination_index = {name: i for i, name in enumerate(self.destinations)}
+        self.source_index = {name: i for i, name in enumerate(self.sources)}
+
+LAYOUT = PresetLayout(PRESET_SCHEMA)
+
+class Preset:
+    """A generated preset held as flat arrays instead of nested dicts.
+
+    Every scalar setting lives in `values`, an array('d') in LAYOUT order.
+    LFOs are LfoShape tuples with array('d') points and powers, the
+    modulation matrix two array('h') of destination and source indices
+    (-1 for an empty slot) and each wavetable just its keyframes, flattened
+    to array('d') rows of position, start_position, window_fade and
+    window_size. The sample and the rest of each wavetable are the shared
+    templates every generated preset uses, so they are only built by
+    to_dict(), when the preset is serialized.
+    """
+    __slots__ = ("preset_style", "comments", "macros", "values", "lfos", "destinations", "sources", "keyframes")
+
+    def __init__(self, preset_style, comments, macros, values, lfos, destinations, sources, keyframes):
+        self.preset_style = preset_style
+        self.comments = comments
+        self.macros = tuple(macros)
+        self.values = values
+        self.lfos = lfos
+        self.destinations = destinations
+        self.sources = sources
+        self.keyframes = keyframes
+
+    def __repr__(self):
+        return f"<Preset {self.preset_style} {' '.join(self.macros)}>"
+
+    def __getitem__(self, key):
+        return self.values[LAYOUT.index[key]]
+
+    def __setitem__(self, key, value):
+        self.values[LAYOUT.index[key]] = value
+
+    def get(self, key, default=None):
+        """The scalar setting `key`, or `default` if there is no such setting"""
+        index = LAYOUT.index.get(key)
+        return default if index is None else self.values[index]
+
+    def routings(self):
+        """(destination, source) of every modulation slot, ("", "") for empty ones"""
+        destinations, sources = LAYOUT.destinations, LAYOUT.sources
+        return [("", "") if d == _EMPTY else (destinations[d], sources[s])
+                for d, s in zip(self.destinations, self.sources)]
+
+    @classmethod
+    def from_dict(cls, preset):
+        """Pack a preset dict laid out like generate_random_preset's output.
+
+        Raises ValueError for settings, routings, samples or wavetables that
+        the compact form cannot hold.
+        """
+        settings = preset["settings"]
+        if settings.keys() != LAYOUT.setting_keys:
+            raise ValueError("Preset settings do not match the generated preset layout")
+        if settings["sample"] != empty_sample():
+            raise ValueError("Only presets with an empty sample can be packed")
+        destinations = array("h")
+        sources = array("h")
+        for modulation in settings["modulations"]:
+            if modulation["source"] or modulation["destination"]:
+                try:
+                    destinations.append(LAYOUT.destination_index[modulation["destination"]])
+                    sources.append(LAYOUT.source_index[modulation["source"]])
+                except KeyError as e:
+                    raise ValueError(f"Unknown modulation routing {e.args[0]!r}") from None
+            else:
+                destinations.append(_EMPTY)
+                sources.append(_EMPTY)
+        keyframes = []
+        for wavetable in settings["wavetables"]:
+            frames = wavetable["groups"][0]["components"][0]["keyframes"]
+            if wavetable != wavetable_from_keyframes(frames):
+                raise ValueError("Only wavetables built by wavetable_from_keyframes can be packed")
+            keyframes.append(array("d", [value for frame in frames for value in (
+                frame["position"], frame["start_position"], frame["window_fade"], frame["window_size"])]))
+        return cls(
+            preset["preset_style"],
+            preset["comments"],
+            (preset["macro1"], preset["macro2"], preset["macro3"], preset["macro4"]),
+            array("d", [settings[key] for key in LAYOUT.keys]),
+            [LfoShape(lfo["name"], lfo["num_points"], array("d", lfo["points"]), array("d", lfo["powers"]), lfo["smooth"])
+             for lfo in settings["lfos"]],
+            destinations,
+            sources,
+            keyframes,
+        )
+
+    def to_dict(self):
+        """The Vital preset dict, laid out exactly like generate_random_preset's output"""
+        values = self.values.tolist()
+        for index, cast in LAYOUT.typed_consts:
+            values[index] = cast(values[index])
+        settings = {}
+        for kind, keys, start in LAYOUT.segments:
+            if kind is None:
+                settings.update(zip(keys, values[start:start + len(keys)]))
+            elif kind == LFOS:
+                settings[keys] = [
+                    {"name": name, "num_points": num_points, "points": points.tolist(), "powers": powers.tolist(), "smooth": smooth}
+                    for name, num_points, points, powers, smooth in self.lfos
+                ]
+            elif kind == MODULATIONS:
+                settings[keys] = [{"destination": destination, "source": source} for destination, source in self.routings()]
+            elif kind == SAMPLE:
+                settings[keys] = empty_sample()
+            elif kind == WAVETABLES:
+                settings[keys] = [wavetable_from_keyframes(_keyframe_dicts(frames)) for frames in self.keyframes]
+        return dict(zip(_PRESET_KEYS, (
+            "RandomPresetGenerator", self.comments, *self.macros, self.preset_style, "1.5.5", settings)))
+
+    def serialize(self, compact=False, backend="json"):
+        """preset_serializer.serialize_preset of the dict form"""
+        return serialize_preset(self.to_dict(), compact, backend)
+
+def _keyframe_dicts(frames):
+    values = frames.tolist()
+    return [
+        {
+            "position": int(values[i]),
+            "start_position": values[i + 1],
+            "window_fade": values[i + 2],
+            "window_size": values[i + 3]
+        }
+        for i in range(0, len(values), KEYFRAME_FIELDS)
+    ]
+
+def generate_compact_preset(*args, **kwargs):
+    """generate_random_preset, packed into a Preset.
+
+    A convenience for single presets: it builds the preset dict and packs
+    it, so it is slower than generate_random_preset itself. Use
+    generate_compact_batch to draw straight into the packed form.
+    """
+    return Preset.from_dict(generate_random_preset(*args, **kwargs))
+
+def generate_compact_batch(n, preset_style="Random", volume_range=(1000, 8000), polyphony_range=(1, 32), empty_mod_chance=70, mod_amount_range=(-1.0, 1.0), mod_power_range=(-4.0, 4.0), rng=None, modulation_sampler=None):
+    """preset_batch.generate_preset_batch, built straight into Presets.
+
+    Packs the same preset_batch.draw_batch, so a given seed gives the packed
+    form of the same presets without building their dicts.
+    """
+    import numpy as np
+    from preset_batch import draw_batch, gc_paused
+
+    num_lfos = PRESET_SCHEMA.num_lfos
+    num_wavetables = PRESET_SCHEMA.num_wavetables
+
+    with gc_paused():
+        draw = draw_batch(n, preset_style, polyphony_range, empty_mod_chance, mod_amount_range, mod_power_range, rng, modulation_sampler)
+        lfos = [LfoShape(name, k, array("d", row[:2 * k]), array("d", powers_row[:k]), is_smooth)
+                for name, k, row, powers_row, is_smooth in zip(*draw.lfos)]
+        empty, destination_index, source_index = draw.routings
+        destination_index = np.where(empty, _EMPTY, destination_index).astype(np.int16)
+        source_index = np.where(empty, _EMPTY, source_index).astype(np.int16)
+        num_keyframes, *fields = draw.keyframes
+        keyframes = [array("d", [value for frame in zip(*(field[j][:k] for field in fields)) for value in frame])
+                     for j, k in enumerate(num_keyframes)]
+
+        return [
+            Preset(
+                draw.preset_styles[i],
+                "Randomly generated preset",
+                draw.macros[i],
+                array("d", draw.values[i].tobytes()),
+                lfos[i * num_lfos:(i + 1) * num_lfos],
+                array("h", destination_index[i].tobytes()),
+                array("h", source_index[i].tobytes()),
+                keyframes[i * num_wavetables:(i + 1) * num_wavetables],
+            )
+            for i in range(n)
+        ]
@@ -0,0 +1,54 @@
+import hashlib
+import os
+from collections import deque
+
+# Walking, hashing and farming out the files of a preset tree, shared by
+# clean_presets and bank_index
+
+def file_digest(filepath):
+    """Hex blake2b-128 digest of a file's content, read in 1 MiB chunks"""
+    # Chunked by hand: hashlib.file_digest needs Python 3.11
+    digest = hashlib.blake2b(digest_size=16)
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def find_files(root_dir, extensions):
+    """Yield every file under `root_dir` whose name ends with one of `extensions`"""
+    for root, dirs, files in os.walk(root_dir):
+        for file in files:
+            if file.endswith(extensions):
+                yield os.path.join(root, file)
+
+def chunks(items, size):
+    """Yield lists of up to `size` consecutive items"""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def map_chunks(func, chunked, jobs):
+    """Yield func(chunk) for every chunk of `chunked`, in order, on `jobs` processes when > 1.
+
+    Only 2 * jobs chunks are in flight at a time, so a lazy `chunked` (say,
+    one that stats each file) is consumed as workers free up instead of all
+    up front.
+    """
+    if jobs == 1:
+        for chunk in chunked:
+            yield func(chunk)
+        return
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        pending = deque()
+        for chunk in chunked:
+            if len(pending) >= 2 * jobs:
+                yield pending.popleft().result()
+            pending.append(executor.submit(func, chunk))
+        while pending:
+            yield pending.popleft().result()
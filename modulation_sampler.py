@@ -0,0 +1,159 @@
+from random_vital_preset import PRESET_SCHEMA
+
+# Index of an empty slot in sample_matrix's output, as in compact_preset
+EMPTY = -1
+
+# Rounds of redrawing duplicate routings before giving up
+_MAX_REDRAWS = 100
+
+class AliasTable:
+    """Draws indices 0..n-1 in proportion to `weights` in O(1) per draw (Vose's alias method).
+
+    Zero weights are never drawn. draw() takes a random.Random-like rng,
+    sample() a numpy Generator and any number of draws at once.
+    """
+    __slots__ = ("outcomes", "prob", "alias", "_arrays")
+
+    def __init__(self, weights):
+        weights = [float(w) for w in weights]
+        if any(w < 0 for w in weights):
+            raise ValueError("Weights must not be negative")
+        # Only positive weights take part, so rounding can never hand a slot to a zero weight
+        self.outcomes = [i for i, w in enumerate(weights) if w > 0]
+        if not self.outcomes:
+            raise ValueError("At least one weight must be positive")
+        n = len(self.outcomes)
+        total = sum(weights)
+        scaled = [weights[i] * n / total for i in self.outcomes]
+        self.prob = [1.0] * n
+        self.alias = list(range(n))
+        small = [j for j, p in enumerate(scaled) if p < 1.0]
+        large = [j for j, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] += scaled[s] - 1.0
+            (small if scaled[l] < 1.0 else large).append(l)
+        # Whatever is left is 1 up to rounding
+        for j in small + large:
+            self.prob[j] = 1.0
+        self._arrays = None
+
+    def __len__(self):
+        return len(self.outcomes)
+
+    def draw(self, rng):
+        """One index, drawn with rng.random()"""
+        j = int(rng.random() * len(self.prob))
+        return self.outcomes[j if rng.random() < self.prob[j] else self.alias[j]]
+
+    def sample(self, size, rng):
+        """An int array of indices with shape `size`, drawn from the numpy Generator `rng`"""
+        import numpy as np
+        if self._arrays is None:
+            self._arrays = (np.array(self.outcomes, dtype=np.int16), np.array(self.prob), np.array(self.alias))
+        outcomes, prob, alias = self._arrays
+        j = rng.integers(0, len(prob), size=size)
+        return outcomes[np.where(rng.random(size) < prob[j], j, alias[j])]
+
+    def __getstate__(self):
+        return self.outcomes, self.prob, self.alias
+
+    def __setstate__(self, state):
+        self.outcomes, self.prob, self.alias = state
+        self._arrays = None
+
+def _weight_list(names, weights, what):
+    if weights is None:
+        return [1.0] * len(names)
+    unknown = set(weights).difference(names)
+    if unknown:
+        raise ValueError(f"Unknown modulation {what}(s): {', '.join(sorted(unknown))}")
+    return [weights.get(name, 1.0) for name in names]
+
+class ModulationSampler:
+    """Weighted draws of the modulation matrix.
+
+    `destination_weights` and `source_weights` map names from
+    PRESET_SCHEMA.mod_destinations / mod_sources to relative weights;
+    names left out weigh 1 and a weight of 0 never routes. Without
+    `matrix_targets`, no slot targets another slot's modulation_N_amount.
+    With `unique`, no (destination, source) pair is routed twice in one
+    preset. Destination and source are drawn independently from alias
+    tables, and each slot is empty with probability empty_mod_chance%.
+
+    Pass one as `modulation_sampler` to generate_random_preset (draw()
+    per preset) or preset_batch.generate_preset_batch (sample_matrix()
+    for the whole batch at once).
+    """
+    __slots__ = ("destinations", "sources", "unique", "_destination_table", "_source_table")
+
+    def __init__(self, destination_weights=None, source_weights=None, matrix_targets=True, unique=False):
+        self.destinations = PRESET_SCHEMA.mod_destinations
+        self.sources = PRESET_SCHEMA.mod_sources
+        weights = _weight_list(self.destinations, destination_weights, "destination")
+        if not matrix_targets:
+            weights = [0.0 if name.startswith("modulation_") else w for name, w in zip(self.destinations, weights)]
+        self._destination_table = AliasTable(weights)
+        self._source_table = AliasTable(_weight_list(self.sources, source_weights, "source"))
+        self.unique = unique
+        if unique and len(self._destination_table) * len(self._source_table) < PRESET_SCHEMA.num_modulations:
+            raise ValueError(f"Fewer than {PRESET_SCHEMA.num_modulations} weighted routings to draw unique slots from")
+
+    def draw(self, rng, empty_mod_chance=0):
+        """The modulations list of one preset, drawn with rng.random() like generate_random_modulation"""
+        destinations, sources = self.destinations, self.sources
+        draw_destination, draw_source = self._destination_table.draw, self._source_table.draw
+        modulations = []
+        used = set()
+        for _ in range(PRESET_SCHEMA.num_modulations):
+            if rng.random() * 100 < empty_mod_chance:
+                modulations.append({"destination": "", "source": ""})
+                continue
+            routing = (draw_destination(rng), draw_source(rng))
+            if self.unique:
+                for _ in range(_MAX_REDRAWS):
+                    if routing not in used:
+                        break
+                    routing = (draw_destination(rng), draw_source(rng))
+                else:
+                    raise RuntimeError("Could not draw a unique routing; spread the weights wider")
+                used.add(routing)
+            modulations.append({"destination": destinations[routing[0]], "source": sources[routing[1]]})
+        return modulations
+
+    def sample_matrix(self, n, empty_mod_chance=0, rng=None):
+        """Draw the (n, num_modulations) matrix of n presets in one go.
+
+        Returns int16 destination and source index arrays, EMPTY in both
+        for empty slots. `rng` is a numpy Generator or seed.
+        """
+        import numpy as np
+        rng = np.random.default_rng(rng)
+        shape = (n, PRESET_SCHEMA.num_modulations)
+        empty = rng.random(shape) * 100 < empty_mod_chance
+        destination_index = self._destination_table.sample(shape, rng)
+        source_index = self._source_table.sample(shape, rng)
+        if self.unique:
+            num_sources = len(self.sources)
+            slots = np.arange(shape[1])
+            rows = np.arange(n)[:, None]
+            for _ in range(_MAX_REDRAWS):
+                # Empty slots get distinct negative keys so they never count as duplicates
+                keys = np.where(empty, -1 - slots, destination_index.astype(np.int64) * num_sources + source_index)
+                order = np.argsort(keys, axis=1, kind="stable")
+                ordered = np.take_along_axis(keys, order, axis=1)
+                duplicate = np.zeros(shape, dtype=bool)
+                duplicate[rows, order[:, 1:]] = ordered[:, 1:] == ordered[:, :-1]
+                count = int(duplicate.sum())
+                if not count:
+                    break
+                destination_index[duplicate] = self._destination_table.sample(count, rng)
+                source_index[duplicate] = self._source_table.sample(count, rng)
+            else:
+                raise RuntimeError("Could not draw unique routings; spread the weights wider")
+        destination_index[empty] = EMPTY
+        source_index[empty] = EMPTY
+        return destination_index, source_index
@@ -0,0 +1,346 @@
+import gc
+import string
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+
+import numpy as np
+
+from random_vital_preset import (
+    PRESET_SCHEMA, CONST, FLOAT, INT, BOOL, STYLE_FLOAT, ARG_FLOAT, ARG_INT,
+    LFOS, MODULATIONS, SAMPLE, WAVETABLES,
+    empty_sample, get_style_ranges, wavetable_from_keyframes,
+)
+
+_LETTERS = np.frombuffer(string.ascii_letters.encode("ascii"), dtype=np.uint8)
+_MAX_LFO_POINTS = 8
+_MAX_SHAPE_POINTS = max(shape.num_points for shape in PRESET_SCHEMA.lfo_shapes)
+_MAX_KEYFRAMES = 8
+_STRUCTURAL_KINDS = (LFOS, MODULATIONS, SAMPLE, WAVETABLES)
+
+class _BatchLayout:
+    """Column layout of every scalar setting, grouped by draw kind"""
+
+    def __init__(self, schema):
+        specs = [spec for spec in schema.settings_specs + schema.modulation_specs
+                 if spec.kind not in _STRUCTURAL_KINDS]
+        self.num_columns = len(specs)
+        column_of = {spec.key: col for col, spec in enumerate(specs)}
+
+        def columns(kind):
+            return [(column_of[spec.key], spec) for spec in specs if spec.kind == kind]
+
+        floats = columns(FLOAT)
+        self.float_cols = np.array([col for col, _ in floats], dtype=np.intp)
+        self.float_low = np.array([spec.low for _, spec in floats], dtype=np.float64)
+        self.float_span = np.array([spec.high - spec.low for _, spec in floats], dtype=np.float64)
+
+        ints = columns(INT)
+        self.int_cols = np.array([col for col, _ in ints], dtype=np.intp)
+        self.int_low = np.array([spec.low for _, spec in ints], dtype=np.int64)
+        self.int_high = np.array([spec.high for _, spec in ints], dtype=np.int64)
+
+        self.bool_cols = np.array([col for col, _ in columns(BOOL)], dtype=np.intp)
+
+        # Style ranges are looked up per preset, so keep the range name per column
+        style_floats = columns(STYLE_FLOAT)
+        self.style_cols = np.array([col for col, _ in style_floats], dtype=np.intp)
+        self.style_range_names = tuple(spec.low for _, spec in style_floats)
+
+        self.arg_float_cols = {}
+        for col, spec in columns(ARG_FLOAT):
+            self.arg_float_cols.setdefault(spec.low, []).append(col)
+        self.arg_int_cols = {}
+        for col, spec in columns(ARG_INT):
+            self.arg_int_cols.setdefault(spec.low, []).append(col)
+
+        consts = columns(CONST)
+        self.const_cols = np.array([col for col, _ in consts], dtype=np.intp)
+        self.const_values = np.array([spec.low for _, spec in consts], dtype=np.float64)
+        # Constants that are not floats (e.g. osc_*_midi_track) are patched back after tolist()
+        self.typed_consts = tuple((spec.key, spec.low) for _, spec in consts if type(spec.low) is not float)
+
+        # Settings are materialized segment by segment to keep the key order of generate_random_preset
+        self.segments = []
+        start = 0
+        scalar_keys = []
+        for spec in schema.settings_specs + schema.modulation_specs:
+            if spec.kind in _STRUCTURAL_KINDS:
+                if scalar_keys:
+                    self.segments.append((None, tuple(scalar_keys), start, start + len(scalar_keys)))
+                    start += len(scalar_keys)
+                    scalar_keys = []
+                self.segments.append((spec.kind, spec.key, None, None))
+            else:
+                scalar_keys.append(spec.key)
+        if scalar_keys:
+            self.segments.append((None, tuple(scalar_keys), start, start + len(scalar_keys)))
+
+        # Style range table indexed by [style, range name] -> (low, high)
+        self.style_table = np.array([
+            [get_style_ranges(style)[name] for name in self.style_range_names]
+            for style in schema.preset_styles
+        ], dtype=np.float64)
+
+        shapes = schema.lfo_shapes
+        self.shape_num_points = np.array([shape.num_points for shape in shapes], dtype=np.int64)
+        self.shape_x = np.zeros((len(shapes), _MAX_SHAPE_POINTS), dtype=np.float64)
+        self.shape_y = np.zeros((len(shapes), _MAX_SHAPE_POINTS), dtype=np.float64)
+        for i, shape in enumerate(shapes):
+            self.shape_x[i, :shape.num_points] = shape.points[0::2]
+            self.shape_y[i, :shape.num_points] = shape.points[1::2]
+
+_LAYOUT = _BatchLayout(PRESET_SCHEMA)
+
+def _draw_scalars(n, style_index, arg_ranges, rng):
+    """Draw every scalar setting of n presets into one (n, columns) matrix"""
+    layout = _LAYOUT
+    values = np.empty((n, layout.num_columns), dtype=np.float64)
+
+    values[:, layout.float_cols] = layout.float_low + rng.random((n, len(layout.float_cols))) * layout.float_span
+    values[:, layout.int_cols] = rng.integers(layout.int_low, layout.int_high, size=(n, len(layout.int_cols)), endpoint=True)
+    values[:, layout.bool_cols] = rng.integers(0, 1, size=(n, len(layout.bool_cols)), endpoint=True)
+
+    style_ranges = layout.style_table[style_index]
+    low, high = style_ranges[..., 0], style_ranges[..., 1]
+    values[:, layout.style_cols] = low + rng.random(low.shape) * (high - low)
+
+    for name, cols in layout.arg_float_cols.items():
+        low, high = arg_ranges[name]
+        values[:, cols] = low + rng.random((n, len(cols))) * (high - low)
+    for name, cols in layout.arg_int_cols.items():
+        low, high = arg_ranges[name]
+        values[:, cols] = rng.integers(low, high, size=(n, len(cols)), endpoint=True)
+
+    values[:, layout.const_cols] = layout.const_values
+    return values
+
+def _draw_lfo_fields(m, rng):
+    """Draw m LFOs the same way generate_random_lfo does, as lists of names, num_points, points, powers and smooth"""
+    layout = _LAYOUT
+    shapes = PRESET_SCHEMA.lfo_shapes
+
+    predefined = rng.random(m) < 0.7
+    shape_index = rng.integers(0, len(shapes), size=m)
+    powers = rng.uniform(-4.0, 4.0, size=(m, _MAX_LFO_POINTS)).tolist()
+    smooth = (rng.random(m) < 0.5).tolist()
+
+    # Predefined shapes keep their x values and get small random variations on y
+    shape_points = np.zeros((m, _MAX_LFO_POINTS, 2), dtype=np.float64)
+    shape_points[:, :_MAX_SHAPE_POINTS, 0] = layout.shape_x[shape_index]
+    shape_points[:, :_MAX_SHAPE_POINTS, 1] = layout.shape_y[shape_index] + rng.uniform(-0.1, 0.1, size=(m, _MAX_SHAPE_POINTS))
+
+    # Custom shapes: sort only the first num_points x values of each row
+    num_points = rng.integers(3, _MAX_LFO_POINTS, size=m, endpoint=True)
+    x_values = rng.random((m, _MAX_LFO_POINTS))
+    x_values[np.arange(_MAX_LFO_POINTS) >= num_points[:, None]] = np.inf
+    x_values.sort(axis=1)
+    x_values[:, 0] = 0.0  # Force first x to 0
+    x_values[np.arange(m), num_points - 1] = 1.0  # Force last x to 1
+    custom_points = np.stack([x_values, rng.random((m, _MAX_LFO_POINTS))], axis=2)
+    custom_number = rng.integers(1, 100, size=m, endpoint=True).tolist()
+
+    # Interleave to the flat [x0, y0, x1, y1, ...] layout Vital uses
+    points = np.where(predefined[:, None, None], shape_points, custom_points).reshape(m, 2 * _MAX_LFO_POINTS).tolist()
+    num_points = np.where(predefined, layout.shape_num_points[shape_index], num_points).tolist()
+    names = [
+        shapes[index].name if is_predefined else f"Custom {number}"
+        for is_predefined, index, number in zip(predefined.tolist(), shape_index.tolist(), custom_number)
+    ]
+    return names, num_points, points, powers, smooth
+
+def _lfo_dicts(fields):
+    """LFO dicts of the fields drawn by _draw_lfo_fields"""
+    return [
+        {
+            "name": name,
+            "num_points": k,
+            "points": row[:2 * k],
+            "powers": powers_row[:k],
+            "smooth": is_smooth
+        }
+        for name, k, row, powers_row, is_smooth in zip(*fields)
+    ]
+
+def _draw_routings(n, empty_mod_chance, rng, modulation_sampler=None):
+    """Draw the (n, 64) modulation routing matrix as empty, destination index and source index arrays"""
+    if modulation_sampler is not None:
+        destination_index, source_index = modulation_sampler.sample_matrix(n, empty_mod_chance, rng)
+        return destination_index < 0, destination_index, source_index
+    shape = (n, PRESET_SCHEMA.num_modulations)
+    empty = rng.random(shape) * 100 < empty_mod_chance
+    destination_index = rng.integers(0, len(PRESET_SCHEMA.mod_destinations), size=shape)
+    source_index = rng.integers(0, len(PRESET_SCHEMA.mod_sources), size=shape)
+    return empty, destination_index, source_index
+
+def _modulation_lists(routings):
+    """Per-preset modulation dict lists of the matrix drawn by _draw_routings"""
+    destinations = PRESET_SCHEMA.mod_destinations
+    sources = PRESET_SCHEMA.mod_sources
+    empty, destination_index, source_index = (a.tolist() for a in routings)
+
+    return [
+        [
+            {"destination": "", "source": ""} if is_empty else
+            {"destination": destinations[d], "source": sources[s]}
+            for is_empty, d, s in zip(empty_row, dest_row, source_row)
+        ]
+        for empty_row, dest_row, source_row in zip(empty, destination_index, source_index)
+    ]
+
+def _draw_keyframe_fields(m, rng):
+    """Draw the keyframes of m wavetables as per-wavetable counts and (m, 8) position, start, fade and size lists"""
+    num_keyframes = rng.integers(2, _MAX_KEYFRAMES, size=m, endpoint=True)
+    positions = rng.integers(0, 256, size=(m, _MAX_KEYFRAMES), endpoint=True)
+    # Push unused slots past the end before sorting each row
+    positions[np.arange(_MAX_KEYFRAMES) >= num_keyframes[:, None]] = np.iinfo(positions.dtype).max
+    positions.sort(axis=1)
+
+    positions = positions.tolist()
+    start_position = (rng.random((m, _MAX_KEYFRAMES)) * 4000).tolist()  # Random start position in samples
+    window_fade = (0.5 + rng.random((m, _MAX_KEYFRAMES)) * 0.5).tolist()  # Random fade between 50% and 100%
+    window_size = np.where(rng.random((m, _MAX_KEYFRAMES)) < 0.5, 1024.0, 4096.0).tolist()
+    return num_keyframes.tolist(), positions, start_position, window_fade, window_size
+
+def _wavetable_dicts(fields):
+    """Wavetable dicts of the keyframes drawn by _draw_keyframe_fields"""
+    num_keyframes, positions, start_position, window_fade, window_size = fields
+    wavetables = []
+    for j, k in enumerate(num_keyframes):
+        keyframes = [
+            {
+                "position": pos,
+                "start_position": start,
+                "window_fade": fade,
+                "window_size": size
+            }
+            for pos, start, fade, size in zip(positions[j][:k], start_position[j][:k], window_fade[j][:k], window_size[j][:k])
+        ]
+        wavetables.append(wavetable_from_keyframes(keyframes))
+    return wavetables
+
+def _draw_names(n, count, rng, length=8):
+    """Draw n * count random names of `length` letters"""
+    letters = _LETTERS[rng.integers(0, len(_LETTERS), size=(n, count * length))]
+    return [
+        [row[i:i + length] for i in range(0, count * length, length)]
+        for row in (bytes(r).decode("ascii") for r in letters)
+    ]
+
+def _draw_styles(n, preset_style, rng):
+    """Style index (into the style range table) and style name of n presets"""
+    styles = PRESET_SCHEMA.preset_styles
+    # If Random style, choose one randomly per preset
+    if preset_style == "Random":
+        style_index = rng.integers(0, len(styles), size=n)
+        return style_index, [styles[i] for i in style_index.tolist()]
+    # Unknown styles fall back to the Keys ranges, like get_style_ranges
+    style = preset_style if preset_style in styles else "Keys"
+    return np.full(n, styles.index(style), dtype=np.intp), [preset_style] * n
+
+# The collector switch is process wide, so batches on several threads share one
+# pause: the first to start disables it, the last to finish restores it
+_gc_lock = threading.Lock()
+_gc_pauses = 0
+_gc_was_enabled = False
+
+@contextmanager
+def gc_paused():
+    """Context manager that pauses the cyclic garbage collector while a batch is built"""
+    # A batch allocates millions of small acyclic containers; pause the cyclic
+    # collector so it does not rescan them over and over while they are built
+    global _gc_pauses, _gc_was_enabled
+    with _gc_lock:
+        if _gc_pauses == 0:
+            _gc_was_enabled = gc.isenabled()
+            gc.disable()
+        _gc_pauses += 1
+    try:
+        yield
+    finally:
+        with _gc_lock:
+            _gc_pauses -= 1
+            if _gc_pauses == 0 and _gc_was_enabled:
+                gc.enable()
+
+BatchDraw = namedtuple("BatchDraw", ["preset_styles", "values", "lfos", "routings", "keyframes", "macros"])
+
+def draw_batch(n, preset_style="Random", polyphony_range=(1, 32), empty_mod_chance=70, mod_amount_range=(-1.0, 1.0), mod_power_range=(-4.0, 4.0), rng=None, modulation_sampler=None):
+    """Draw the random values of n presets, section by section, without building them.
+
+    Returns a BatchDraw of:
+      preset_styles: the n style names
+      values: (n, columns) float64 matrix of every scalar setting, in settings order
+      lfos: names, num_points, points, powers and smooth lists of the n * num_lfos LFOs
+      routings: (n, num_modulations) empty, destination index and source index arrays
+      keyframes: counts and (m, 8) position, start_position, window_fade and
+        window_size lists of the n * num_wavetables wavetables
+      macros: n lists of 4 macro names
+
+    generate_preset_batch builds preset dicts from it and
+    compact_preset.generate_compact_batch packed Presets, so both give the
+    same presets for a given seed. Build from it under gc_paused().
+    """
+    rng = np.random.default_rng(rng)
+    style_index, preset_styles = _draw_styles(n, preset_style, rng)
+    arg_ranges = {
+        "polyphony_range": polyphony_range,
+        "mod_amount_range": mod_amount_range,
+        "mod_power_range": mod_power_range
+    }
+    values = _draw_scalars(n, style_index, arg_ranges, rng)
+    lfos = _draw_lfo_fields(n * PRESET_SCHEMA.num_lfos, rng)
+    routings = _draw_routings(n, empty_mod_chance, rng, modulation_sampler)
+    keyframes = _draw_keyframe_fields(n * PRESET_SCHEMA.num_wavetables, rng)
+    macros = _draw_names(n, 4, rng)
+    return BatchDraw(preset_styles, values, lfos, routings, keyframes, macros)
+
+def generate_preset_batch(n, preset_style="Random", volume_range=(1000, 8000), polyphony_range=(1, 32), empty_mod_chance=70, mod_amount_range=(-1.0, 1.0), mod_power_range=(-4.0, 4.0), rng=None, modulation_sampler=None):
+    """Generate n presets with one vectorized draw per section.
+
+    Takes the same parameters as generate_random_preset and returns a list of
+    preset dicts with the same layout. `rng` may be a numpy Generator or
+    anything numpy.random.default_rng accepts as a seed. A
+    modulation_sampler.ModulationSampler draws the whole batch's
+    modulation matrix in one sample_matrix() call.
+    """
+    with gc_paused():
+        draw = draw_batch(n, preset_style, polyphony_range, empty_mod_chance, mod_amount_range, mod_power_range, rng, modulation_sampler)
+        rows = draw.values.tolist()
+        num_lfos = PRESET_SCHEMA.num_lfos
+        num_wavetables = PRESET_SCHEMA.num_wavetables
+        lfos = _lfo_dicts(draw.lfos)
+        modulations = _modulation_lists(draw.routings)
+        wavetables = _wavetable_dicts(draw.keyframes)
+        macros = draw.macros
+
+        presets = []
+        for i, row in enumerate(rows):
+            settings = {}
+            for kind, keys, start, end in _LAYOUT.segments:
+                if kind is None:
+                    settings.update(zip(keys, row[start:end]))
+                elif kind == LFOS:
+                    settings[keys] = lfos[i * num_lfos:(i + 1) * num_lfos]
+                elif kind == MODULATIONS:
+                    settings[keys] = modulations[i]
+                elif kind == SAMPLE:
+                    settings[keys] = empty_sample()
+                elif kind == WAVETABLES:
+                    settings[keys] = wavetables[i * num_wavetables:(i + 1) * num_wavetables]
+            for key, value in _LAYOUT.typed_consts:
+                settings[key] = value
+
+            presets.append({
+                "author": "RandomPresetGenerator",
+                "comments": "Randomly generated preset",
+                "macro1": macros[i][0],
+                "macro2": macros[i][1],
+                "macro3": macros[i][2],
+                "macro4": macros[i][3],
+                "preset_style": draw.preset_styles[i],
+                "synth_version": "1.5.5",
+                "settings": settings
+            })
+
+    return presets
@@ -0,0 +1,157 @@
+import math
+import zlib
+from functools import lru_cache
+
+import numpy as np
+
+from compact_preset import LAYOUT, Preset
+from random_vital_preset import PRESET_SCHEMA, FLOAT, INT, BOOL, STYLE_FLOAT, ARG_FLOAT, ARG_INT
+
+# Active (destination, source) routings are hashed into this many features
+ROUTING_BUCKETS = 64
+
+@lru_cache(maxsize=None)
+def _routing_bucket(destination, source):
+    # crc32 rather than hash() so buckets are the same in every process
+    return zlib.crc32(f"{destination}\0{source}".encode("utf-8")) % ROUTING_BUCKETS
+
+class FeatureLayout:
+    """The settings that make up a preset's feature vector, each scaled to [0, 1].
+
+    Scalar settings are scaled by the full range the generator can draw them
+    from (over every style for style ranges), followed by a bag of active
+    modulation routings. The per-slot modulation amounts are left out: most
+    slots are empty, and their amounts would otherwise swamp the distance.
+    Vectors are divided by sqrt(dim), so distances are RMS differences.
+    """
+
+    def __init__(self, polyphony_range=(1, 32), mod_amount_range=(-1.0, 1.0), mod_power_range=(-4.0, 4.0)):
+        arg_ranges = {
+            "polyphony_range": polyphony_range,
+            "mod_amount_range": mod_amount_range,
+            "mod_power_range": mod_power_range,
+        }
+        style_ranges = PRESET_SCHEMA.style_ranges.values()
+        keys, lows, highs = [], [], []
+        for key, kind, low, high in PRESET_SCHEMA.settings_specs:
+            if kind in (FLOAT, INT):
+                bounds = (low, high)
+            elif kind == BOOL:
+                bounds = (0.0, 1.0)
+            elif kind == STYLE_FLOAT:
+                bounds = (min(ranges[low][0] for ranges in style_ranges), max(ranges[low][1] for ranges in style_ranges))
+            elif kind in (ARG_FLOAT, ARG_INT):
+                bounds = arg_ranges[low]
+            else:
+                continue  # constants and structural settings
+            keys.append(key)
+            lows.append(bounds[0])
+            highs.append(bounds[1])
+        self.keys = tuple(keys)
+        self.packed_index = np.array([LAYOUT.index[key] for key in keys], dtype=np.intp)
+        self.low = np.array(lows, dtype=np.float64)
+        span = np.array(highs, dtype=np.float64) - self.low
+        span[span == 0] = 1.0
+        self.inv_span = 1.0 / span
+        self.dim = len(keys) + ROUTING_BUCKETS
+        self._norm = 1.0 / math.sqrt(self.dim)
+
+    def vector(self, preset):
+        """Feature vector of a preset dict or compact_preset Preset"""
+        num_scalars = len(self.keys)
+        vector = np.zeros(self.dim, dtype=np.float64)
+        if isinstance(preset, Preset):
+            values = np.frombuffer(preset.values, dtype=np.float64)[self.packed_index]
+            routings = preset.routings()
+        else:
+            settings = preset["settings"]
+            values = np.fromiter((settings[key] for key in self.keys), dtype=np.float64, count=num_scalars)
+            routings = [(modulation["destination"], modulation["source"]) for modulation in settings["modulations"]]
+        np.clip((values - self.low) * self.inv_span, 0.0, 1.0, out=vector[:num_scalars])
+        for destination, source in routings:
+            if source:
+                vector[num_scalars + _routing_bucket(destination, source)] = 1.0
+        vector *= self._norm
+        return vector
+
+@lru_cache(maxsize=16)
+def feature_layout(polyphony_range=(1, 32), mod_amount_range=(-1.0, 1.0), mod_power_range=(-4.0, 4.0)):
+    return FeatureLayout(tuple(polyphony_range), tuple(mod_amount_range), tuple(mod_power_range))
+
+def preset_features(preset, preset_options=None):
+    """Feature vector of a preset generated with `preset_options` (generate_random_preset kwargs)"""
+    options = preset_options or {}
+    layout = feature_layout(
+        tuple(options.get("polyphony_range", (1, 32))),
+        tuple(options.get("mod_amount_range", (-1.0, 1.0))),
+        tuple(options.get("mod_power_range", (-4.0, 4.0))),
+    )
+    return layout.vector(preset)
+
+class DiversityIndex:
+    """Incremental near-duplicate filter over feature vectors.
+
+    add() keeps a vector unless an already kept one lies within
+    `min_distance` of it. Candidates come from `num_tables` Euclidean LSH
+    tables of `hashes_per_table` random projections each, so a lookup only
+    compares against vectors that share a bucket instead of all of them.
+
+    Like any LSH this is approximate, trading missed duplicates for speed.
+    Random presets are typically about 0.5 apart and hardly ever closer
+    than 0.4. Duplicates well inside that are nearly always caught; as
+    `min_distance` approaches it, more slip through (about half at 0.4).
+    A wider `bucket_width` (default 2 * min_distance) or more tables catch
+    more, at the cost of comparing against more vectors per lookup.
+    """
+
+    def __init__(self, min_distance, num_tables=16, hashes_per_table=8, bucket_width=None, seed=0):
+        if min_distance <= 0:
+            raise ValueError("min_distance must be positive")
+        self.min_distance = min_distance
+        self.num_tables = num_tables
+        self.hashes_per_table = hashes_per_table
+        self.bucket_width = bucket_width or 2 * min_distance
+        self._seed = seed
+        self._tables = [{} for _ in range(num_tables)]
+        self._projections = None
+        self._offsets = None
+        self._vectors = None
+        self.size = 0
+        self.rejected = 0
+        self.comparisons = 0
+
+    def _init(self, dim):
+        rng = np.random.default_rng(self._seed)
+        self._projections = rng.standard_normal((self.num_tables * self.hashes_per_table, dim))
+        self._offsets = rng.uniform(0.0, self.bucket_width, self.num_tables * self.hashes_per_table)
+        self._vectors = np.empty((1024, dim), dtype=np.float64)
+
+    def _keys(self, vector):
+        hashes = np.floor((self._projections @ vector + self._offsets) / self.bucket_width).astype(np.int64)
+        return [row.tobytes() for row in hashes.reshape(self.num_tables, self.hashes_per_table)]
+
+    def add(self, vector):
+        """Keep `vector` and return True, or return False if it is a near duplicate"""
+        if self._projections is None:
+            self._init(len(vector))
+        keys = self._keys(vector)
+        candidates = set()
+        for table, key in zip(self._tables, keys):
+            bucket = table.get(key)
+            if bucket:
+                candidates.update(bucket)
+        if candidates:
+            indices = np.fromiter(candidates, dtype=np.intp, count=len(candidates))
+            self.comparisons += len(indices)
+            distances = np.linalg.norm(self._vectors[indices] - vector, axis=1)
+            if distances.min() < self.min_distance:
+                self.rejected += 1
+                return False
+
+        if self.size == len(self._vectors):
+            self._vectors = np.concatenate([self._vectors, np.empty_like(self._vectors)])
+        self._vectors[self.size] = vector
+        for table, key in zip(self._tables, keys):
+            table.setdefault(key, []).append(self.size)
+        self.size += 1
+        return True
@@ -0,0 +1,202 @@
+import random
+import threading
+import time
+from collections import deque
+
+from preset_serializer import serialize_preset
+from random_vital_preset import check_preset_options, generate_random_preset, random_name
+
+# generate_random_preset parameters that select a pool, in signature order
+OPTION_NAMES = ("preset_style", "volume_range", "polyphony_range", "empty_mod_chance", "mod_amount_range", "mod_power_range")
+
+def pool_key(preset_style="Random", volume_range=(1000, 8000), polyphony_range=(1, 32), empty_mod_chance=70, mod_amount_range=(-1.0, 1.0), mod_power_range=(-4.0, 4.0), compact=False, backend="json"):
+    """Hashable key of the pool serving presets generated and serialized with these arguments.
+
+    Raises ValueError for arguments generate_random_preset cannot draw from,
+    so a bad request fails here rather than in the refill thread.
+    """
+    check_preset_options(preset_style, volume_range, polyphony_range, empty_mod_chance, mod_amount_range, mod_power_range)
+    options = (preset_style, tuple(volume_range), tuple(polyphony_range), float(empty_mod_chance),
+               tuple(mod_amount_range), tuple(mod_power_range))
+    return options, compact, backend
+
+class _Pool:
+    __slots__ = ("items", "bytes", "refilling", "last_used", "rng")
+
+    def __init__(self, seed):
+        self.items = deque()  # (name, serialized bytes)
+        self.bytes = 0
+        self.refilling = False
+        self.last_used = time.monotonic()
+        # Only the refill thread draws from a pool's own rng
+        self.rng = random.Random(seed)
+
+class PresetPool:
+    """Pre-generated, pre-serialized presets, one bounded pool per set of arguments.
+
+    get() pops a ready (name, bytes) pair and only generates on a miss. When
+    a pool drops below `low_water` a background thread refills it to
+    `capacity`. At most `max_pools` pools are kept; the one idle longest
+    (by last take() or warm()) is dropped to make room for a new one. Each
+    pool draws from its own seeded rng, so request threads never share one
+    with the refill thread. A refill that fails only stops its own pool;
+    stats() counts the failures and keeps the last error.
+    """
+
+    def __init__(self, capacity=32, low_water=8, max_pools=16):
+        if not 0 <= low_water <= capacity:
+            raise ValueError("low_water must be between 0 and capacity")
+        self.capacity = capacity
+        self.low_water = low_water
+        self.max_pools = max_pools
+        self._pools = {}  # pool_key -> _Pool
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._refills = deque()  # (pool_key, time requested)
+        self._seeds = random.Random()  # seeds per pool and per miss; used under the lock
+        self._closed = False
+        self._thread = None
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._refill_count = 0
+        self._refill_seconds = 0.0
+        self._refill_max_seconds = 0.0
+        self._refill_errors = 0
+        self._last_refill_error = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def take(self, **options):
+        """Pop a pooled (name, bytes) for pool_key(**options), or return None on a miss"""
+        key = pool_key(**options)
+        with self._lock:
+            pool = self._pool(key)
+            if pool.items:
+                name, data = pool.items.popleft()
+                pool.bytes -= len(data)
+                self._hits += 1
+                item = (name, data)
+            else:
+                self._misses += 1
+                item = None
+            if len(pool.items) < self.low_water:
+                self._request_refill(key, pool)
+        return item
+
+    def get(self, **options):
+        """A (name, bytes) preset for pool_key(**options), generated on the spot on a miss"""
+        item = self.take(**options)
+        if item is None:
+            item = self.generate(**options)
+        return item
+
+    def generate(self, **options):
+        """A freshly generated (name, bytes) for `options`, bypassing the pools"""
+        with self._lock:
+            seed = self._seeds.getrandbits(64)
+        return self._generate(pool_key(**options), random.Random(seed))
+
+    def warm(self, **options):
+        """Start filling the pool for `options` without taking from it"""
+        key = pool_key(**options)
+        with self._lock:
+            self._request_refill(key, self._pool(key))
+
+    def stats(self):
+        """Hit rate, refill latency and pooled memory"""
+        with self._lock:
+            requests = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / requests if requests else None,
+                "refills": self._refill_count,
+                "refill_latency_mean_s": self._refill_seconds / self._refill_count if self._refill_count else None,
+                "refill_latency_max_s": self._refill_max_seconds,
+                "refill_errors": self._refill_errors,
+                "last_refill_error": self._last_refill_error,
+                "pools": len(self._pools),
+                "evictions": self._evictions,
+                "presets": sum(len(pool.items) for pool in self._pools.values()),
+                "bytes": sum(pool.bytes for pool in self._pools.values()),
+            }
+
+    def close(self):
+        """Stop the refill thread and drop every pool"""
+        with self._lock:
+            self._closed = True
+            self._pools.clear()
+            self._wakeup.notify()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _pool(self, key):
+        """The pool for `key`, created (evicting the longest idle) if needed; caller holds the lock"""
+        pool = self._pools.get(key)
+        if pool is None:
+            while self._pools and len(self._pools) >= self.max_pools:
+                del self._pools[min(self._pools, key=lambda k: self._pools[k].last_used)]
+                self._evictions += 1
+            pool = self._pools[key] = _Pool(self._seeds.getrandbits(64))
+        pool.last_used = time.monotonic()
+        return pool
+
+    def _request_refill(self, key, pool):
+        # Caller holds the lock
+        if pool.refilling or self._closed:
+            return
+        pool.refilling = True
+        self._refills.append((key, time.perf_counter()))
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._refill_loop, name="preset-pool-refill", daemon=True)
+            self._thread.start()
+        self._wakeup.notify()
+
+    def _generate(self, key, rng):
+        options, compact, backend = key
+        preset = generate_random_preset(rng=rng, **dict(zip(OPTION_NAMES, options)))
+        return random_name(rng=rng), serialize_preset(preset, compact, backend)
+
+    def _refill_loop(self):
+        while True:
+            with self._lock:
+                while not self._refills and not self._closed:
+                    self._wakeup.wait()
+                if self._closed:
+                    return
+                key, requested = self._refills.popleft()
+                pool = self._pools.get(key)
+
+            # Generate outside the lock so get() keeps serving other pools meanwhile
+            error = None
+            while pool is not None:
+                with self._lock:
+                    # Stop if the pool was evicted or is full
+                    if self._closed or self._pools.get(key) is not pool or len(pool.items) >= self.capacity:
+                        break
+                try:
+                    name, data = self._generate(key, pool.rng)
+                except Exception as e:
+                    # Give up on this pool only; the thread keeps refilling the others
+                    error = f"{type(e).__name__}: {e}"
+                    break
+                with self._lock:
+                    pool.items.append((name, data))
+                    pool.bytes += len(data)
+
+            if pool is not None:
+                with self._lock:
+                    pool.refilling = False
+                    if error is not None:
+                        self._refill_errors += 1
+                        self._last_refill_error = error
+                        continue
+                    elapsed = time.perf_counter() - requested
+                    self._refill_count += 1
+                    self._refill_seconds += elapsed
+                    self._refill_max_seconds = max(self._refill_max_seconds, elapsed)
@@ -0,0 +1,297 @@
+import json
+from json.encoder import encode_basestring_ascii
+
+# Output matches json.dumps(obj, indent=2) byte for byte, which is how Vital and
+# the rest of this repo write presets. The stdlib only has a C encoder for
+# indent=None, so indented output goes through its pure-Python encoder and
+# re-escapes every string and constant sub-object of every preset. This encoder
+# splices in fragments encoded once instead.
+
+_INDENT = "  "
+_INFINITY = float("inf")
+
+# Registered templates, looked up by (number of keys, first key)
+_templates = {}
+
+class _Template:
+    """A dict layout whose fields are constant except for `variable_keys`"""
+
+    def __init__(self, template, variable_keys):
+        self.keys = list(template)
+        self.values = dict(template)
+        self.constants = [(key, value) for key, value in template.items() if key not in variable_keys]
+        self.variable_keys = frozenset(variable_keys)
+        self._slots = {}  # indent level -> ([(prefix, key), ...], suffix)
+
+    def matches(self, d):
+        if list(d) != self.keys:
+            return False
+        for key, value in self.constants:
+            other = d[key]
+            # Identity first: generated presets share the same constant objects
+            if other is not value and (type(other) is not type(value) or other != value):
+                return False
+        return True
+
+    def slots(self, level):
+        """Pre-encoded text before each variable field of a dict at `level`, plus the closing text"""
+        cached = self._slots.get(level)
+        if cached is None:
+            slots = []
+            text = []
+            newline_indent = "\n" + _INDENT * (level + 1)
+            for i, key in enumerate(self.keys):
+                text.append(("{" if i == 0 else ",") + newline_indent + encode_basestring_ascii(key) + ": ")
+                if key in self.variable_keys:
+                    slots.append(("".join(text), key))
+                    text = []
+                else:
+                    _encode(self.values[key], level + 1, text)
+            text.append("\n" + _INDENT * level + "}")
+            cached = self._slots[level] = (slots, "".join(text))
+        return cached
+
+def register_template(template, variable_keys=()):
+    """Encode the constant fields of dicts shaped like `template` only once.
+
+    Any dict with the same keys (in the same order) whose fields outside
+    `variable_keys` equal the template's is written from cached fragments,
+    with only the variable fields encoded per call.
+    """
+    if not template:
+        return
+    _templates[(len(template), next(iter(template)))] = _Template(template, variable_keys)
+
+def register_layout(keys):
+    """Pre-encode the keys of dicts that always have exactly `keys`, in order"""
+    register_template(dict.fromkeys(keys), keys)
+
+_FLOAT_SPECIALS = {"nan": "NaN", "inf": "Infinity", "-inf": "-Infinity"}
+
+# Dict keys repeat across presets, so keep their encoded form
+_key_cache = {}
+
+def _float_text(o):
+    text = float.__repr__(o)
+    return _FLOAT_SPECIALS.get(text, text)
+
+def _key_text(key):
+    text = _key_cache.get(key)
+    if text is not None:
+        return text
+    if isinstance(key, str):
+        text = encode_basestring_ascii(key)
+    elif isinstance(key, float):
+        text = '"' + _float_text(key) + '"'
+    elif key is True:
+        text = '"true"'
+    elif key is False:
+        text = '"false"'
+    elif key is None:
+        text = '"null"'
+    elif isinstance(key, int):
+        text = '"' + int.__repr__(key) + '"'
+    else:
+        raise TypeError(f"keys must be str, int, float, bool or None, not {key.__class__.__name__}")
+    if type(key) is str and len(_key_cache) < 65536:
+        _key_cache[key] = text
+    return text
+
+def _scalar_text(o):
+    """Encoding of a scalar, or None for containers and unknown types"""
+    t = type(o)
+    if t is float:
+        text = float.__repr__(o)
+        return _FLOAT_SPECIALS.get(text, text)
+    if t is str:
+        return encode_basestring_ascii(o)
+    if t is int:
+        return int.__repr__(o)
+    if o is None:
+        return "null"
+    if o is True:
+        return "true"
+    if o is False:
+        return "false"
+    return None
+
+def _encode(o, level, parts):
+    """Append the indent=2 encoding of `o` at nesting `level` to `parts`"""
+    text = _scalar_text(o)
+    if text is not None:
+        parts.append(text)
+    elif isinstance(o, str):
+        parts.append(encode_basestring_ascii(o))
+    elif isinstance(o, int):
+        parts.append(int.__repr__(o))
+    elif isinstance(o, float):
+        parts.append(_float_text(o))
+    elif isinstance(o, (list, tuple)):
+        if not o:
+            parts.append("[]")
+            return
+        newline_indent = "\n" + _INDENT * (level + 1)
+        separator = "," + newline_indent
+        text = "[" + newline_indent
+        for value in o:
+            value_text = _scalar_text(value)
+            if value_text is not None:
+                parts.append(text + value_text)
+            else:
+                parts.append(text)
+                _encode(value, level + 1, parts)
+            text = separator
+        parts.append("\n" + _INDENT * level + "]")
+    elif isinstance(o, dict):
+        if not o:
+            parts.append("{}")
+            return
+        template = _templates.get((len(o), next(iter(o))))
+        if template is not None and template.matches(o):
+            slots, suffix = template.slots(level)
+            for prefix, key in slots:
+                value = o[key]
+                value_text = _scalar_text(value)
+                if value_text is not None:
+                    parts.append(prefix + value_text)
+                else:
+                    parts.append(prefix)
+                    _encode(value, level + 1, parts)
+            parts.append(suffix)
+            return
+        newline_indent = "\n" + _INDENT * (level + 1)
+        separator = "," + newline_indent
+        text = "{" + newline_indent
+        for key, value in o.items():
+            value_text = _scalar_text(value)
+            if value_text is not None:
+                parts.append(text + _key_text(key) + ": " + value_text)
+            else:
+                parts.append(text + _key_text(key) + ": ")
+                _encode(value, level + 1, parts)
+            text = separator
+        parts.append("\n" + _INDENT * level + "}")
+    else:
+        raise TypeError(f"Object of type {o.__class__.__name__} is not JSON serializable")
+
+def dumps_preset(preset):
+    """Return the same text as json.dumps(preset, indent=2)"""
+    parts = []
+    _encode(preset, 0, parts)
+    return "".join(parts)
+
+_orjson = None  # module once imported, False when unavailable
+
+def _has_orjson():
+    global _orjson
+    if _orjson is None:
+        try:
+            import orjson
+        except ImportError:
+            orjson = False
+        _orjson = orjson
+    return _orjson is not False
+
+def serialize_preset(preset, compact=False, backend="json"):
+    """Encode a preset to UTF-8 JSON bytes.
+
+    The default layout is Vital's own (indent=2); `compact` drops all
+    indentation and spacing. `backend` is "json" (the default: stdlib,
+    byte-identical to json.dumps), "orjson" or "auto" (orjson when
+    installed, else json). orjson is only used when asked for: it writes
+    the same layout and values but spells float exponents differently
+    (1e-05 vs 1e-5), emits non-ASCII text unescaped and writes NaN as null.
+    Compact presets (compact_preset.Preset) are written from their to_dict().
+    """
+    if not isinstance(preset, dict):
+        preset = preset.to_dict()
+    if backend == "auto":
+        backend = "orjson" if _has_orjson() else "json"
+    if backend == "orjson":
+        if not _has_orjson():
+            raise ValueError("orjson backend requested but orjson is not installed")
+        return _orjson.dumps(preset) if compact else _orjson.dumps(preset, option=_orjson.OPT_INDENT_2)
+    if backend != "json":
+        raise ValueError(f"Unknown serializer backend: {backend}")
+    if compact:
+        return json.dumps(preset, separators=(",", ":")).encode("utf-8")
+    return dumps_preset(preset).encode("utf-8")
+
+_COMPACT_SEPARATORS = (",", ":")
+
+def _compact_slots(d, variable_keys):
+    """Compact counterpart of _Template.slots"""
+    slots = []
+    text = []
+    for i, key in enumerate(d):
+        text.append(("{" if i == 0 else ",") + encode_basestring_ascii(key) + ":")
+        if key in variable_keys:
+            slots.append(("".join(text), key))
+            text = []
+        else:
+            text.append(json.dumps(d[key], separators=_COMPACT_SEPARATORS))
+    text.append("}")
+    return slots, "".join(text)
+
+class PresetFrame:
+    """Serializer for presets that differ from `base` only in some settings.
+
+    The top-level fields of `base` and its settings outside
+    `variable_keys` are encoded once, here. serialize() then encodes just
+    the variable settings of each preset and splices them in, so a preset
+    must have base's top-level fields and fixed settings, and its settings
+    dict base's keys in base's order, plus any variable key base lacks at
+    the end. The output is the same as serialize_preset's. The orjson
+    backend is fast enough to encode each preset whole.
+    """
+
+    def __init__(self, base, variable_keys, compact=False, backend="json"):
+        if backend == "auto":
+            backend = "orjson" if _has_orjson() else "json"
+        if backend == "orjson" and not _has_orjson():
+            raise ValueError("orjson backend requested but orjson is not installed")
+        if backend not in ("json", "orjson"):
+            raise ValueError(f"Unknown serializer backend: {backend}")
+        self.compact = compact
+        self.backend = backend
+        settings = dict(base["settings"])
+        for key in variable_keys:
+            settings.setdefault(key, None)
+        self.keys = tuple(settings)
+        if compact:
+            self._outer = _compact_slots(base, ("settings",))
+            self._inner = _compact_slots(settings, frozenset(variable_keys))
+        else:
+            self._outer = _Template(base, ("settings",)).slots(0)
+            self._inner = _Template(settings, variable_keys).slots(1)
+
+    def serialize(self, preset):
+        """Encode `preset` to UTF-8 JSON bytes"""
+        if self.backend == "orjson":
+            return serialize_preset(preset, self.compact, "orjson")
+        settings = preset["settings"]
+        (outer_prefix, _), = self._outer[0]
+        slots, suffix = self._inner
+        parts = [outer_prefix]
+        if self.compact:
+            for prefix, key in slots:
+                parts.append(prefix)
+                parts.append(json.dumps(settings[key], separators=_COMPACT_SEPARATORS))
+        else:
+            for prefix, key in slots:
+                value = settings[key]
+                value_text = _scalar_text(value)
+                if value_text is not None:
+                    parts.append(prefix + value_text)
+                else:
+                    parts.append(prefix)
+                    _encode(value, 2, parts)
+        parts.append(suffix)
+        parts.append(self._outer[1])
+        return "".join(parts).encode("utf-8")
+
+def write_preset(preset, fp, compact=False, backend="json"):
+    """Write a preset to the binary file object `fp` and return the number of bytes written"""
+    data = serialize_preset(preset, compact, backend)
+    fp.write(data)
+    return len(data)
@@ -0,0 +1,330 @@
+import argparse
+import asyncio
+import json
+import math
+import random
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+from urllib.parse import parse_qs, urlsplit
+
+from preset_pool import PresetPool
+from preset_serializer import serialize_preset
+from random_vital_preset import PRESET_SCHEMA, check_range, generate_vitalbank, seeded_preset
+
+# A local HTTP service that streams generated banks:
+#
+#     python preset_server.py --port 8765
+#     curl -o bank.vitalbank "http://127.0.0.1:8765/bank?count=100&seed=1&preset_style=Pad"
+#
+# GET /bank takes count and seed plus any generate_random_preset parameter;
+# ranges are given as "min,max". The zip is sent with chunked encoding while
+# it is generated on a worker thread, so the event loop never blocks on it.
+# Unseeded banks get a fresh seed, which names the file; with the same seed
+# and timestamp (YYYY-MM-DDTHH:MM:SS, default now) a bank is byte-identical.
+#
+# GET /preset takes the same parameters (without count) and returns a single
+# .vital, served from a PresetPool of pre-generated presets unless seeded.
+# GET /stats returns the pool's stats.
+
+MAX_COUNT = 10000
+_CHUNK_BYTES = 64 * 1024
+# Chunks buffered per response before generation waits for the client to catch up
+_QUEUE_CHUNKS = 16
+_MAX_HEADER_LINES = 100
+
+# Seeds for unseeded requests; drawn from the OS, so request threads never share an rng
+_seeds = random.SystemRandom()
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 503: "Service Unavailable"}
+
+class _Cancelled(Exception):
+    """The client went away while its bank was being generated"""
+
+class _QueueWriter:
+    """Write-only binary file that hands zip output to the event loop in bounded chunks"""
+
+    def __init__(self, loop, queue):
+        self._loop = loop
+        self._queue = queue
+        self._buffer = bytearray()
+        self.cancelled = False
+
+    def write(self, data):
+        if self.cancelled:
+            raise _Cancelled()
+        self._buffer += data
+        if len(self._buffer) >= _CHUNK_BYTES:
+            self._push(bytes(self._buffer))
+            self._buffer.clear()
+        return len(data)
+
+    def flush(self):
+        if self._buffer and not self.cancelled:
+            self._push(bytes(self._buffer))
+            self._buffer.clear()
+
+    def _push(self, item):
+        # Blocks the worker thread while the queue is full: backpressure from a slow client
+        future = asyncio.run_coroutine_threadsafe(self._queue.put(item), self._loop)
+        while True:
+            try:
+                return future.result(timeout=0.5)
+            except FutureTimeoutError:
+                # Nobody is draining a cancelled stream (e.g. the server is shutting down)
+                if self.cancelled:
+                    future.cancel()
+                    raise _Cancelled() from None
+
+    def finish(self, error=None):
+        """Mark the end of the stream; `error` is the exception that ended it, if any"""
+        self._push(error or b"")
+
+def _generate_bank(out, count, seed, timestamp, jobs, preset_options):
+    try:
+        generate_vitalbank(count, output=out, jobs=jobs, seed=seed, timestamp=timestamp, preset_options=preset_options)
+        out.flush()
+        out.finish()
+    except BaseException as e:
+        try:
+            out.finish(e)
+        except _Cancelled:
+            pass
+
+def _finite_float(text):
+    value = float(text)
+    if not math.isfinite(value):
+        raise ValueError(f"not a finite number: {text!r}")
+    return value
+
+def _parse_range(text, cast):
+    parts = text.split(",")
+    if len(parts) != 2:
+        raise ValueError(f"expected min,max: {text!r}")
+    return check_range((cast(parts[0]), cast(parts[1])))
+
+_PARAM_PARSERS = {
+    "count": int,
+    "seed": int,
+    "timestamp": datetime.fromisoformat,
+    "preset_style": str,
+    "volume_range": lambda text: _parse_range(text, _finite_float),
+    "polyphony_range": lambda text: _parse_range(text, int),
+    "empty_mod_chance": _finite_float,
+    "mod_amount_range": lambda text: _parse_range(text, _finite_float),
+    "mod_power_range": lambda text: _parse_range(text, _finite_float),
+}
+
+def _parse_params(query, allowed):
+    """Parse the `allowed` query parameters into a dict of preset options, raising ValueError on bad input"""
+    params = {key: values[-1] for key, values in parse_qs(query, keep_blank_values=True).items()}
+    unknown = sorted(set(params) - set(allowed))
+    if unknown:
+        raise ValueError(f"Unknown parameter(s): {', '.join(unknown)}")
+    values = {}
+    for key, text in params.items():
+        try:
+            values[key] = _PARAM_PARSERS[key](text)
+        except ValueError as e:
+            raise ValueError(f"Invalid value for {key}: {text!r} ({e})") from None
+    style = values.get("preset_style", "Random")
+    if style != "Random" and style not in PRESET_SCHEMA.preset_styles:
+        raise ValueError(f"Unknown preset_style: {style!r}")
+    return values
+
+def parse_bank_query(query):
+    """Map a /bank query string to (count, seed, timestamp, preset_options), raising ValueError on bad input"""
+    values = _parse_params(query, _PARAM_PARSERS)
+    count = values.pop("count", 5)
+    if not 1 <= count <= MAX_COUNT:
+        raise ValueError(f"count must be between 1 and {MAX_COUNT}")
+    seed = values.pop("seed", None)
+    timestamp = values.pop("timestamp", None)
+    return count, seed, timestamp, values
+
+def parse_preset_query(query):
+    """Map a /preset query string to (seed, preset_options), raising ValueError on bad input"""
+    values = _parse_params(query, set(_PARAM_PARSERS) - {"count", "timestamp"})
+    seed = values.pop("seed", None)
+    return seed, values
+
+def _generate_preset(seed, preset_options):
+    """A (name, bytes) preset drawn from `seed`, as generate_vitalbank names seeded presets"""
+    name, preset = seeded_preset(seed, **preset_options)
+    return name, serialize_preset(preset)
+
+class PresetServer:
+    """Serves GET /bank, generating at most `max_concurrent` banks at a time.
+
+    Requests beyond the limit get a 503 right away. Each bank is generated
+    on its own executor thread (with `jobs` processes per bank when > 1).
+    Single presets come from `pool`; misses are generated on the executor.
+    """
+
+    def __init__(self, max_concurrent=4, jobs=1, pool=None):
+        self.max_concurrent = max_concurrent
+        self.jobs = jobs
+        self.active = 0
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix="preset-server")
+        self.pool = pool if pool is not None else PresetPool()
+
+    async def start(self, host="127.0.0.1", port=8765):
+        return await asyncio.start_server(self.handle, host, port)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.pool.close()
+
+    async def handle(self, reader, writer):
+        try:
+            request_line = (await reader.readline()).decode("latin-1").split()
+            # Headers are read and ignored; every response closes the connection
+            for _ in range(_MAX_HEADER_LINES):
+                if (await reader.readline()) in (b"\r\n", b"\n", b""):
+                    break
+            if len(request_line) != 3:
+                await self._send_error(writer, 400, "Malformed request line")
+                return
+            method, target, _ = request_line
+            url = urlsplit(target)
+            if url.path not in ("/bank", "/preset", "/stats"):
+                await self._send_error(writer, 404, "Not found; use GET /bank, /preset or /stats")
+                return
+            if method != "GET":
+                await self._send_error(writer, 405, "Only GET is supported")
+                return
+            if url.path == "/stats":
+                await self._send_body(writer, json.dumps(self.pool.stats()).encode("utf-8"), "application/json")
+                return
+            if url.path == "/preset":
+                await self._send_preset(writer, url.query)
+                return
+            try:
+                count, seed, timestamp, preset_options = parse_bank_query(url.query)
+            except ValueError as e:
+                await self._send_error(writer, 400, str(e))
+                return
+            if self.active >= self.max_concurrent:
+                await self._send_error(writer, 503, "Too many banks in progress, retry later", {"Retry-After": "1"})
+                return
+            self.active += 1
+            try:
+                await self._stream_bank(writer, count, seed, timestamp, preset_options)
+            finally:
+                self.active -= 1
+        except (ConnectionError, asyncio.IncompleteReadError):
+            writer.transport.abort()
+        except asyncio.CancelledError:
+            # Server shutdown: don't wait for a slow client to take the buffered data. This
+            # is the connection's own task, so ending it here is the end of the cancellation.
+            writer.transport.abort()
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _stream_bank(self, writer, count, seed, timestamp, preset_options):
+        if seed is None:
+            seed = _seeds.getrandbits(64)
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(_QUEUE_CHUNKS)
+        out = _QueueWriter(loop, queue)
+        future = loop.run_in_executor(self.executor, _generate_bank, out, count, seed, timestamp, self.jobs, preset_options)
+        name = f"random_{seed}"
+        await self._send_head(writer, 200, {
+            "Content-Type": "application/zip",
+            "Content-Disposition": f'attachment; filename="{name}.vitalbank"',
+            "Transfer-Encoding": "chunked",
+        })
+        try:
+            while True:
+                item = await queue.get()
+                if isinstance(item, BaseException):
+                    # Too late for an error status; drop the connection so the client sees a truncated body
+                    writer.transport.abort()
+                    return
+                if not item:
+                    writer.write(b"0\r\n\r\n")
+                    await writer.drain()
+                    return
+                writer.write(b"%x\r\n%s\r\n" % (len(item), item))
+                await writer.drain()
+        finally:
+            if not future.done():
+                # Client went away: stop the worker, discarding its output until it returns
+                out.cancelled = True
+                while not future.done():
+                    while not queue.empty():
+                        queue.get_nowait()
+                    await asyncio.wait({future}, timeout=0.1)
+            await future
+
+    async def _send_preset(self, writer, query):
+        try:
+            seed, preset_options = parse_preset_query(query)
+        except ValueError as e:
+            await self._send_error(writer, 400, str(e))
+            return
+        item = self.pool.take(**preset_options) if seed is None else None
+        if item is None:
+            # Seeded request or pool miss: generate off the event loop
+            loop = asyncio.get_running_loop()
+            if seed is None:
+                item = await loop.run_in_executor(self.executor, partial(self.pool.generate, **preset_options))
+            else:
+                item = await loop.run_in_executor(self.executor, _generate_preset, seed, preset_options)
+        name, data = item
+        await self._send_body(writer, data, "application/json", {"Content-Disposition": f'attachment; filename="{name}.vital"'})
+
+    async def _send_body(self, writer, body, content_type, headers=None):
+        await self._send_head(writer, 200, {"Content-Type": content_type, "Content-Length": str(len(body)), **(headers or {})})
+        writer.write(body)
+        await writer.drain()
+
+    async def _send_head(self, writer, status, headers):
+        lines = [f"HTTP/1.1 {status} {_REASONS[status]}"]
+        lines.extend(f"{key}: {value}" for key, value in headers.items())
+        lines.append("Connection: close")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        await writer.drain()
+
+    async def _send_error(self, writer, status, message, headers=None):
+        body = json.dumps({"error": message}).encode("utf-8")
+        await self._send_head(writer, status, {
+            "Content-Type": "application/json",
+            "Content-Length": str(len(body)),
+            **(headers or {}),
+        })
+        writer.write(body)
+        await writer.drain()
+
+async def serve(host="127.0.0.1", port=8765, max_concurrent=4, jobs=1, pool_capacity=32, pool_low_water=8):
+    """Run a PresetServer until cancelled"""
+    server = PresetServer(max_concurrent, jobs, PresetPool(pool_capacity, pool_low_water))
+    listener = await server.start(host, port)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve randomly generated .vitalbank files over HTTP")
+    parser.add_argument("--host", default="127.0.0.1", help="address to bind (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--max-concurrent", type=int, default=4, help="banks generated at once (default: 4)")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="worker processes per bank (default: 1)")
+    parser.add_argument("--pool-capacity", type=int, default=32, help="pre-generated presets per /preset pool (default: 32)")
+    parser.add_argument("--pool-low-water", type=int, default=8, help="refill a pool below this many presets (default: 8)")
+    args = parser.parse_args(argv)
+    print(f"Serving banks on http://{args.host}:{args.port}/bank")
+    try:
+        asyncio.run(serve(args.host, args.port, args.max_concurrent, args.jobs, args.pool_capacity, args.pool_low_water))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,434 @@
+import itertools
+import operator
+from array import array
+from collections import Counter, namedtuple
+
+import numpy as np
+
+from compact_preset import LAYOUT, Preset, KEYFRAME_FIELDS
+from random_vital_preset import PRESET_SCHEMA
+
+REPORT = "report"   # leave presets as they are
+FIX = "fix"         # clamp, round and reorder invalid values in place
+REJECT = "reject"   # drop presets with any invalid value
+MODES = (REPORT, FIX, REJECT)
+
+Bounds = namedtuple("Bounds", ["key", "low", "high", "integer"])
+Issue = namedtuple("Issue", ["index", "key", "problem", "value"])
+
+# Problems reported for settings
+OUT_OF_RANGE = "out of range"
+NOT_INTEGER = "not an integer"
+NOT_A_NUMBER = "missing or not a number"
+NOT_A_LIST = "missing or not a list"
+# Problems reported for LFOs and wavetables
+LFO_POINT_COUNT = "num_points does not match points/powers"
+LFO_X_ORDER = "point x values not ascending"
+LFO_X_RANGE = "point x value outside [0, 1]"
+KEYFRAME_COUNT = "no keyframes"
+KEYFRAME_ORDER = "keyframes not in position order"
+KEYFRAME_RANGE = "keyframe position outside [0, 256]"
+
+# Keyframe positions index the 257 frames of a Vital wavetable
+MAX_KEYFRAME_POSITION = 256
+
+# Presets validated per NumPy pass; bounds the (presets, keys) matrix to a few tens of MB
+_CHUNK_SIZE = 4096
+
+def _per_osc(field, low, high, integer=False):
+    return [Bounds(f"osc_{i}_{field}", low, high, integer) for i in range(1, 4)]
+
+def _per_env(field, low, high, integer=False):
+    return [Bounds(f"env_{i}_{field}", low, high, integer) for i in range(1, 7)]
+
+def _build_bounds():
+    # The range Vital accepts for every scalar setting generate_random_preset
+    # writes. These are Vital's limits; the generator's schema and style
+    # ranges stay inside them, so what this table catches are presets that
+    # were edited, hand written or made by other tools.
+    return (
+        # Basic settings
+        Bounds("volume", 0.0, 7399.4404, False),
+        Bounds("polyphony", 1, 32, True),
+        Bounds("oversampling", 0, 3, True),
+        Bounds("beats_per_minute", 0.333333, 5.0, False),
+        Bounds("bypass", 0, 1, True),
+
+        # Voice settings
+        Bounds("voice_amplitude", 0.0, 1.0, False),
+        Bounds("voice_override", 0, 1, True),
+        Bounds("voice_priority", 0, 4, True),
+        Bounds("voice_transpose", -48, 48, True),
+        Bounds("voice_tune", -1.0, 1.0, False),
+
+        # Effect and filter on/off states
+        *[Bounds(f"{effect}_on", 0, 1, True) for effect in (
+            "chorus", "compressor", "delay", "distortion", "eq",
+            "flanger", "phaser", "reverb", "sample", "filter_1", "filter_2", "filter_fx")],
+
+        # Oscillator settings (for each oscillator)
+        *_per_osc("on", 0, 1, True),
+        *_per_osc("level", 0.0, 1.0),
+        *_per_osc("transpose", -48, 48, True),
+        *_per_osc("tune", -1.0, 1.0),
+        *_per_osc("unison_voices", 1, 16, True),
+        *_per_osc("unison_detune", 0.0, 100.0),
+        *_per_osc("unison_blend", 0.0, 1.0),
+        *_per_osc("stereo_spread", 0.0, 1.0),
+        *_per_osc("random_phase", 0, 1, True),
+        *_per_osc("phase", 0.0, 1.0),
+        *_per_osc("midi_track", 0, 1, True),
+        *_per_osc("distortion_type", 0, 12, True),
+        *_per_osc("spectral_morph_type", 0, 11, True),
+        *_per_osc("frame_spread", -128.0, 128.0),
+        *_per_osc("spectral_morph_amount", 0.0, 1.0),
+        *_per_osc("spectral_morph_phase", 0.0, 1.0),
+        *_per_osc("spectral_morph_spread", 0.0, 1.0),
+
+        # Filter settings
+        Bounds("filter_1_cutoff", 8.0, 136.0, False),
+        Bounds("filter_1_resonance", 0.0, 1.0, False),
+        Bounds("filter_1_blend", 0.0, 2.0, False),
+        Bounds("filter_1_style", 0, 8, True),
+        Bounds("filter_1_model", 0, 7, True),
+        Bounds("filter_1_drive", 0.0, 20.0, False),
+        Bounds("filter_1_mix", 0.0, 1.0, False),
+
+        # Envelope settings (for each envelope)
+        *_per_env("attack", 0.0, 2.37842),
+        *_per_env("decay", 0.0, 2.37842),
+        *_per_env("sustain", 0.0, 1.0),
+        *_per_env("release", 0.0, 2.37842),
+        *_per_env("attack_power", -20.0, 20.0),
+        *_per_env("decay_power", -20.0, 20.0),
+        *_per_env("release_power", -20.0, 20.0),
+
+        # Effects
+        Bounds("reverb_decay_time", -6.0, 6.0, False),
+        Bounds("reverb_dry_wet", 0.0, 1.0, False),
+        Bounds("reverb_size", 0.0, 1.0, False),
+        Bounds("reverb_high_shelf_cutoff", 0.0, 128.0, False),
+        Bounds("reverb_low_shelf_cutoff", 0.0, 128.0, False),
+
+        Bounds("delay_feedback", -1.0, 1.0, False),
+        Bounds("delay_dry_wet", 0.0, 1.0, False),
+        Bounds("delay_tempo", 4, 12, True),
+
+        # Additional settings
+        Bounds("stereo_mode", 0, 1, True),
+        Bounds("pitch_bend_range", 0, 48, True),
+        Bounds("velocity_track", -1.0, 1.0, False),
+        Bounds("portamento_time", -10.0, 4.0, False),
+        Bounds("legato", 0, 1, True),
+
+        # Macro controls
+        *[Bounds(f"macro_control_{i}", 0.0, 1.0, False) for i in range(1, 5)],
+
+        # Modulation slots
+        *[bounds for i in range(1, PRESET_SCHEMA.num_modulations + 1) for bounds in (
+            Bounds(f"modulation_{i}_amount", -1.0, 1.0, False),
+            Bounds(f"modulation_{i}_bipolar", 0, 1, True),
+            Bounds(f"modulation_{i}_bypass", 0, 1, True),
+            Bounds(f"modulation_{i}_power", -10.0, 10.0, False),
+            Bounds(f"modulation_{i}_stereo", 0, 1, True),
+        )],
+    )
+
+SETTINGS_BOUNDS = _build_bounds()
+
+class _Columns:
+    """SETTINGS_BOUNDS as parallel arrays, one column per key"""
+
+    def __init__(self, bounds):
+        self.keys = tuple(b.key for b in bounds)
+        self.low = np.array([b.low for b in bounds], dtype=np.float64)
+        self.high = np.array([b.high for b in bounds], dtype=np.float64)
+        self.integer = np.array([b.integer for b in bounds], dtype=bool)
+        self.getter = operator.itemgetter(*self.keys)
+        # Where each column sits in a compact Preset's values
+        self.packed_index = np.array([LAYOUT.index[key] for key in self.keys], dtype=np.intp)
+
+_COLUMNS = _Columns(SETTINGS_BOUNDS)
+
+class ValidationReport:
+    """Outcome of validate_presets.
+
+    `presets` are the presets to carry on with (all of them, fixed in place
+    for FIX, the valid ones for REJECT), `invalid` the sorted indices of the
+    input presets that had any problem and `counts` a Counter of (key,
+    problem). Only the first `max_issues` problems are kept as Issues.
+    """
+
+    def __init__(self, mode, max_issues):
+        self.mode = mode
+        self.max_issues = max_issues
+        self.presets = []
+        self.invalid = []
+        self.counts = Counter()
+        self.issues = []
+        self.checked = 0
+
+    @property
+    def ok(self):
+        return not self.invalid
+
+    def _room(self):
+        return None if self.max_issues is None else max(self.max_issues - len(self.issues), 0)
+
+    def _add(self, index, key, problem, value):
+        self.counts[key, problem] += 1
+        if self.max_issues is None or len(self.issues) < self.max_issues:
+            self.issues.append(Issue(index, key, problem, value))
+
+    def summary(self):
+        return {
+            "mode": self.mode,
+            "checked": self.checked,
+            "invalid": len(self.invalid),
+            "problems": {f"{key}: {problem}": count for (key, problem), count in self.counts.most_common()},
+        }
+
+def _number(value):
+    if type(value) in (float, int, bool):
+        return value
+    return np.nan
+
+def _settings_matrix(settings_list, columns):
+    """(presets, keys) float matrix of the scalar settings, NaN where a value is missing or not a number"""
+    count = len(settings_list) * len(columns.keys)
+    try:
+        values = np.fromiter(itertools.chain.from_iterable(map(columns.getter, settings_list)), dtype=np.float64, count=count)
+        return values.reshape(len(settings_list), len(columns.keys))
+    except (KeyError, TypeError, ValueError):
+        # Slow path for the odd malformed preset
+        return np.array([[_number(settings.get(key)) for key in columns.keys] for settings in settings_list],
+                        dtype=np.float64)
+
+def _packed_matrix(presets, columns):
+    """_settings_matrix of compact Presets, straight from their value arrays"""
+    values = np.frombuffer(b"".join(preset.values.tobytes() for preset in presets), dtype=np.float64)
+    return values.reshape(len(presets), len(LAYOUT.keys))[:, columns.packed_index]
+
+def _check_settings(settings_list, values, offset, mode, report, columns):
+    """Vectorized bounds check of the (presets, keys) `values` of `settings_list`; returns the bad row mask"""
+    finite = np.isfinite(values)
+    out_of_range = finite & ((values < columns.low) | (values > columns.high))
+    not_integer = finite & columns.integer & (values != np.round(values))
+    bad = ~finite | out_of_range | not_integer
+    bad_rows = bad.any(axis=1)
+    if not bad_rows.any():
+        return bad_rows
+
+    # Count every problem per column, but only look up the values of the first few
+    for mask, problem in ((~finite, NOT_A_NUMBER), (out_of_range, OUT_OF_RANGE), (not_integer & ~out_of_range, NOT_INTEGER)):
+        for col in np.flatnonzero(mask.any(axis=0)):
+            key = columns.keys[col]
+            report.counts[key, problem] += int(np.count_nonzero(mask[:, col]))
+            for row in np.flatnonzero(mask[:, col])[:report._room()]:
+                report.issues.append(Issue(offset + int(row), key, problem, settings_list[row].get(key)))
+
+    if mode == FIX:
+        # Missing and non-numeric values become the low bound
+        fixed = np.where(finite, values, columns.low)
+        fixed = np.where(columns.integer, np.round(fixed), fixed)
+        np.clip(fixed, columns.low, columns.high, out=fixed)
+        for row, col in zip(*np.nonzero(bad)):
+            settings_list[row][columns.keys[col]] = float(fixed[row, col])
+    return bad_rows
+
+def _segments(lengths):
+    """(owner, position within owner) for every item of consecutive runs of `lengths`"""
+    owner = np.repeat(np.arange(len(lengths)), lengths)
+    starts = np.cumsum(lengths) - lengths
+    return owner, np.arange(len(owner)) - starts[owner]
+
+# (num_points, points, powers) of an LFO dict and of a compact Preset's LfoShape
+_LFO_DICT_FIELDS = operator.itemgetter("num_points", "points", "powers")
+_LFO_SHAPE_FIELDS = operator.itemgetter(1, 2, 3)
+
+def _fixed_lfo(points, powers):
+    """Points and powers that agree in length, with x clipped to [0, 1] and ascending"""
+    pairs = sorted((min(max(x, 0.0), 1.0), y) for x, y in zip(points[0::2], points[1::2]))
+    if not pairs:
+        pairs = [(0.0, 0.0), (1.0, 0.0)]
+    powers = list(powers[:len(pairs)])
+    powers.extend([0.0] * (len(pairs) - len(powers)))
+    return [value for pair in pairs for value in pair], powers
+
+def _fix_lfo(lfos, index):
+    lfo = lfos[index]
+    if isinstance(lfo, dict):
+        lfo["points"], lfo["powers"] = _fixed_lfo(lfo["points"], lfo["powers"])
+        lfo["num_points"] = len(lfo["powers"])
+    else:
+        points, powers = _fixed_lfo(lfo.points, lfo.powers)
+        lfos[index] = lfo._replace(num_points=len(powers), points=array("d", points), powers=array("d", powers))
+
+def _check_lfos(per_preset, offset, mode, report):
+    """Check the point invariants of every LFO in the chunk, given each preset's LFO list; returns the bad row mask"""
+    lfos = list(itertools.chain.from_iterable(per_preset))
+    lfo_owner = np.repeat(np.arange(len(per_preset)), [len(row) for row in per_preset])
+    lfo_index = _segments([len(row) for row in per_preset])[1]
+    bad_rows = np.zeros(len(per_preset), dtype=bool)
+    if not lfos:
+        return bad_rows
+
+    fields = list(map(_LFO_DICT_FIELDS if isinstance(lfos[0], dict) else _LFO_SHAPE_FIELDS, lfos))
+    num_points = np.fromiter((f[0] for f in fields), dtype=np.float64, count=len(lfos))
+    num_values = np.fromiter((len(f[1]) for f in fields), dtype=np.int64, count=len(lfos))
+    num_powers = np.fromiter((len(f[2]) for f in fields), dtype=np.int64, count=len(lfos))
+    bad_count = (num_points < 1) | (num_values != 2 * num_points) | (num_powers != num_points)
+
+    # x is every other value of each LFO's own points list
+    num_pairs = num_values // 2
+    values = np.fromiter(itertools.chain.from_iterable(f[1] for f in fields),
+                         dtype=np.float64, count=int(num_values.sum()))
+    pair_owner, pair_index = _segments(num_pairs)
+    x = values[(np.cumsum(num_values) - num_values)[pair_owner] + 2 * pair_index]
+    x_range = ~((x >= 0.0) & (x <= 1.0))
+    descending = np.zeros(len(x), dtype=bool)
+    descending[1:] = (x[1:] < x[:-1]) & (pair_owner[1:] == pair_owner[:-1])
+    bad_range = np.bincount(pair_owner[x_range], minlength=len(lfos)) > 0
+    bad_order = np.bincount(pair_owner[descending], minlength=len(lfos)) > 0
+
+    bad = bad_count | bad_range | bad_order
+    for i in np.flatnonzero(bad):
+        row = int(lfo_owner[i])
+        key = f"lfos[{lfo_index[i]}]"
+        for failed, problem in ((bad_count, LFO_POINT_COUNT), (bad_order, LFO_X_ORDER), (bad_range, LFO_X_RANGE)):
+            if failed[i]:
+                report._add(offset + row, key, problem, fields[i][0])
+        bad_rows[row] = True
+        if mode == FIX:
+            _fix_lfo(per_preset[row], int(lfo_index[i]))
+    return bad_rows
+
+def _section_lists(settings_list, key, offset, report):
+    """The `key` list of each preset dict's settings, [] where it is missing or not a list; also returns the bad row mask"""
+    sections = []
+    bad_rows = np.zeros(len(settings_list), dtype=bool)
+    for row, settings in enumerate(settings_list):
+        section = settings.get(key)
+        if not isinstance(section, list):
+            report._add(offset + row, key, NOT_A_LIST, section)
+            bad_rows[row] = True
+            section = []
+        sections.append(section)
+    return sections, bad_rows
+
+def _keyframe_lists(wavetable_lists, offset, report, bad_rows):
+    """(row, key, keyframe dicts) of every wavetable component of preset dicts.
+
+    Components without a keyframe list are reported as NOT_A_LIST and
+    marked in `bad_rows` instead.
+    """
+    for row, wavetables in enumerate(wavetable_lists):
+        for i, wavetable in enumerate(wavetables):
+            key = f"wavetables[{i}]"
+            for group in wavetable.get("groups", ()):
+                for component in group.get("components", ()):
+                    keyframes = component.get("keyframes")
+                    if isinstance(keyframes, list):
+                        yield row, key, keyframes
+                    else:
+                        report._add(offset + row, f"{key}.keyframes", NOT_A_LIST, keyframes)
+                        bad_rows[row] = True
+
+def _packed_keyframe_lists(presets):
+    """(row, key, flat keyframe array) of every wavetable of compact Presets"""
+    for row, preset in enumerate(presets):
+        for i, frames in enumerate(preset.keyframes):
+            yield row, f"wavetables[{i}]", frames
+
+def _clip_position(position):
+    return min(max(int(round(position)), 0), MAX_KEYFRAME_POSITION)
+
+def _fix_keyframes(keyframes):
+    if isinstance(keyframes, list):
+        for keyframe in keyframes:
+            keyframe["position"] = _clip_position(keyframe["position"])
+        keyframes.sort(key=operator.itemgetter("position"))
+        return
+    width = KEYFRAME_FIELDS
+    frames = sorted(((_clip_position(frame[0]),) + tuple(frame[1:]) for frame in zip(*[iter(keyframes)] * width)),
+                    key=operator.itemgetter(0))
+    keyframes[:] = array("d", itertools.chain.from_iterable(frames))
+
+def _check_wavetables(keyframe_lists, num_rows, offset, mode, report):
+    """Check that every wavetable's keyframes are in range and in position order; returns the bad row mask"""
+    components = list(keyframe_lists)  # (row, key, keyframes)
+    bad_rows = np.zeros(num_rows, dtype=bool)
+    if not components:
+        return bad_rows
+
+    if isinstance(components[0][2], list):
+        num_keyframes = np.fromiter((len(k) for _, _, k in components), dtype=np.int64, count=len(components))
+        positions = np.fromiter((keyframe["position"] for _, _, k in components for keyframe in k),
+                                dtype=np.float64, count=int(num_keyframes.sum()))
+    else:
+        num_keyframes = np.fromiter((len(k) // KEYFRAME_FIELDS for _, _, k in components), dtype=np.int64, count=len(components))
+        positions = np.fromiter(itertools.chain.from_iterable(k[::KEYFRAME_FIELDS] for _, _, k in components),
+                                dtype=np.float64, count=int(num_keyframes.sum()))
+    owner, _ = _segments(num_keyframes)
+    out_of_range = ~((positions >= 0) & (positions <= MAX_KEYFRAME_POSITION))
+    descending = np.zeros(len(positions), dtype=bool)
+    descending[1:] = (positions[1:] < positions[:-1]) & (owner[1:] == owner[:-1])
+    bad_count = num_keyframes == 0
+    bad_range = np.bincount(owner[out_of_range], minlength=len(components)) > 0
+    bad_order = np.bincount(owner[descending], minlength=len(components)) > 0
+
+    bad = bad_count | bad_range | bad_order
+    for i in np.flatnonzero(bad):
+        row, key, keyframes = components[i]
+        for failed, problem in ((bad_count, KEYFRAME_COUNT), (bad_order, KEYFRAME_ORDER), (bad_range, KEYFRAME_RANGE)):
+            if failed[i]:
+                report._add(offset + row, key, problem, int(num_keyframes[i]))
+        bad_rows[row] = True
+        if mode == FIX:
+            _fix_keyframes(keyframes)
+    return bad_rows
+
+def validate_presets(presets, mode=REPORT, max_issues=100, chunk_size=_CHUNK_SIZE):
+    """Check a batch of presets against SETTINGS_BOUNDS and the LFO and wavetable invariants.
+
+    Scalar settings are checked as one NumPy column per key, LFO points and
+    keyframe positions as flat arrays across the batch. `mode` is REPORT,
+    FIX (clamp to bounds, round integer settings, sort LFO points and
+    keyframes and make LFO point counts agree, all in place) or REJECT
+    (keep only the valid presets). A keyframe-less wavetable and a missing
+    lfos or wavetables section cannot be fixed. `presets` may be preset dicts or compact_preset Presets, whose
+    value arrays are checked without unpacking. Returns a ValidationReport.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown validation mode: {mode}")
+    report = ValidationReport(mode, max_issues)
+    columns = _COLUMNS
+    for offset in range(0, len(presets), chunk_size):
+        chunk = presets[offset:offset + chunk_size]
+        if isinstance(chunk[0], Preset):
+            settings_list = chunk
+            values = _packed_matrix(chunk, columns)
+            lfo_lists = [preset.lfos for preset in chunk]
+            keyframe_lists = _packed_keyframe_lists(chunk)
+            bad_rows = np.zeros(len(chunk), dtype=bool)
+        else:
+            settings_list = [preset["settings"] for preset in chunk]
+            values = _settings_matrix(settings_list, columns)
+            lfo_lists, bad_rows = _section_lists(settings_list, "lfos", offset, report)
+            wavetable_lists, bad_wavetables = _section_lists(settings_list, "wavetables", offset, report)
+            bad_rows |= bad_wavetables
+            keyframe_lists = list(_keyframe_lists(wavetable_lists, offset, report, bad_rows))
+        bad_rows |= _check_settings(settings_list, values, offset, mode, report, columns)
+        bad_rows |= _check_lfos(lfo_lists, offset, mode, report)
+        bad_rows |= _check_wavetables(keyframe_lists, len(chunk), offset, mode, report)
+        report.invalid.extend((offset + np.flatnonzero(bad_rows)).tolist())
+        if mode == REJECT:
+            report.presets.extend(preset for preset, bad in zip(chunk, bad_rows.tolist()) if not bad)
+        else:
+            report.presets.extend(chunk)
+    report.checked = len(presets)
+    return report
+
+def validate_preset(preset, mode=REPORT):
+    """validate_presets for a single preset; returns its list of Issues"""
+    return validate_presets([preset], mode, max_issues=None).issues
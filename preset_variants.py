@@ -0,0 +1,157 @@
+import json
+import os
+import random
+from types import MappingProxyType
+
+from preset_serializer import PresetFrame
+from random_vital_preset import (
+    LFOS, MODULATIONS, PRESET_SCHEMA, WAVETABLES,
+    derive_seed, draw_settings, get_style_ranges, resolve_rng,
+)
+
+SECTIONS = ("oscillators", "filters", "envelopes", "lfos", "modulations", "wavetables", "effects")
+
+_EFFECTS = ("chorus", "compressor", "delay", "distortion", "eq", "flanger", "phaser", "reverb")
+
+def _section_of(spec):
+    """The section a schema spec belongs to, or None for settings variants never redraw"""
+    key = spec.key
+    if spec.kind == LFOS:
+        return "lfos"
+    if spec.kind == MODULATIONS or key.startswith("modulation_"):
+        return "modulations"
+    if spec.kind == WAVETABLES:
+        return "wavetables"
+    if key.startswith(("osc_", "sample_")):
+        # sample_on switches the sample oscillator
+        return "oscillators"
+    if key.startswith("filter_"):
+        return "filters"
+    if key.startswith("env_"):
+        return "envelopes"
+    if key.split("_", 1)[0] in _EFFECTS and "_" in key:
+        return "effects"
+    return None
+
+def _build_section_specs():
+    specs = {section: [] for section in SECTIONS}
+    for spec in PRESET_SCHEMA.settings_specs + PRESET_SCHEMA.modulation_specs:
+        section = _section_of(spec)
+        if section is not None:
+            specs[section].append(spec)
+    return MappingProxyType({section: tuple(group) for section, group in specs.items()})
+
+# Schema specs of every section, in schema order
+SECTION_SPECS = _build_section_specs()
+
+def load_preset(preset):
+    """A preset dict, read from `preset` if it is a .vital path"""
+    if isinstance(preset, (str, os.PathLike)):
+        with open(preset, "rb") as f:
+            preset = json.load(f)
+    if not isinstance(preset, dict) or not isinstance(preset.get("settings"), dict):
+        raise ValueError("A preset needs a settings dict")
+    return preset
+
+class VariantGenerator:
+    """Variants of one base preset with only some sections redrawn.
+
+    `sections` name which of SECTIONS to regenerate; they are drawn with
+    the same generators (and the base's preset_style ranges) as
+    generate_random_preset. Everything else is the base's own objects:
+    a variant is a shallow copy of the base whose redrawn settings are
+    replaced, so variants must not be modified in place. serialize()
+    encodes the base's fixed settings only once, here. `name` prefixes
+    the variants' names (default: the base's file name, or "variant").
+    A modulation_sampler.ModulationSampler redraws the matrix from its
+    weights.
+    """
+    __slots__ = ("base", "name", "sections", "specs", "style_ranges", "arg_ranges", "empty_mod_chance", "modulation_sampler", "_frame")
+
+    def __init__(self, base, sections, empty_mod_chance=70, polyphony_range=(1, 32), mod_amount_range=(-1.0, 1.0), mod_power_range=(-4.0, 4.0), compact=False, backend="json", name=None, modulation_sampler=None):
+        sections = tuple(dict.fromkeys(sections))
+        unknown = [section for section in sections if section not in SECTION_SPECS]
+        if unknown:
+            raise ValueError(f"Unknown section(s) {', '.join(unknown)}; expected some of {', '.join(SECTIONS)}")
+        if name is None:
+            name = os.path.splitext(os.path.basename(base))[0] if isinstance(base, (str, os.PathLike)) else "variant"
+        self.base = load_preset(base)
+        self.name = name
+        self.sections = sections
+        self.specs = tuple(spec for section in sections for spec in SECTION_SPECS[section])
+        self.style_ranges = get_style_ranges(self.base.get("preset_style"))
+        self.arg_ranges = {
+            "polyphony_range": polyphony_range,
+            "mod_amount_range": mod_amount_range,
+            "mod_power_range": mod_power_range
+        }
+        self.empty_mod_chance = empty_mod_chance
+        self.modulation_sampler = modulation_sampler
+        self._frame = PresetFrame(self.base, [spec.key for spec in self.specs], compact, backend)
+
+    def variant(self, rng=None, seed=None):
+        """Draw one variant; `rng` and `seed` work as in generate_random_preset"""
+        if rng is None and seed is not None:
+            rng = random.Random(seed)
+        rng = resolve_rng(rng)
+        settings = dict(self.base["settings"])
+        draw_settings(self.specs, settings, self.style_ranges, self.arg_ranges, self.empty_mod_chance, rng, self.modulation_sampler)
+        preset = dict(self.base)
+        preset["settings"] = settings
+        return preset
+
+    def serialize(self, preset):
+        """Encode a variant from this generator to bytes"""
+        return self._frame.serialize(preset)
+
+    def iter_serialized(self, count, seed=None):
+        """Yield (name, bytes) for `count` variants named after the base.
+
+        With `seed`, variant i is drawn from derive_seed(seed, i), so the
+        same seed gives the same variants.
+        """
+        for i in range(count):
+            preset = self.variant(seed=None if seed is None else derive_seed(seed, i))
+            yield f"{self.name}_{i + 1:04d}", self.serialize(preset)
+
+def generate_variants(base, sections, count, seed=None, **options):
+    """`count` variant dicts of `base` (a preset dict or .vital path); see VariantGenerator"""
+    generator = VariantGenerator(base, sections, **options)
+    return [generator.variant(seed=None if seed is None else derive_seed(seed, i)) for i in range(count)]
+
+def write_variant_bank(base, sections, count, output, seed=None, timestamp=None, compression="default", **options):
+    """Write `count` variants of `base` to the .vitalbank `output` (a path or binary file object)"""
+    from vitalbank import COMPRESSION_LEVELS, VitalbankWriter
+    generator = VariantGenerator(base, sections, **options)
+    compress_type, compresslevel = COMPRESSION_LEVELS[compression]
+    with VitalbankWriter(output, timestamp=timestamp, compression=compress_type, compresslevel=compresslevel) as writer:
+        for name, data in generator.iter_serialized(count, seed):
+            writer.add_serialized_preset(name, data)
+    return output
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Write a bank of variants of one preset, redrawing only some sections")
+    parser.add_argument("base", help="base .vital preset")
+    parser.add_argument("-n", "--count", type=int, default=100, help="number of variants (default: 100)")
+    parser.add_argument("-s", "--sections", required=True,
+                        help=f"comma separated sections to redraw, from: {','.join(SECTIONS)}")
+    parser.add_argument("-o", "--output", required=True, help="bank path")
+    parser.add_argument("--seed", type=int, default=None, help="the same seed gives the same variants")
+    parser.add_argument("--empty-mod-chance", type=float, default=70, help="percent of empty modulation slots (default: 70)")
+    parser.add_argument("--compact", action="store_true", help="write presets without indentation")
+    parser.add_argument("--compression", choices=("store", "fast", "default", "best"), default="default",
+                        help="bank member compression (default: default)")
+    args = parser.parse_args(argv)
+    if args.count < 0:
+        parser.error("--count must not be negative")
+    sections = [section.strip() for section in args.sections.split(",") if section.strip()]
+    try:
+        write_variant_bank(args.base, sections, args.count, args.output, args.seed, compression=args.compression,
+                           empty_mod_chance=args.empty_mod_chance, compact=args.compact)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"Wrote {args.count} variants of {args.base} to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,19 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-import json
 import os
 import sys
+import queue
 import random
-from random_vital_preset import generate_random_preset, save_random_preset, get_style_ranges, random_name
+import threading
+import time
+from random_vital_preset import derive_seed, seeded_preset, save_random_preset, get_style_ranges, random_name
+from preset_serializer import write_preset
+
+# How often the Tk thread drains the worker's progress queue
+POLL_INTERVAL_MS = 50
+MAX_PRESETS = 10000
+# Only the most recent filenames stay in the list, so long runs do not grow it without bound
+MAX_LISTED = 1000
 
 class RandomPresetGeneratorApp:
     def __init__(self, root):
@@ -16,6 +25,7 @@ class RandomPresetGeneratorApp:
         self.output_dir = tk.StringVar(value="random_presets")
         self.preset_name = tk.StringVar(value="")
         self.num_presets = tk.StringVar(value="1")
+        self.seed = tk.StringVar(value="")
         self.preset_style = tk.StringVar(value="Random")
         self.vol_min = tk.StringVar(value="1000")
         self.vol_max = tk.StringVar(value="8000")
@@ -40,6 +50,11 @@ class RandomPresetGeneratorApp:
         self.mod_power_max = tk.StringVar(value="4.0")
         self.status_var = tk.StringVar()
         
+        # Background generation state
+        self.worker = None
+        self.cancel_event = threading.Event()
+        self.progress_queue = queue.Queue()
+        
         # Style configuration
         style = ttk.Style()
         style.configure("Title.TLabel", font=("Helvetica", 16, "bold"))
@@ -74,8 +89,13 @@ class RandomPresetGeneratorApp:
         
         # Number of presets
         ttk.Label(controls_frame, text="Number of Presets:").grid(row=2, column=0, sticky=tk.W, pady=2)
-        num_presets_spin = ttk.Spinbox(controls_frame, from_=1, to=100, textvariable=self.num_presets, width=5)
-        num_presets_spin.grid(row=2, column=1, sticky=tk.W, pady=2)
+        count_frame = ttk.Frame(controls_frame)
+        count_frame.grid(row=2, column=1, columnspan=2, sticky=(tk.W, tk.E), pady=2)
+        ttk.Spinbox(count_frame, from_=1, to=MAX_PRESETS, textvariable=self.num_presets, width=5).pack(side=tk.LEFT)
+        
+        # Master seed; left empty, a random one is drawn and shown when the run finishes
+        ttk.Label(count_frame, text="Seed:").pack(side=tk.LEFT, padx=(10, 2))
+        ttk.Entry(count_frame, textvariable=self.seed, width=22).pack(side=tk.LEFT, expand=True, fill=tk.X)
         
         # Preset style
         ttk.Label(controls_frame, text="Preset Style:").grid(row=3, column=0, sticky=tk.W, pady=2)
@@ -201,9 +221,17 @@ class RandomPresetGeneratorApp:
         ttk.Button(mod_power_frame, text="Random", style="Random.TButton",
                   command=lambda: self.randomize_range(self.mod_power_min, self.mod_power_max, -4.0, 4.0)).pack(side=tk.LEFT, padx=2)
         
-        # Generate button
-        generate_btn = ttk.Button(controls_frame, text="Generate Presets", command=self.generate_presets)
-        generate_btn.grid(row=6, column=0, columnspan=3, pady=10)
+        # Generate and cancel buttons
+        buttons_frame = ttk.Frame(controls_frame)
+        buttons_frame.grid(row=6, column=0, columnspan=3, pady=10)
+        self.generate_btn = ttk.Button(buttons_frame, text="Generate Presets", command=self.generate_presets)
+        self.generate_btn.pack(side=tk.LEFT, padx=2)
+        self.cancel_btn = ttk.Button(buttons_frame, text="Cancel", command=self.cancel_generation, state=tk.DISABLED)
+        self.cancel_btn.pack(side=tk.LEFT, padx=2)
+        
+        # Progress bar
+        self.progress = ttk.Progressbar(controls_frame, mode="determinate")
+        self.progress.grid(row=7, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=2)
         
         # Right panel - Generated Presets List
         presets_frame = ttk.LabelFrame(main_container, text="Generated Presets", padding="5")
@@ -226,6 +254,9 @@ class RandomPresetGeneratorApp:
         # Status bar
         status_bar = ttk.Label(main_container, textvariable=self.status_var, relief=tk.SUNKEN)
         status_bar.grid(row=2, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=5)
+        
+        # Stop a running generation before the window goes away
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
     
     def randomize_range(self, min_var, max_var, min_limit, max_limit):
         """Generate random range values ensuring min is less than max"""
@@ -267,10 +298,17 @@ class RandomPresetGeneratorApp:
             self.output_dir.set(directory)
     
     def generate_presets(self):
+        if self.worker is not None:
+            return
         try:
+            # Tk variables are read here, on the Tk thread; the worker only gets plain values
             num_presets = int(self.num_presets.get())
+            if not 1 <= num_presets <= MAX_PRESETS:
+                raise ValueError(f"Number of presets must be between 1 and {MAX_PRESETS}")
             output_dir = self.output_dir.get()
             preset_name = self.preset_name.get()
+            seed_text = self.seed.get().strip()
+            seed = int(seed_text) if seed_text else random.getrandbits(64)
             
             # Get parameter ranges
             volume_range = (float(self.vol_min.get()), float(self.vol_max.get()))
@@ -283,16 +321,54 @@ class RandomPresetGeneratorApp:
             
             # Create output directory if it doesn't exist
             os.makedirs(output_dir, exist_ok=True)
-            
-            # Clear previous list
-            self.presets_list.delete(0, tk.END)
-            
-            # Update status
-            self.status_var.set(f"Generating {num_presets} presets...")
-            self.root.update()
-            
-            # Generate presets
+        except Exception as e:
+            self.status_var.set(f"Error: {str(e)}")
+            messagebox.showerror("Error", f"Failed to generate presets: {str(e)}")
+            return
+        
+        preset_kwargs = {
+            "preset_style": self.preset_style.get(),
+            "volume_range": volume_range,
+            "polyphony_range": polyphony_range,
+            "empty_mod_chance": empty_mod_chance,
+            "mod_amount_range": mod_amount_range,
+            "mod_power_range": mod_power_range,
+        }
+        
+        # Clear previous list
+        self.presets_list.delete(0, tk.END)
+        self.progress.configure(maximum=num_presets, value=0)
+        self.generate_btn.configure(state=tk.DISABLED)
+        self.cancel_btn.configure(state=tk.NORMAL)
+        self.status_var.set(f"Generating {num_presets} presets...")
+        
+        self.cancel_event.clear()
+        self.progress_queue = queue.Queue()
+        self.generated = 0
+        self.start_time = time.perf_counter()
+        self.worker = threading.Thread(
+            target=self._generation_worker,
+            args=(num_presets, output_dir, preset_name, seed, preset_kwargs, self.cancel_event, self.progress_queue),
+            daemon=True,
+        )
+        self.worker.start()
+        self.root.after(POLL_INTERVAL_MS, self._poll_progress)
+    
+    def _generation_worker(self, num_presets, output_dir, preset_name, seed, preset_kwargs, cancel_event, progress_queue):
+        """Generate and save presets off the Tk thread, reporting through `progress_queue`.
+
+        Preset i is drawn from derive_seed(seed, i), as in generate_vitalbank,
+        so the same seed and settings write the same presets.
+        """
+        total_bytes = 0
+        done = 0
+        try:
             for i in range(num_presets):
+                if cancel_event.is_set():
+                    break
+                
+                name, preset = seeded_preset(derive_seed(seed, i), **preset_kwargs)
+                
                 # Generate filename
                 if preset_name:
                     if num_presets > 1:
@@ -300,33 +376,84 @@ class RandomPresetGeneratorApp:
                     else:
                         filename = f"{preset_name}.vital"
                 else:
-                    filename = f"{random_name()}.vital"
+                    filename = f"{name}.vital"
                 
                 filepath = os.path.join(output_dir, filename)
                 
-                # Generate and save preset
-                preset = generate_random_preset(
-                    preset_style=self.preset_style.get(),
-                    volume_range=volume_range,
-                    polyphony_range=polyphony_range,
-                    empty_mod_chance=empty_mod_chance,
-                    mod_amount_range=mod_amount_range,
-                    mod_power_range=mod_power_range
-                )
-                
-                with open(filepath, 'w') as f:
-                    json.dump(preset, f, indent=2)
-                
-                self.presets_list.insert(tk.END, filename)
-                self.presets_list.see(tk.END)
-                self.root.update()
-            
-            self.status_var.set(f"Successfully generated {num_presets} presets in {output_dir}")
-            messagebox.showinfo("Success", f"Generated {num_presets} presets successfully!")
-            
+                # Save preset
+                with open(filepath, 'wb') as f:
+                    total_bytes += write_preset(preset, f)
+                done += 1
+                progress_queue.put(("preset", filename))
+            progress_queue.put(("done", done, total_bytes, output_dir, done < num_presets, seed))
         except Exception as e:
-            self.status_var.set(f"Error: {str(e)}")
-            messagebox.showerror("Error", f"Failed to generate presets: {str(e)}")
+            progress_queue.put(("error", str(e)))
+    
+    def _poll_progress(self):
+        """Apply everything the worker reported since the last poll in one batch"""
+        filenames = []
+        finished = None
+        try:
+            while True:
+                message = self.progress_queue.get_nowait()
+                if message[0] == "preset":
+                    filenames.append(message[1])
+                else:
+                    finished = message
+                    break
+        except queue.Empty:
+            pass
+        
+        if filenames:
+            self.presets_list.insert(tk.END, *filenames[-MAX_LISTED:])
+            excess = self.presets_list.size() - MAX_LISTED
+            if excess > 0:
+                self.presets_list.delete(0, excess - 1)
+            self.presets_list.see(tk.END)
+            self.generated += len(filenames)
+            self.progress.configure(value=self.generated)
+            elapsed = time.perf_counter() - self.start_time
+            rate = self.generated / elapsed if elapsed else 0.0
+            self.status_var.set(f"Generated {self.generated}/{int(self.progress['maximum'])} presets ({rate:.0f} presets/sec)")
+        
+        if finished is None:
+            self.root.after(POLL_INTERVAL_MS, self._poll_progress)
+        else:
+            self._finish_generation(finished)
+    
+    def _finish_generation(self, message):
+        self.worker.join()
+        self.worker = None
+        self.generate_btn.configure(state=tk.NORMAL)
+        self.cancel_btn.configure(state=tk.DISABLED)
+        
+        if message[0] == "error":
+            self.status_var.set(f"Error: {message[1]}")
+            messagebox.showerror("Error", f"Failed to generate presets: {message[1]}")
+            return
+        
+        _, done, total_bytes, output_dir, cancelled, seed = message
+        elapsed = time.perf_counter() - self.start_time
+        rate = done / elapsed if elapsed else 0.0
+        if cancelled:
+            self.status_var.set(f"Cancelled after {done} presets ({total_bytes / 1e6:.1f} MB, {rate:.0f} presets/sec) in {output_dir}, seed {seed}")
+        else:
+            self.status_var.set(f"Successfully generated {done} presets ({total_bytes / 1e6:.1f} MB, {rate:.0f} presets/sec) in {output_dir}, seed {seed}")
+            messagebox.showinfo("Success", f"Generated {done} presets successfully!")
+    
+    def cancel_generation(self):
+        """Ask the worker to stop after the preset it is writing"""
+        if self.worker is not None:
+            self.cancel_event.set()
+            self.cancel_btn.configure(state=tk.DISABLED)
+            self.status_var.set("Cancelling...")
+    
+    def on_close(self):
+        if self.worker is not None:
+            # Let the worker finish its current file so no half-written preset is left behind
+            self.cancel_event.set()
+            self.worker.join()
+        self.root.destroy()
 
 def main():
     root = tk.Tk()
@@ -2,155 +2,65 @@ import json
 import random
 import string
 import math
+import numbers
 import os
-import zipfile
-import shutil
-from datetime import datetime
-from wavetable_data import WAVETABLE_DATA
+import itertools
+from time import perf_counter
+from collections import deque, namedtuple
+from types import MappingProxyType
+from preset_serializer import register_layout, register_template, serialize_preset, write_preset
+from wavetable_loader import load_wavetable_data
 
-def random_float(min_val, max_val):
-    return min_val + random.random() * (max_val - min_val)
+# The wavetable payload, the process pool and the zip writer are only imported
+# when first needed, so tools that just read the schema or style ranges start fast
 
-def random_bool():
-    return random.choice([0.0, 1.0])
+# Draw kinds used by the settings layout
+CONST = "const"              # fixed value stored in `low`
+FLOAT = "float"              # random_float(low, high)
+INT = "int"                  # float(random.randint(low, high))
+BOOL = "bool"                # random_bool()
+STYLE_FLOAT = "style_float"  # random_float over the style range named by `low`
+ARG_FLOAT = "arg_float"      # random_float over the generate_random_preset range named by `low`
+ARG_INT = "arg_int"          # float(random.randint(...)) over the range named by `low`
+LFOS = "lfos"
+MODULATIONS = "modulations"
+SAMPLE = "sample"
+WAVETABLES = "wavetables"
 
-def random_name(length=8):
-    return ''.join(random.choices(string.ascii_letters, k=length))
+ParamSpec = namedtuple("ParamSpec", ["key", "kind", "low", "high"])
+LfoShape = namedtuple("LfoShape", ["name", "num_points", "points", "powers", "smooth"])
 
-def generate_random_lfo():
+_BOOL_VALUES = (0.0, 1.0)
+_SMOOTH_VALUES = (True, False)
+_WINDOW_SIZES = (1024, 4096)
+
+# Pipeline stages reported to profiling callbacks, in pipeline order
+STAGES = ("style_lookup", "scalar_draw", "lfos", "modulations", "wavetables", "serialization", "zip_write", "cleanup")
+
+# Stage of each structural draw kind; every other kind is a scalar_draw
+_KIND_STAGES = {LFOS: "lfos", MODULATIONS: "modulations", WAVETABLES: "wavetables"}
+
+# Presets per pool task when generating banks; fixed so output does not depend on jobs
+_BANK_CHUNK_SIZE = 64
+# A diversity-filtered bank gives up after this many candidates per requested preset
+_DIVERSITY_MAX_ATTEMPTS = 10
+
+def _build_lfo_shapes():
     # List of possible LFO shapes with their typical point configurations
-    lfo_shapes = [
+    return (
         # Basic shapes
-        {
-            "name": "Triangle",
-            "num_points": 3,
-            "points": [0.0, 1.0, 0.5, 0.0, 1.0, 1.0],
-            "powers": [0.0, 0.0, 0.0],
-            "smooth": False
-        },
+        LfoShape("Triangle", 3, (0.0, 1.0, 0.5, 0.0, 1.0, 1.0), (0.0, 0.0, 0.0), False),
         # Saw shapes
-        {
-            "name": "Saw Up",
-            "num_points": 3,
-            "points": [0.0, 1.0, 1.0, 0.0, 1.0, 1.0],
-            "powers": [0.0, 0.0, 0.0],
-            "smooth": False
-        },
-        {
-            "name": "Saw Down",
-            "num_points": 3,
-            "points": [0.0, 0.0, 1.0, 1.0, 1.0, 0.0],
-            "powers": [0.0, 0.0, 0.0],
-            "smooth": False
-        },
+        LfoShape("Saw Up", 3, (0.0, 1.0, 1.0, 0.0, 1.0, 1.0), (0.0, 0.0, 0.0), False),
+        LfoShape("Saw Down", 3, (0.0, 0.0, 1.0, 1.0, 1.0, 0.0), (0.0, 0.0, 0.0), False),
         # Bipolar triangle
-        {
-            "name": "Bi polar Tri",
-            "num_points": 4,
-            "points": [0.0, 0.5, 0.25, 0.0, 0.75, 1.0, 1.0, 0.5],
-            "powers": [0.0, 0.0, 0.0, 0.0],
-            "smooth": False
-        },
+        LfoShape("Bi polar Tri", 4, (0.0, 0.5, 0.25, 0.0, 0.75, 1.0, 1.0, 0.5), (0.0, 0.0, 0.0, 0.0), False),
         # Square-like
-        {
-            "name": "Square",
-            "num_points": 4,
-            "points": [0.0, 1.0, 0.0, 1.0, 0.5, 0.0, 1.0, 1.0],
-            "powers": [0.0, 0.0, 0.0, 0.0],
-            "smooth": False
-        }
-    ]
-    
-    # Randomly choose between predefined shape or generate custom shape
-    if random.random() < 0.7:  # 70% chance of using predefined shape
-        base_shape = random.choice(lfo_shapes)
-        
-        # Randomly modify the points slightly
-        modified_points = []
-        for i in range(0, len(base_shape["points"]), 2):
-            x = base_shape["points"][i]
-            y = base_shape["points"][i + 1]
-            # Add small random variations to y values while keeping x values
-            modified_points.extend([x, y + random.uniform(-0.1, 0.1)])
-            
-        # Generate random powers
-        num_powers = base_shape["num_points"]
-        powers = [random.uniform(-4.0, 4.0) for _ in range(num_powers)]
-        
-        return {
-            "name": base_shape["name"],
-            "num_points": base_shape["num_points"],
-            "points": modified_points,
-            "powers": powers,
-            "smooth": random.choice([True, False])
-        }
-    else:  # 30% chance of generating custom shape
-        num_points = random.randint(3, 8)
-        points = []
-        
-        # Generate points with x values in ascending order
-        x_values = sorted([random.random() for _ in range(num_points)])
-        x_values[0] = 0.0  # Force first x to 0
-        x_values[-1] = 1.0  # Force last x to 1
-        
-        for x in x_values:
-            points.extend([x, random.random()])
-            
-        return {
-            "name": f"Custom {random.randint(1, 100)}",
-            "num_points": num_points,
-            "points": points,
-            "powers": [random.uniform(-4.0, 4.0) for _ in range(num_points)],
-            "smooth": random.choice([True, False])
-        }
+        LfoShape("Square", 4, (0.0, 1.0, 0.0, 1.0, 0.5, 0.0, 1.0, 1.0), (0.0, 0.0, 0.0, 0.0), False),
+    )
 
-def generate_random_wavetable():
-    # Generate a random number of keyframes (between 2 and 8)
-    num_keyframes = random.randint(2, 8)
-    
-    # Generate random positions and sort them
-    positions = sorted([random.randint(0, 256) for _ in range(num_keyframes)])
-    
-    # Generate keyframes with random properties
-    keyframes = []
-    for pos in positions:
-        keyframe = {
-            "position": pos,
-            "start_position": random_float(0, 4000),  # Random start position in samples
-            "window_fade": random_float(0.5, 1.0),    # Random fade between 50% and 100%
-            "window_size": float(random.choice([1024, 4096]))  # Window size must be either 1024 or 4096
-        }
-        keyframes.append(keyframe)
-    
-    return {
-        "author": "",
-        "full_normalize": False,
-        "groups": [
-            {
-                "components": [
-                    {
-                        "audio_file": WAVETABLE_DATA['audio_file'],
-                        "audio_sample_rate": 44100,
-                        "fade_style": 2,
-                        "interpolation_style": 1,
-                        "keyframes": keyframes,
-                        "normalize_gain": True,
-                        "normalize_mult": False,
-                        "phase_style": 2,
-                        "random_seed": -919671038,
-                        "type": "Audio File Source",
-                        "window_size": 1012.9000244140625
-                    }
-                ]
-            }
-        ],
-        "name": "fm sine",
-        "remove_all_dc": False,
-        "version": "1.5.5"
-    }
-
-def generate_random_modulation(empty_mod_chance=0):
-    destinations = [
+def _build_mod_destinations():
+    return (
         # Oscillator 1 parameters
         "osc_1_transpose", "osc_1_tune", "osc_1_level", "osc_1_pan",
         "osc_1_unison_detune", "osc_1_unison_voices", "osc_1_phase",
@@ -244,9 +154,10 @@ def generate_random_modulation(empty_mod_chance=0):
         # Modulation parameters
         "modulation_3_amount", "modulation_5_amount", "modulation_6_amount",
         "modulation_7_amount", "modulation_8_amount"
-    ]
-    
-    sources = [
+    )
+
+def _build_mod_sources():
+    return (
         # Envelopes
         "env_1", "env_2", "env_3", "env_4", "env_5", "env_6",
         
@@ -259,45 +170,39 @@ def generate_random_modulation(empty_mod_chance=0):
         # Performance controls
         "note", "velocity", "mod_wheel", "pitch_wheel", "aftertouch", "lift",
         "random", "stereo"
-    ]
-    
-    if random.random() * 100 < empty_mod_chance:
-        return {"destination": "", "source": ""}
-    
-    return {
-        "destination": random.choice(destinations),
-        "source": random.choice(sources)
-    }
+    )
 
-def get_style_ranges(style):
-    """Get parameter ranges based on preset style"""
+# Vital's longest envelope stage, in its own time units; style ranges stop there
+_MAX_ENV_TIME = 2.37842
+
+def _build_style_ranges():
     ranges = {
         "Keys": {
             "polyphony": (4, 32),
             "osc_level": (0.6, 0.9),
             "filter_cutoff": (40, 100),
             "env_attack": (0.1, 0.5),
-            "env_decay": (0.4, 3.0),
+            "env_decay": (0.4, _MAX_ENV_TIME),
             "env_sustain": (0.4, 1.0),
-            "env_release": (0.3, 5.0)
+            "env_release": (0.3, _MAX_ENV_TIME)
         },
         "Bass": {
             "polyphony": (1, 4),
             "osc_level": (0.7, 1.0),
             "filter_cutoff": (20, 80),
             "env_attack": (0, 0.3),
-            "env_decay": (0.3, 3.0),
+            "env_decay": (0.3, _MAX_ENV_TIME),
             "env_sustain": (0.3, 1.0),
-            "env_release": (0.2, 6.0)
+            "env_release": (0.2, _MAX_ENV_TIME)
         },
         "Lead": {
             "polyphony": (1, 4),
             "osc_level": (0.6, 0.9),
             "filter_cutoff": (40, 120),
-            "env_attack": (0, 3.0),
-            "env_decay": (0.3, 3.0),
+            "env_attack": (0, _MAX_ENV_TIME),
+            "env_decay": (0.3, _MAX_ENV_TIME),
             "env_sustain": (0.4, 1.0),
-            "env_release": (0.2, 6.0)
+            "env_release": (0.2, _MAX_ENV_TIME)
         },
         "Pad": {
             "polyphony": (4, 32),
@@ -312,8 +217,8 @@ def get_style_ranges(style):
             "polyphony": (4, 16),
             "osc_level": (0.6, 0.9),
             "filter_cutoff": (60, 120),
-            "env_attack": (0, 3.0),
-            "env_decay": (0.2, 6.0),
+            "env_attack": (0, _MAX_ENV_TIME),
+            "env_decay": (0.2, _MAX_ENV_TIME),
             "env_sustain": (0, 1.0),
             "env_release": (0.2, 0.4)
         },
@@ -321,8 +226,8 @@ def get_style_ranges(style):
             "polyphony": (1, 32),
             "osc_level": (0.5, 1.0),
             "filter_cutoff": (20, 120),
-            "env_attack": (0, 3.0),
-            "env_decay": (0.3, 6.0),
+            "env_attack": (0, _MAX_ENV_TIME),
+            "env_decay": (0.3, _MAX_ENV_TIME),
             "env_sustain": (0, 1.0),
             "env_release": (0.3, 1.0)
         },
@@ -331,7 +236,7 @@ def get_style_ranges(style):
             "osc_level": (0.7, 1.0),
             "filter_cutoff": (60, 120),
             "env_attack": (0, 0.1),
-            "env_decay": (0.1, 6.0),
+            "env_decay": (0.1, _MAX_ENV_TIME),
             "env_sustain": (0, 1.0),
             "env_release": (0.1, 1.3)
         },
@@ -340,212 +245,956 @@ def get_style_ranges(style):
             "osc_level": (0.6, 0.9),
             "filter_cutoff": (40, 100),
             "env_attack": (0, 1.0),
-            "env_decay": (0.2, 6.0),
+            "env_decay": (0.2, _MAX_ENV_TIME),
             "env_sustain": (0.2, 1.0),
             "env_release": (0.2, 1.5)
         }
     }
+    return MappingProxyType({style: MappingProxyType(r) for style, r in ranges.items()})
+
+def _per_osc(field, kind, low=None, high=None):
+    return [ParamSpec(f"osc_{i}_{field}", kind, low, high) for i in range(1, 4)]
+
+def _per_env(field, kind, low=None, high=None):
+    return [ParamSpec(f"env_{i}_{field}", kind, low, high) for i in range(1, 7)]
+
+def _build_settings_specs():
+    # Order matches the key order (and the random draw order) of the settings dict
+    return (
+        # Basic settings
+        ParamSpec("volume", CONST, 6000.0, None),
+        ParamSpec("polyphony", ARG_INT, "polyphony_range", None),
+        ParamSpec("oversampling", CONST, 0.0, None),
+        ParamSpec("beats_per_minute", CONST, 2.0, None),
+        ParamSpec("bypass", CONST, 0.0, None),
+        
+        # Voice settings
+        ParamSpec("voice_amplitude", CONST, 1.0, None),
+        ParamSpec("voice_override", BOOL, None, None),
+        ParamSpec("voice_priority", INT, 0, 4),
+        ParamSpec("voice_transpose", INT, -24, 24),
+        ParamSpec("voice_tune", FLOAT, -1, 1),
+        
+        # Effect on/off states
+        *[ParamSpec(f"{effect}_on", BOOL, None, None) for effect in (
+            "chorus", "compressor", "delay", "distortion", "eq",
+            "flanger", "phaser", "reverb", "sample")],
+        
+        # Filter on/off states
+        ParamSpec("filter_1_on", BOOL, None, None),
+        ParamSpec("filter_2_on", BOOL, None, None),
+        ParamSpec("filter_fx_on", BOOL, None, None),
+        
+        # Oscillator settings (for each oscillator)
+        *_per_osc("on", BOOL),
+        *_per_osc("level", STYLE_FLOAT, "osc_level"),
+        *_per_osc("transpose", INT, -24, 24),
+        *_per_osc("tune", FLOAT, -1, 1),
+        *_per_osc("unison_voices", INT, 1, 8),
+        *_per_osc("unison_detune", FLOAT, 2, 5),
+        *_per_osc("unison_blend", FLOAT, 0.5, 1.0),
+        *_per_osc("stereo_spread", FLOAT, 0, 1),
+        *_per_osc("random_phase", BOOL),
+        *_per_osc("phase", FLOAT, 0, 1),
+        *_per_osc("midi_track", CONST, 1),
+        *_per_osc("distortion_type", INT, 0, 12),
+        *_per_osc("spectral_morph_type", INT, 0, 11),
+        *_per_osc("frame_spread", CONST, 0.0),
+        *_per_osc("spectral_morph_amount", FLOAT, 0, 1),
+        *_per_osc("spectral_morph_phase", FLOAT, 0, 1),
+        *_per_osc("spectral_morph_spread", FLOAT, 0, 1),
+        
+        # Filter settings
+        ParamSpec("filter_1_cutoff", STYLE_FLOAT, "filter_cutoff", None),
+        ParamSpec("filter_1_resonance", FLOAT, 0, 1),
+        ParamSpec("filter_1_blend", FLOAT, 0, 1),
+        ParamSpec("filter_1_style", INT, 0, 3),
+        ParamSpec("filter_1_model", INT, 0, 7),
+        ParamSpec("filter_1_drive", FLOAT, 0, 1),
+        ParamSpec("filter_1_mix", FLOAT, 0, 1),
+        
+        # Envelope settings (for each envelope)
+        *_per_env("attack", STYLE_FLOAT, "env_attack"),
+        *_per_env("decay", STYLE_FLOAT, "env_decay"),
+        *_per_env("sustain", STYLE_FLOAT, "env_sustain"),
+        *_per_env("release", STYLE_FLOAT, "env_release"),
+        *_per_env("attack_power", FLOAT, -4, 4),
+        *_per_env("decay_power", FLOAT, -4, 4),
+        *_per_env("release_power", FLOAT, -4, 4),
+        
+        # Effects
+        ParamSpec("reverb_decay_time", FLOAT, -5, 5),
+        ParamSpec("reverb_dry_wet", FLOAT, 0, 1),
+        ParamSpec("reverb_size", FLOAT, 0, 1),
+        ParamSpec("reverb_high_shelf_cutoff", FLOAT, 20, 120),
+        ParamSpec("reverb_low_shelf_cutoff", FLOAT, 0, 100),
+        
+        ParamSpec("delay_feedback", FLOAT, 0, 0.95),
+        ParamSpec("delay_dry_wet", FLOAT, 0, 1),
+        ParamSpec("delay_tempo", INT, 4, 12),
+        
+        # LFOs, modulations, the (empty) sample and wavetables
+        ParamSpec("lfos", LFOS, None, None),
+        ParamSpec("modulations", MODULATIONS, None, None),
+        ParamSpec("sample", SAMPLE, None, None),
+        ParamSpec("wavetables", WAVETABLES, None, None),
+        
+        # Additional settings
+        ParamSpec("stereo_mode", BOOL, None, None),
+        ParamSpec("pitch_bend_range", INT, 1, 24),
+        ParamSpec("velocity_track", FLOAT, 0, 1),
+        ParamSpec("portamento_time", FLOAT, -10, 0),
+        ParamSpec("legato", BOOL, None, None),
+        
+        # Macro controls
+        *[ParamSpec(f"macro_control_{i}", FLOAT, 0, 1) for i in range(1, 5)],
+    )
+
+def _build_modulation_specs(num_modulations):
+    specs = []
+    for i in range(1, num_modulations + 1):
+        specs.extend([
+            ParamSpec(f"modulation_{i}_amount", ARG_FLOAT, "mod_amount_range", None),
+            ParamSpec(f"modulation_{i}_bipolar", BOOL, None, None),
+            ParamSpec(f"modulation_{i}_bypass", BOOL, None, None),
+            ParamSpec(f"modulation_{i}_power", ARG_FLOAT, "mod_power_range", None),
+            ParamSpec(f"modulation_{i}_stereo", BOOL, None, None),
+        ])
+    return tuple(specs)
+
+def _group_stages(specs):
+    """Split specs into consecutive (stage, specs) groups, keeping draw order"""
+    groups = []
+    for spec in specs:
+        stage = _KIND_STAGES.get(spec.kind, "scalar_draw")
+        if groups and groups[-1][0] == stage:
+            groups[-1][1].append(spec)
+        else:
+            groups.append((stage, [spec]))
+    return tuple((stage, tuple(group)) for stage, group in groups)
+
+class PresetSchema:
+    """Static tables the generators draw from, built once at import"""
+    __slots__ = (
+        "preset_styles", "style_ranges", "lfo_shapes", "mod_destinations", "mod_sources",
+        "num_lfos", "num_modulations", "num_wavetables",
+        "settings_specs", "modulation_specs", "settings_keys",
+        "settings_stages", "modulation_stages",
+    )
+    
+    def __init__(self):
+        self.preset_styles = ("Keys", "Bass", "Lead", "Pad", "Pluck", "FX", "Drums", "Sequence")
+        self.style_ranges = _build_style_ranges()
+        self.lfo_shapes = _build_lfo_shapes()
+        self.mod_destinations = _build_mod_destinations()
+        self.mod_sources = _build_mod_sources()
+        self.num_lfos = 8
+        self.num_modulations = 64
+        self.num_wavetables = 3
+        # settings_specs are drawn in order, then the per-slot modulation_specs are appended
+        self.settings_specs = _build_settings_specs()
+        self.modulation_specs = _build_modulation_specs(self.num_modulations)
+        self.settings_keys = tuple(spec.key for spec in self.settings_specs + self.modulation_specs)
+        # The same specs grouped by profiling stage
+        self.settings_stages = _group_stages(self.settings_specs)
+        self.modulation_stages = _group_stages(self.modulation_specs)
+
+PRESET_SCHEMA = PresetSchema()
+
+class NumpyRandom:
+    """random.Random-style view of a numpy Generator, for the helpers below"""
+    __slots__ = ("generator",)
+    
+    def __init__(self, generator):
+        self.generator = generator
+    
+    def random(self):
+        return float(self.generator.random())
+    
+    def uniform(self, a, b):
+        return a + (b - a) * self.random()
+    
+    def randint(self, a, b):
+        return int(self.generator.integers(a, b, endpoint=True))
+    
+    def choice(self, seq):
+        return seq[int(self.generator.integers(len(seq)))]
+    
+    def choices(self, population, k=1):
+        return [population[i] for i in self.generator.integers(len(population), size=k).tolist()]
+
+def resolve_rng(rng):
+    """Map an rng argument to something with the random.Random API"""
+    if rng is None or rng is random:
+        return random  # the module-global generator
+    if isinstance(rng, (random.Random, NumpyRandom)):
+        return rng
+    if hasattr(rng, "integers"):  # numpy.random.Generator
+        return NumpyRandom(rng)
+    return rng
+
+# Profiling callbacks, called as callback(stage, start, end) with perf_counter()
+# times. The pipeline only reads the clock while this list is non-empty.
+_stage_callbacks = []
+
+def add_stage_callback(callback):
+    """Report every pipeline stage (see STAGES) run in this process to `callback`"""
+    _stage_callbacks.append(callback)
+    return callback
+
+def remove_stage_callback(callback):
+    _stage_callbacks.remove(callback)
+
+def _emit_stage(stage, start):
+    end = perf_counter()
+    for callback in _stage_callbacks:
+        callback(stage, start, end)
+
+def _timed_stage(stage, func, *args):
+    """Call func(*args), reporting it as `stage` when profiling is enabled"""
+    if not _stage_callbacks:
+        return func(*args)
+    start = perf_counter()
+    result = func(*args)
+    _emit_stage(stage, start)
+    return result
+
+class StageProfiler:
+    """Collects wall time and call counts per pipeline stage.
+
+    Use it as a context manager around generate_random_preset or
+    generate_vitalbank calls, then print format_table() or save
+    write_chrome_trace() for chrome://tracing / Perfetto. With jobs > 1 the
+    generation stages run in worker processes and are not recorded.
+    """
+
+    def __init__(self, keep_events=True):
+        import threading
+        self._get_ident = threading.get_ident
+        self.keep_events = keep_events
+        self.totals = dict.fromkeys(STAGES, 0.0)
+        self.counts = dict.fromkeys(STAGES, 0)
+        self.events = []  # (stage, start, end, thread id)
+
+    def __enter__(self):
+        add_stage_callback(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        remove_stage_callback(self)
+
+    def __call__(self, stage, start, end):
+        self.totals[stage] = self.totals.get(stage, 0.0) + (end - start)
+        self.counts[stage] = self.counts.get(stage, 0) + 1
+        if self.keep_events:
+            self.events.append((stage, start, end, self._get_ident()))
+
+    def summary(self):
+        """Dict of stage -> {"calls", "total_s", "mean_us", "percent"} for stages that ran"""
+        total = sum(self.totals.values())
+        return {
+            stage: {
+                "calls": self.counts[stage],
+                "total_s": self.totals[stage],
+                "mean_us": self.totals[stage] / self.counts[stage] * 1e6,
+                "percent": 100 * self.totals[stage] / total if total else 0.0,
+            }
+            for stage in self.totals if self.counts[stage]
+        }
+
+    def format_table(self):
+        lines = [f"{'stage':<14}{'calls':>10}{'total ms':>12}{'mean us':>12}{'%':>8}"]
+        for stage, row in self.summary().items():
+            lines.append(f"{stage:<14}{row['calls']:>10}{row['total_s'] * 1e3:>12.2f}{row['mean_us']:>12.2f}{row['percent']:>8.1f}")
+        return "\n".join(lines)
+
+    def chrome_trace(self):
+        """The recorded events in Chrome's trace event format"""
+        pid = os.getpid()
+        return {
+            "traceEvents": [
+                {"name": stage, "cat": "preset", "ph": "X", "pid": pid, "tid": tid,
+                 "ts": start * 1e6, "dur": (end - start) * 1e6}
+                for stage, start, end, tid in self.events
+            ],
+            "displayTimeUnit": "ms",
+        }
+
+    def write_chrome_trace(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.chrome_trace(), f)
+        return path
+
+def random_float(min_val, max_val, rng=None):
+    return min_val + resolve_rng(rng).random() * (max_val - min_val)
+
+def random_bool(rng=None):
+    return resolve_rng(rng).choice(_BOOL_VALUES)
+
+def random_name(length=8, rng=None):
+    return ''.join(resolve_rng(rng).choices(string.ascii_letters, k=length))
+
+def generate_random_lfo(rng=None):
+    rng = resolve_rng(rng)
+    
+    # Randomly choose between predefined shape or generate custom shape
+    if rng.random() < 0.7:  # 70% chance of using predefined shape
+        base_shape = rng.choice(PRESET_SCHEMA.lfo_shapes)
+        
+        # Randomly modify the points slightly
+        modified_points = []
+        for i in range(0, len(base_shape.points), 2):
+            x = base_shape.points[i]
+            y = base_shape.points[i + 1]
+            # Add small random variations to y values while keeping x values
+            modified_points.extend([x, y + rng.uniform(-0.1, 0.1)])
+            
+        # Generate random powers
+        num_powers = base_shape.num_points
+        powers = [rng.uniform(-4.0, 4.0) for _ in range(num_powers)]
+        
+        return {
+            "name": base_shape.name,
+            "num_points": base_shape.num_points,
+            "points": modified_points,
+            "powers": powers,
+            "smooth": rng.choice(_SMOOTH_VALUES)
+        }
+    else:  # 30% chance of generating custom shape
+        num_points = rng.randint(3, 8)
+        points = []
+        
+        # Generate points with x values in ascending order
+        x_values = sorted([rng.random() for _ in range(num_points)])
+        x_values[0] = 0.0  # Force first x to 0
+        x_values[-1] = 1.0  # Force last x to 1
+        
+        for x in x_values:
+            points.extend([x, rng.random()])
+            
+        return {
+            "name": f"Custom {rng.randint(1, 100)}",
+            "num_points": num_points,
+            "points": points,
+            "powers": [rng.uniform(-4.0, 4.0) for _ in range(num_points)],
+            "smooth": rng.choice(_SMOOTH_VALUES)
+        }
+
+def generate_random_wavetable(rng=None):
+    rng = resolve_rng(rng)
+    
+    # Generate a random number of keyframes (between 2 and 8)
+    num_keyframes = rng.randint(2, 8)
+    
+    # Generate random positions and sort them
+    positions = sorted([rng.randint(0, 256) for _ in range(num_keyframes)])
+    
+    # Generate keyframes with random properties
+    keyframes = []
+    for pos in positions:
+        keyframe = {
+            "position": pos,
+            "start_position": random_float(0, 4000, rng),  # Random start position in samples
+            "window_fade": random_float(0.5, 1.0, rng),    # Random fade between 50% and 100%
+            "window_size": float(rng.choice(_WINDOW_SIZES))  # Window size must be either 1024 or 4096
+        }
+        keyframes.append(keyframe)
+    
+    return wavetable_from_keyframes(keyframes)
+
+def wavetable_from_keyframes(keyframes):
+    """Wrap keyframes in the fixed wavetable structure Vital expects"""
+    return {
+        "author": "",
+        "full_normalize": False,
+        "groups": [
+            {
+                "components": [
+                    {
+                        "audio_file": _wavetable_audio_file(),
+                        "audio_sample_rate": 44100,
+                        "fade_style": 2,
+                        "interpolation_style": 1,
+                        "keyframes": keyframes,
+                        "normalize_gain": True,
+                        "normalize_mult": False,
+                        "phase_style": 2,
+                        "random_seed": -919671038,
+                        "type": "Audio File Source",
+                        "window_size": 1012.9000244140625
+                    }
+                ]
+            }
+        ],
+        "name": "fm sine",
+        "remove_all_dc": False,
+        "version": "1.5.5"
+    }
+
+def empty_sample():
+    """The empty sample block every generated preset carries"""
+    return {
+        "length": 0,
+        "name": "",
+        "sample_rate": 44100,
+        "samples": ""
+    }
+
+_audio_file = None
+
+def _wavetable_audio_file():
+    """The shared wavetable audio blob, loaded on first use"""
+    global _audio_file
+    if _audio_file is None:
+        _audio_file = load_wavetable_data()['audio_file']
+        # The wavetable shell and its component are constant apart from keyframes
+        template = wavetable_from_keyframes([])
+        register_template(template, ("groups",))
+        register_template(template["groups"][0]["components"][0], ("keyframes",))
+    return _audio_file
+
+def __getattr__(name):
+    # Keep `random_vital_preset.WAVETABLE_DATA` working without loading it at import
+    if name == "WAVETABLE_DATA":
+        return load_wavetable_data()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Constant sub-objects are encoded once and spliced into every serialized preset
+register_template(empty_sample())
+# The key layouts of everything else the generators build
+register_layout(("author", "comments", "macro1", "macro2", "macro3", "macro4", "preset_style", "synth_version", "settings"))
+register_layout(PRESET_SCHEMA.settings_keys)
+register_layout(("name", "num_points", "points", "powers", "smooth"))
+register_layout(("destination", "source"))
+register_layout(("position", "start_position", "window_fade", "window_size"))
+
+def generate_random_modulation(empty_mod_chance=0, rng=None):
+    rng = resolve_rng(rng)
+    
+    if rng.random() * 100 < empty_mod_chance:
+        return {"destination": "", "source": ""}
+    
+    return {
+        "destination": rng.choice(PRESET_SCHEMA.mod_destinations),
+        "source": rng.choice(PRESET_SCHEMA.mod_sources)
+    }
+
+def get_style_ranges(style):
+    """Get parameter ranges based on preset style"""
+    ranges = PRESET_SCHEMA.style_ranges
     return ranges.get(style, ranges["Keys"])  # Default to Keys if style not found
 
-def generate_random_preset(preset_style="Random", volume_range=(1000, 8000), polyphony_range=(1, 32), empty_mod_chance=70, mod_amount_range=(-1.0, 1.0), mod_power_range=(-4.0, 4.0)):
-    preset_styles = ["Keys", "Bass", "Lead", "Pad", "Pluck", "FX", "Drums", "Sequence"]
+def check_range(value):
+    """`value` as a (min, max) tuple, raising ValueError unless both are finite numbers and min <= max"""
+    try:
+        low, high = value
+    except (TypeError, ValueError):
+        raise ValueError(f"expected min,max: {value!r}") from None
+    for number in (low, high):
+        if isinstance(number, bool) or not isinstance(number, numbers.Real) or not math.isfinite(number):
+            raise ValueError(f"not a finite number: {number!r}")
+    if low > high:
+        raise ValueError(f"min is greater than max: {value!r}")
+    return (low, high)
+
+def check_preset_options(preset_style="Random", volume_range=(1000, 8000), polyphony_range=(1, 32), empty_mod_chance=70, mod_amount_range=(-1.0, 1.0), mod_power_range=(-4.0, 4.0), modulation_sampler=None):
+    """Raise ValueError for generate_random_preset arguments it cannot draw presets from"""
+    if preset_style != "Random" and preset_style not in PRESET_SCHEMA.preset_styles:
+        raise ValueError(f"Unknown preset_style: {preset_style!r}")
+    ranges = (("volume_range", volume_range), ("polyphony_range", polyphony_range),
+              ("mod_amount_range", mod_amount_range), ("mod_power_range", mod_power_range))
+    for name, value in ranges:
+        try:
+            check_range(value)
+        except ValueError as e:
+            raise ValueError(f"Invalid {name}: {e}") from None
+    if isinstance(empty_mod_chance, bool) or not isinstance(empty_mod_chance, numbers.Real) or not math.isfinite(empty_mod_chance):
+        raise ValueError(f"Invalid empty_mod_chance: not a finite number: {empty_mod_chance!r}")
+
+def draw_settings(specs, settings, style_ranges, arg_ranges, empty_mod_chance, rng, modulation_sampler=None):
+    """Draw each spec in order into `settings` from an already resolved rng.
+
+    `specs` are PRESET_SCHEMA ParamSpecs (or any subset, in order),
+    `style_ranges` a get_style_ranges() dict and `arg_ranges` maps
+    polyphony_range, mod_amount_range and mod_power_range to (low, high).
+    Pass `rng` through resolve_rng first. Returns `settings`.
+    """
+    # random_float/random_bool are inlined here; this loop runs ~700 times per preset
+    for key, kind, low, high in specs:
+        if kind == FLOAT:
+            settings[key] = low + rng.random() * (high - low)
+        elif kind == BOOL:
+            settings[key] = rng.choice(_BOOL_VALUES)
+        elif kind == INT:
+            settings[key] = float(rng.randint(low, high))
+        elif kind == STYLE_FLOAT:
+            min_val, max_val = style_ranges[low]
+            settings[key] = min_val + rng.random() * (max_val - min_val)
+        elif kind == ARG_FLOAT:
+            min_val, max_val = arg_ranges[low]
+            settings[key] = min_val + rng.random() * (max_val - min_val)
+        elif kind == ARG_INT:
+            settings[key] = float(rng.randint(*arg_ranges[low]))
+        elif kind == CONST:
+            settings[key] = low
+        elif kind == LFOS:
+            settings[key] = [generate_random_lfo(rng) for _ in range(PRESET_SCHEMA.num_lfos)]
+        elif kind == MODULATIONS:
+            if modulation_sampler is not None:
+                settings[key] = modulation_sampler.draw(rng, empty_mod_chance)
+            else:
+                settings[key] = [generate_random_modulation(empty_mod_chance, rng) for _ in range(PRESET_SCHEMA.num_modulations)]
+        elif kind == SAMPLE:
+            settings[key] = empty_sample()
+        elif kind == WAVETABLES:
+            settings[key] = [generate_random_wavetable(rng) for _ in range(PRESET_SCHEMA.num_wavetables)]
+    return settings
+
+def _draw_stages(stages, settings, style_ranges, arg_ranges, empty_mod_chance, rng, modulation_sampler=None):
+    """draw_settings over (stage, specs) groups, timing each group when profiling"""
+    if not _stage_callbacks:
+        for _, specs in stages:
+            draw_settings(specs, settings, style_ranges, arg_ranges, empty_mod_chance, rng, modulation_sampler)
+        return settings
+    for stage, specs in stages:
+        start = perf_counter()
+        draw_settings(specs, settings, style_ranges, arg_ranges, empty_mod_chance, rng, modulation_sampler)
+        _emit_stage(stage, start)
+    return settings
+
+def generate_random_preset(preset_style="Random", volume_range=(1000, 8000), polyphony_range=(1, 32), empty_mod_chance=70, mod_amount_range=(-1.0, 1.0), mod_power_range=(-4.0, 4.0), rng=None, seed=None, modulation_sampler=None):
+    """Generate one random preset dict.
+
+    Draws from `rng` (a random.Random or numpy Generator), or from a fresh
+    random.Random(seed) when only `seed` is given, or from the global random
+    module. When `seed` created the rng it is recorded in the preset's
+    comments, so calling again with the same seed and arguments regenerates
+    the same preset; next to a caller's `rng`, `seed` is ignored.
+    
+    A modulation_sampler.ModulationSampler draws the modulation matrix
+    from its weights instead of uniformly.
+    """
+    recorded_seed = seed if rng is None else None
+    if rng is None and seed is not None:
+        rng = random.Random(seed)
+    return _random_preset(resolve_rng(rng), recorded_seed, preset_style, volume_range, polyphony_range, empty_mod_chance, mod_amount_range, mod_power_range, modulation_sampler)
+
+def seeded_preset(seed, **preset_options):
+    """A (name, preset) pair drawn from random.Random(seed), as generate_vitalbank draws seeded presets"""
+    rng = random.Random(seed)
+    preset = _random_preset(rng, seed, **preset_options)
+    return random_name(rng=rng), preset
+
+def _random_preset(rng, recorded_seed, preset_style="Random", volume_range=(1000, 8000), polyphony_range=(1, 32), empty_mod_chance=70, mod_amount_range=(-1.0, 1.0), mod_power_range=(-4.0, 4.0), modulation_sampler=None):
+    """generate_random_preset drawing from `rng`, with `recorded_seed` (or None) in the comments"""
+    profiling = bool(_stage_callbacks)
+    if profiling:
+        start = perf_counter()
     
     # If Random style, choose one randomly
     if preset_style == "Random":
-        preset_style = random.choice(preset_styles)
+        preset_style = rng.choice(PRESET_SCHEMA.preset_styles)
     
     # Get parameter ranges based on style
     style_ranges = get_style_ranges(preset_style)
+    if profiling:
+        _emit_stage("style_lookup", start)
+    arg_ranges = {
+        "polyphony_range": polyphony_range,
+        "mod_amount_range": mod_amount_range,  # Use provided range
+        "mod_power_range": mod_power_range  # Use provided range
+    }
+    
+    # Modulation slot settings are drawn first but stored after everything else
+    modulation_settings = _draw_stages(PRESET_SCHEMA.modulation_stages, {}, style_ranges, arg_ranges, empty_mod_chance, rng)
+    
+    macros = [random_name(rng=rng) for _ in range(4)]
     
-    # Update modulation amount ranges to match min/max presets
-    modulation_settings = {}
-    for i in range(1, 65):
-        modulation_settings.update({
-            f"modulation_{i}_amount": random_float(*mod_amount_range),  # Use provided range
-            f"modulation_{i}_bipolar": random_bool(),
-            f"modulation_{i}_bypass": random_bool(),
-            f"modulation_{i}_power": random_float(*mod_power_range),  # Use provided range
-            f"modulation_{i}_stereo": random_bool()
-        })
+    settings = _draw_stages(PRESET_SCHEMA.settings_stages, {}, style_ranges, arg_ranges, empty_mod_chance, rng, modulation_sampler)
+    settings.update(modulation_settings)
     
     preset = {
         "author": "RandomPresetGenerator",
-        "comments": "Randomly generated preset",
-        "macro1": random_name(),
-        "macro2": random_name(),
-        "macro3": random_name(),
-        "macro4": random_name(),
+        "comments": "Randomly generated preset" if recorded_seed is None else f"Randomly generated preset (seed {recorded_seed})",
+        "macro1": macros[0],
+        "macro2": macros[1],
+        "macro3": macros[2],
+        "macro4": macros[3],
         "preset_style": preset_style,
         "synth_version": "1.5.5",
-        "settings": {
-            # Basic settings
-            "volume": 6000.0,
-            "polyphony": float(random.randint(*polyphony_range)),
-            "oversampling": 0.0,
-            "beats_per_minute": 2.0,
-            "bypass": 0.0,
-            
-            # Voice settings
-            "voice_amplitude": 1.0,
-            "voice_override": random_bool(),
-            "voice_priority": float(random.randint(0, 8)),
-            "voice_transpose": float(random.randint(-24, 24)),
-            "voice_tune": random_float(-1, 1),
-            
-            # Effect on/off states
-            "chorus_on": random_bool(),
-            "compressor_on": random_bool(),
-            "delay_on": random_bool(),
-            "distortion_on": random_bool(),
-            "eq_on": random_bool(),
-            "flanger_on": random_bool(),
-            "phaser_on": random_bool(),
-            "reverb_on": random_bool(),
-            "sample_on": random_bool(),
-            
-            # Filter on/off states
-            "filter_1_on": random_bool(),
-            "filter_2_on": random_bool(),
-            "filter_fx_on": random_bool(),
-            
-            # Oscillator settings (for each oscillator)
-            **{f"osc_{i}_on": random_bool() for i in range(1, 4)},
-            **{f"osc_{i}_level": random_float(*style_ranges["osc_level"]) for i in range(1, 4)},
-            **{f"osc_{i}_transpose": float(random.randint(-24, 24)) for i in range(1, 4)},
-            **{f"osc_{i}_tune": random_float(-1, 1) for i in range(1, 4)},
-            **{f"osc_{i}_unison_voices": float(random.randint(1, 8)) for i in range(1, 4)},
-            **{f"osc_{i}_unison_detune": random_float(2, 5) for i in range(1, 4)},
-            **{f"osc_{i}_unison_blend": random_float(0.5, 1.0) for i in range(1, 4)},
-            **{f"osc_{i}_stereo_spread": random_float(0, 1) for i in range(1, 4)},
-            **{f"osc_{i}_random_phase": random_bool() for i in range(1, 4)},
-            **{f"osc_{i}_phase": random_float(0, 1) for i in range(1, 4)},
-            **{f"osc_{i}_midi_track": 1 for i in range(1, 4)},
-            **{f"osc_{i}_distortion_type": float(random.randint(0, 12)) for i in range(1, 4)},
-            **{f"osc_{i}_spectral_morph_type": float(random.randint(0, 15)) for i in range(1, 4)},
-            **{f"osc_{i}_frame_spread": float(0) for i in range(1, 4)},
-            **{f"osc_{i}_spectral_morph_amount": random_float(0, 1) for i in range(1, 4)},
-            **{f"osc_{i}_spectral_morph_phase": random_float(0, 1) for i in range(1, 4)},
-            **{f"osc_{i}_spectral_morph_spread": random_float(0, 1) for i in range(1, 4)},
-            
-            # Filter settings
-            "filter_1_cutoff": random_float(*style_ranges["filter_cutoff"]),
-            "filter_1_resonance": random_float(0, 1),
-            "filter_1_blend": random_float(0, 1),
-            "filter_1_style": float(random.randint(0, 3)),
-            "filter_1_model": float(random.randint(0, 8)),
-            "filter_1_drive": random_float(0, 1),
-            "filter_1_mix": random_float(0, 1),
-            
-            # Envelope settings (for each envelope)
-            **{f"env_{i}_attack": random_float(*style_ranges["env_attack"]) for i in range(1, 7)},
-            **{f"env_{i}_decay": random_float(*style_ranges["env_decay"]) for i in range(1, 7)},
-            **{f"env_{i}_sustain": random_float(*style_ranges["env_sustain"]) for i in range(1, 7)},
-            **{f"env_{i}_release": random_float(*style_ranges["env_release"]) for i in range(1, 7)},
-            **{f"env_{i}_attack_power": random_float(-4, 4) for i in range(1, 7)},
-            **{f"env_{i}_decay_power": random_float(-4, 4) for i in range(1, 7)},
-            **{f"env_{i}_release_power": random_float(-4, 4) for i in range(1, 7)},
-            
-            # Effects
-            "reverb_decay_time": random_float(-5, 5),
-            "reverb_dry_wet": random_float(0, 1),
-            "reverb_size": random_float(0, 1),
-            "reverb_high_shelf_cutoff": random_float(20, 120),
-            "reverb_low_shelf_cutoff": random_float(0, 100),
-            
-            "delay_feedback": random_float(0, 0.95),
-            "delay_dry_wet": random_float(0, 1),
-            "delay_tempo": float(random.randint(2, 16)),
-            
-            # LFOs
-            "lfos": [generate_random_lfo() for _ in range(8)],
-            
-            # Modulations
-            "modulations": [generate_random_modulation(empty_mod_chance) for _ in range(64)],
-            
-            # Sample (empty)
-            "sample": {
-                "length": 0,
-                "name": "",
-                "sample_rate": 44100,
-                "samples": ""
-            },
-            
-            # Wavetables
-            "wavetables": [generate_random_wavetable() for _ in range(3)],
-            
-            # Additional settings
-            "stereo_mode": random_bool(),
-            "pitch_bend_range": float(random.randint(1, 24)),
-            "velocity_track": random_float(0, 1),
-            "portamento_time": random_float(-10, 0),
-            "legato": random_bool(),
-            
-            # Macro controls
-            "macro_control_1": random_float(0, 1),
-            "macro_control_2": random_float(0, 1),
-            "macro_control_3": random_float(0, 1),
-            "macro_control_4": random_float(0, 1),
-            
-            # Add all modulation settings
-            **modulation_settings
-        }
+        "settings": settings
     }
     
     return preset
 
-def save_random_preset(output_dir="random_presets", preset_style="Random", volume_range=(1000, 8000), polyphony_range=(1, 32), empty_mod_chance=70):
+def save_random_preset(output_dir="random_presets", preset_style="Random", volume_range=(1000, 8000), polyphony_range=(1, 32), empty_mod_chance=70, rng=None, seed=None, compact=False, backend="json"):
     # Create output directory if it doesn't exist
     os.makedirs(output_dir, exist_ok=True)
     
-    # Generate random preset
-    preset = generate_random_preset(preset_style, volume_range, polyphony_range, empty_mod_chance)
+    # Generate random preset; the seed is only recorded when it created the rng
+    recorded_seed = seed if rng is None else None
+    if rng is None and seed is not None:
+        rng = random.Random(seed)
+    rng = resolve_rng(rng)
+    preset = _random_preset(rng, recorded_seed, preset_style, volume_range, polyphony_range, empty_mod_chance)
     
     # Generate random filename
-    filename = f"{random_name()}.vital"
+    filename = f"{random_name(rng=rng)}.vital"
     filepath = os.path.join(output_dir, filename)
     
     # Save preset
-    with open(filepath, 'w') as f:
-        json.dump(preset, f, indent=2)
+    with open(filepath, 'wb') as f:
+        write_preset(preset, f, compact, backend)
     
     return filepath
 
-def generate_vitalbank(num_presets=5, output_dir="random_presets"):
-    # Create output directory if it doesn't exist
-    os.makedirs(output_dir, exist_ok=True)
+def derive_seed(master_seed, index):
+    """Seed of preset `index` in a bank generated from `master_seed`"""
+    import hashlib
+    digest = hashlib.blake2b(f"{master_seed}:{index}".encode("ascii"), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+def _serialized_preset(preset, name, compact, backend, with_features, preset_options):
+    data = _timed_stage("serialization", serialize_preset, preset, compact, backend)
+    if not with_features:
+        return name, data
+    from preset_diversity import preset_features
+    return name, data, preset_features(preset, preset_options)
+
+def _generate_serialized_presets(master_seed, start, stop, compact=False, backend="json", preset_options=None, with_features=False):
+    """Generate and serialize presets start..stop-1, each from its own derived seed.
+
+    With `with_features`, each result also carries the preset's
+    preset_diversity feature vector.
+    """
+    preset_options = preset_options or {}
+    results = []
+    for index in range(start, stop):
+        name, preset = seeded_preset(derive_seed(master_seed, index), **preset_options)
+        results.append(_serialized_preset(preset, name, compact, backend, with_features, preset_options))
+    return results
+
+def _iter_serialized_presets(num_presets, master_seed, jobs, compact=False, backend="json", preset_options=None, with_features=False):
+    """Yield (name, bytes) for every preset in bank order, without end if `num_presets` is None"""
+    # The chunking does not depend on `jobs`, so neither does the output
+    if num_presets is None:
+        chunks = ((start, start + _BANK_CHUNK_SIZE) for start in itertools.count(0, _BANK_CHUNK_SIZE))
+    else:
+        chunks = ((start, min(start + _BANK_CHUNK_SIZE, num_presets))
+                  for start in range(0, num_presets, _BANK_CHUNK_SIZE))
+    args = (compact, backend, preset_options, with_features)
+    if jobs == 1:
+        for start, stop in chunks:
+            yield from _generate_serialized_presets(master_seed, start, stop, *args)
+        return
     
-    # Generate multiple presets
-    preset_files = []
-    for i in range(num_presets):
-        filepath = save_random_preset(output_dir)
-        preset_files.append(filepath)
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        # Keep a bounded number of chunks in flight and collect them in submission order
+        pending = deque()
+        for start, stop in chunks:
+            if len(pending) >= 2 * jobs:
+                yield from pending.popleft().result()
+            pending.append(executor.submit(_generate_serialized_presets, master_seed, start, stop, *args))
+        while pending:
+            yield from pending.popleft().result()
+
+def _iter_unseeded_presets(num_presets, compact, backend, preset_options, with_features):
+    """Like _iter_serialized_presets, drawing from the global random state"""
+    for _ in (itertools.count() if num_presets is None else range(num_presets)):
+        name = random_name()
+        yield _serialized_preset(generate_random_preset(**preset_options), name, compact, backend, with_features, preset_options)
+
+def _diverse_presets(candidates, num_presets, index):
+    """Yield the first `num_presets` (name, bytes) candidates that `index` keeps"""
+    if num_presets == 0:
+        return
+    max_attempts = _DIVERSITY_MAX_ATTEMPTS * num_presets
+    kept = 0
+    for attempts, (name, data, features) in enumerate(candidates, 1):
+        if attempts > max_attempts:
+            raise RuntimeError(f"Only {kept} of {num_presets} presets are at least {index.min_distance} apart "
+                               f"after {max_attempts} attempts; lower the minimum distance")
+        if index.add(features):
+            yield name, data
+            kept += 1
+            if kept == num_presets:
+                return
+
+def iter_serialized_presets(num_presets, jobs=1, seed=None, compact=False, backend="json", preset_options=None, min_distance=None):
+    """Yield (name, serialized bytes) for `num_presets` random presets, in order.
+
+    `preset_options` are keyword arguments for generate_random_preset. Seeding
+    and `jobs` work as in generate_vitalbank: unseeded single-process runs
+    draw from the global random state, anything else from per-preset seeds
+    derived from `seed` (or a random master seed).
+
+    With `min_distance`, presets closer than that to an earlier one (see
+    preset_diversity) are skipped and replaced by further draws. It may also
+    be a preset_diversity.DiversityIndex, e.g. to read its counts afterwards.
+    """
+    with_features = min_distance is not None
+    if seed is None and jobs == 1:
+        preset_options = preset_options or {}
+        candidates = _iter_unseeded_presets(None if with_features else num_presets, compact, backend, preset_options, with_features)
+    else:
+        master_seed = seed if seed is not None else random.getrandbits(64)
+        candidates = _iter_serialized_presets(None if with_features else num_presets, master_seed, jobs, compact, backend, preset_options, with_features)
+    if not with_features:
+        return candidates
+    from preset_diversity import DiversityIndex
+    index = min_distance if isinstance(min_distance, DiversityIndex) else DiversityIndex(min_distance)
+    return _diverse_presets(candidates, num_presets, index)
+
+def generate_vitalbank(num_presets=5, output_dir="random_presets", output=None, jobs=1, seed=None, timestamp=None, compact=False, backend="json", preset_options=None, min_distance=None, presets_per_volume=None, compression="default", compress_jobs=1):
+    """Generate a bank of random presets and return where it was written.
+
+    Presets are serialized straight into the archive. By default the bank is
+    written to a randomly named .vitalbank in `output_dir`; pass `output` (a
+    path or a binary file object such as a BytesIO) to write it elsewhere.
+    Preset i (from 1) is stored as <random name>_<i>, zero padded to four
+    digits, so no two members share a name.
+    
+    Each preset is generated, written and dropped before the next, so memory
+    stays flat however large the bank (ZIP64 past 65535 presets). Only a
+    `min_distance` index grows with the bank. With `presets_per_volume`, the
+    bank is split into volumes of that many presets (see
+    vitalbank.VitalbankVolumes) and the list of volume paths is returned.
+    
+    `compression` is one of vitalbank.COMPRESSION_LEVELS ("store", "fast",
+    "default" or "best"); `compress_jobs` > 1 compresses members on that
+    many threads.
+    
+    With jobs > 1, presets are generated and serialized in a process pool and
+    written in order by this process. Passing `seed` (or jobs > 1) gives every
+    preset its own seed derived from the master seed, so a given seed and
+    timestamp produce the same bank whatever the number of jobs.
+    
+    `compact` and `backend` are passed to preset_serializer.serialize_preset,
+    `preset_options` (style, ranges...) to generate_random_preset.
+    `min_distance` rejects near duplicates as in iter_serialized_presets.
+    """
+    if presets_per_volume is not None and output is not None and not isinstance(output, (str, os.PathLike)):
+        raise ValueError("Volumes can only be written to a path")
+    if seed is None and jobs == 1:
+        # Unseeded single-process run: draw everything from the global random state
+        bank_name = random_name()
+    else:
+        seed = seed if seed is not None else random.getrandbits(64)
+        bank_name = random_name(rng=random.Random(seed))
+    presets = iter_serialized_presets(num_presets, jobs, seed, compact, backend, preset_options, min_distance)
     
-    # Create a zip file with .vitalbank extension
-    zip_name = f"{random_name()}"
-    zip_path = os.path.join(output_dir, f"{zip_name}.zip")
-    vitalbank_path = os.path.join(output_dir, f"{zip_name}.vitalbank")
+    if output is None:
+        # Create output directory if it doesn't exist
+        os.makedirs(output_dir, exist_ok=True)
+        output = os.path.join(output_dir, f"{bank_name}.vitalbank")
     
-    # Get current datetime for folder name
-    current_time = datetime.now().strftime("%Y%m%d_%H%M%S")
-    folder_name = f"RANDOM_{current_time}"
+    # Store each preset in the Presets folder within the zip
+    from vitalbank import COMPRESSION_LEVELS, VitalbankVolumes, VitalbankWriter
+    compress_type, compresslevel = COMPRESSION_LEVELS[compression]
+    compress_options = {"compression": compress_type, "compresslevel": compresslevel, "compress_jobs": compress_jobs}
+    if presets_per_volume is None:
+        writer = VitalbankWriter(output, timestamp=timestamp, **compress_options)
+    else:
+        writer = VitalbankVolumes(output, presets_per_volume, timestamp=timestamp, **compress_options)
+    try:
+        for index, (name, data) in enumerate(presets, 1):
+            # The index makes member names unique by construction: random names can collide
+            # in large banks and the streaming writer keeps no index of the names written
+            _timed_stage("zip_write", writer.add_serialized_preset, f"{name}_{index:04d}", data)
+    except BaseException:
+        # Never leave a truncated bank behind
+        writer.abort()
+        raise
+    # Writing the central directory and closing the file
+    _timed_stage("cleanup", writer.close)
     
-    # Create zip file containing all presets in a Presets folder
-    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-        for preset_file in preset_files:
-            # Store each preset in the Presets folder within the zip
-            arcname = os.path.join(folder_name, 'Presets', os.path.basename(preset_file))
-            zipf.write(preset_file, arcname)
+    return output if presets_per_volume is None else writer.paths
+
+def _write_presets(presets, output, output_dir, stream):
+    """Write (name, bytes) pairs as .vital files, or one after another to `stream`"""
+    count = 0
+    total_bytes = 0
+    if stream is not None:
+        for _, data in presets:
+            stream.write(data)
+            stream.write(b"\n")
+            count += 1
+            total_bytes += len(data) + 1
+        stream.flush()
+        return count, total_bytes
+    output_dir = output or output_dir
+    os.makedirs(output_dir, exist_ok=True)
+    for name, data in presets:
+        with open(os.path.join(output_dir, f"{name}.vital"), 'wb') as f:
+            f.write(data)
+        count += 1
+        total_bytes += len(data)
+    return count, total_bytes
+
+def _parse_args(argv):
+    import argparse
+    from datetime import datetime
+    
+    def value_range(cast):
+        return {"nargs": 2, "type": cast, "metavar": ("MIN", "MAX")}
     
-    # Rename zip file to .vitalbank
-    shutil.move(zip_path, vitalbank_path)
+    def timestamp(text):
+        try:
+            return datetime.fromisoformat(text)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"expected YYYY-MM-DDTHH:MM:SS, got {text!r}") from None
     
-    # Clean up individual .vital files
-    for preset_file in preset_files:
-        os.remove(preset_file)
+    parser = argparse.ArgumentParser(
+        prog="random_vital_preset.py",
+        description="Generate random Vital presets without a GUI. Timing stats are printed to stderr as JSON.",
+    )
+    parser.add_argument("-n", "--count", type=int, default=100, help="number of presets (default: 100)")
+    parser.add_argument("--format", choices=("vitalbank", "vital"), default="vitalbank",
+                        help="one .vitalbank archive (default) or loose .vital files")
+    parser.add_argument("-o", "--output", default=None,
+                        help="bank path or preset directory; '-' streams to stdout (presets newline separated)")
+    parser.add_argument("--output-dir", default="random_presets",
+                        help="directory for randomly named output when --output is not given (default: random_presets)")
+    parser.add_argument("--style", default="Random", choices=("Random",) + PRESET_SCHEMA.preset_styles)
+    parser.add_argument("--volume-range", default=(1000, 8000), **value_range(float))
+    parser.add_argument("--polyphony-range", default=(1, 32), **value_range(int))
+    parser.add_argument("--empty-mod-chance", type=float, default=70, help="percent of empty modulation slots (default: 70)")
+    parser.add_argument("--mod-amount-range", default=(-1.0, 1.0), **value_range(float))
+    parser.add_argument("--mod-power-range", default=(-4.0, 4.0), **value_range(float))
+    parser.add_argument("--mod-weights", default=None, metavar="JSON",
+                        help='file of modulation weights, {"destinations": {NAME: WEIGHT, ...}, "sources": {...}}; '
+                             "unlisted names weigh 1")
+    parser.add_argument("--unique-routings", action="store_true", help="never route the same destination and source twice in a preset")
+    parser.add_argument("--no-matrix-targets", action="store_true", help="never target another slot's modulation amount")
+    parser.add_argument("--min-distance", type=float, default=None,
+                        help="skip presets closer than this to an earlier one (feature distance, about 0.5 apart on average)")
+    parser.add_argument("--volume-size", type=int, default=None, metavar="N",
+                        help="split the bank into volumes of N presets (NAME_001.vitalbank, NAME_002.vitalbank...)")
+    parser.add_argument("--compression", choices=("store", "fast", "default", "best"), default="default",
+                        help="bank member compression (default: default)")
+    parser.add_argument("--compress-jobs", type=int, default=1, help="threads compressing bank members (default: 1)")
+    parser.add_argument("--seed", type=int, default=None, help="master seed; the same seed gives the same presets (default: a random one, reported in the stats)")
+    parser.add_argument("--timestamp", type=timestamp, default=None, metavar="YYYY-MM-DDTHH:MM:SS",
+                        help="bank timestamp, which names its folder and dates its members; with --seed, the same "
+                             "timestamp gives a byte-identical bank (default: now, reported in the stats)")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="worker processes (default: 1)")
+    layout = parser.add_mutually_exclusive_group()
+    layout.add_argument("--compact", action="store_true", help="write presets without indentation")
+    layout.add_argument("--indent", dest="compact", action="store_false", help="write presets indented like Vital (default)")
+    parser.add_argument("--backend", choices=("json", "orjson"), default="json",
+                        help="serializer backend (default: json, byte-identical to json.dumps; orjson is faster but "
+                             "spells some floats differently and does not escape non-ASCII text)")
+    parser.add_argument("--profile", action="store_true", help="add a per-stage breakdown to the stats")
+    parser.add_argument("--quiet", action="store_true", help="do not print stats")
+    args = parser.parse_args(argv)
+    if args.count < 0:
+        parser.error("--count must not be negative")
+    for option in ("volume_range", "polyphony_range", "mod_amount_range", "mod_power_range"):
+        try:
+            check_range(tuple(getattr(args, option)))
+        except ValueError as e:
+            parser.error(f"--{option.replace('_', '-')}: {e}")
+    if not math.isfinite(args.empty_mod_chance):
+        parser.error("--empty-mod-chance must be a finite number")
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.compress_jobs < 1:
+        parser.error("--compress-jobs must be at least 1")
+    if args.volume_size is not None:
+        if args.volume_size < 1:
+            parser.error("--volume-size must be at least 1")
+        if args.format != "vitalbank" or args.output == "-":
+            parser.error("--volume-size needs --format vitalbank and a file output")
+    if args.min_distance is not None and args.min_distance <= 0:
+        parser.error("--min-distance must be positive")
+    args.modulation_sampler = None
+    if args.mod_weights is not None or args.unique_routings or args.no_matrix_targets:
+        from modulation_sampler import ModulationSampler
+        weights = {}
+        try:
+            if args.mod_weights is not None:
+                with open(args.mod_weights) as f:
+                    weights = json.load(f)
+                if not isinstance(weights, dict):
+                    raise ValueError("expected a JSON object")
+            args.modulation_sampler = ModulationSampler(
+                weights.get("destinations"), weights.get("sources"), not args.no_matrix_targets, args.unique_routings)
+        except (OSError, ValueError) as e:
+            parser.error(f"--mod-weights: {e}")
+    return args
+
+def main(argv=None):
+    """Command line entry point; see `python random_vital_preset.py --help`"""
+    import sys
+    args = _parse_args(argv)
+    preset_options = {
+        "preset_style": args.style,
+        "volume_range": tuple(args.volume_range),
+        "polyphony_range": tuple(args.polyphony_range),
+        "empty_mod_chance": args.empty_mod_chance,
+        "mod_amount_range": tuple(args.mod_amount_range),
+        "mod_power_range": tuple(args.mod_power_range),
+    }
+    if args.modulation_sampler is not None:
+        preset_options["modulation_sampler"] = args.modulation_sampler
+    stream = sys.stdout.buffer if args.output == "-" else None
+    diversity = None
+    if args.min_distance is not None:
+        from preset_diversity import DiversityIndex
+        diversity = DiversityIndex(args.min_distance)
+    profiler = StageProfiler(keep_events=False) if args.profile else None
+    if profiler is not None:
+        add_stage_callback(profiler)
     
-    return vitalbank_path
+    # Always run from a master seed and timestamp, so the ones reported in the stats reproduce the run
+    seed = args.seed if args.seed is not None else random.getrandbits(64)
+    timestamp = args.timestamp
+    if timestamp is None:
+        from datetime import datetime
+        timestamp = datetime.now().replace(microsecond=0)
+    start = perf_counter()
+    try:
+        if args.format == "vitalbank":
+            output = generate_vitalbank(args.count, args.output_dir, stream or args.output, args.jobs, seed, timestamp,
+                                        compact=args.compact, backend=args.backend, preset_options=preset_options,
+                                        min_distance=diversity, presets_per_volume=args.volume_size,
+                                        compression=args.compression, compress_jobs=args.compress_jobs)
+            if stream is not None:
+                total_bytes = None
+            elif args.volume_size is not None:
+                total_bytes = sum(os.path.getsize(path) for path in output)
+            else:
+                total_bytes = os.path.getsize(output)
+        else:
+            presets = iter_serialized_presets(args.count, args.jobs, seed, args.compact, args.backend, preset_options, diversity)
+            _, total_bytes = _write_presets(presets, args.output, args.output_dir, stream)
+            output = args.output or args.output_dir
+    finally:
+        if profiler is not None:
+            remove_stage_callback(profiler)
+    elapsed = perf_counter() - start
+    
+    if not args.quiet:
+        stats = {
+            "format": args.format,
+            "presets": args.count,
+            "output": "-" if stream is not None else output,
+            "bytes": total_bytes,
+            "seed": seed,
+            "timestamp": timestamp.isoformat() if args.format == "vitalbank" else None,
+            "jobs": args.jobs,
+            "seconds": elapsed,
+            "presets_per_sec": args.count / elapsed if elapsed else None,
+        }
+        if diversity is not None:
+            stats["near_duplicates_rejected"] = diversity.rejected
+        if profiler is not None:
+            stats["stages"] = profiler.summary()
+        # stderr keeps stdout free for streamed output
+        print(json.dumps(stats), file=sys.stderr)
+    return 0
 
 if __name__ == "__main__":
-    # Generate a vitalbank with 100 random presets
-    vitalbank_path = generate_vitalbank(100)
-    print(f"Generated vitalbank: {vitalbank_path}") 
\ No newline at end of file
+    # Without arguments this writes a vitalbank with 100 random presets to random_presets/
+    raise SystemExit(main()) 
\ No newline at end of file
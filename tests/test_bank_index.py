@@ -0,0 +1,101 @@
+import os
+import sys
+import tempfile
+import unittest
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bank_index import BankIndex, parse_condition, parse_routing
+from random_vital_preset import generate_vitalbank
+
+TIMESTAMP = datetime(2024, 1, 1)
+
+class BankIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.dir.name, "banks")
+        self.other = os.path.join(self.dir.name, "other")
+        self.index = BankIndex(os.path.join(self.dir.name, "index.sqlite"))
+
+    def tearDown(self):
+        self.index.close()
+        self.dir.cleanup()
+
+    def bank(self, name, count, seed, root=None, **preset_options):
+        path = os.path.join(root or self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        generate_vitalbank(count, output=path, seed=seed, timestamp=TIMESTAMP, preset_options=preset_options)
+        return path
+
+    def counts(self, summary):
+        return {key: value for key, value in summary.items() if key != "errors" and value}
+
+    def test_update_is_incremental(self):
+        a = self.bank("a.vitalbank", 3, 1)
+        self.bank("sub/b.vitalbank", 2, 2)
+        self.assertEqual(self.counts(self.index.update_dir(self.root, jobs=1)), {"scanned": 2, "indexed": 2, "presets": 5})
+        self.assertEqual(self.counts(self.index.update_dir(self.root, jobs=1)), {"scanned": 2, "unchanged": 2})
+
+        os.utime(a, ns=(1, 1))  # touched: recognised by its hash, not reread
+        self.assertEqual(self.counts(self.index.update_dir(self.root, jobs=1)), {"scanned": 2, "unchanged": 2})
+        self.bank("a.vitalbank", 4, 3)
+        self.assertEqual(self.counts(self.index.update_dir(self.root, jobs=2)), {"scanned": 2, "unchanged": 1, "indexed": 1, "presets": 4})
+        self.assertEqual(self.index.stats()["presets"], 6)
+
+    def test_broken_bank_fails_and_loses_its_rows(self):
+        a = self.bank("a.vitalbank", 3, 1)
+        self.index.update_dir(self.root, jobs=1)
+        with open(a, "wb") as f:
+            f.write(b"not a zip")
+        summary = self.index.update_dir(self.root, jobs=1)
+        self.assertEqual((summary["failed"], summary["errors"][0][0]), (1, a))
+        self.assertEqual(self.index.stats()["presets"], 0)
+
+    def test_prune(self):
+        a = self.bank("a.vitalbank", 2, 1)
+        self.bank("b.vitalbank", 2, 2)
+        elsewhere = self.bank("c.vitalbank", 2, 3, root=self.other)
+        self.index.update([a, elsewhere], jobs=1)
+        self.index.update_dir(self.root, jobs=1)
+        os.remove(a)
+
+        # A plain update never forgets banks
+        self.assertEqual(self.index.update([elsewhere], jobs=1)["removed"], 0)
+        # update_dir only forgets banks under its root
+        self.assertEqual(self.index.update_dir(self.root, jobs=1)["removed"], 1)
+        self.assertEqual(self.index.stats()["banks"], 2)
+        self.assertEqual(self.index.update([elsewhere], jobs=1, prune=True)["removed"], 1)
+        self.assertEqual({ref.bank for ref in self.index.query()}, {elsewhere})
+
+    def test_query(self):
+        self.bank("pads.vitalbank", 4, 1, preset_style="Pad")
+        self.bank("bass.vitalbank", 4, 2, preset_style="Bass")
+        self.index.update_dir(self.root, jobs=1)
+
+        pads = self.index.query(preset_style="Pad")
+        self.assertEqual(len(pads), 4)
+        self.assertTrue(all(ref.bank.endswith("pads.vitalbank") and ref.load()["preset_style"] == "Pad" for ref in pads))
+        self.assertEqual(len(self.index.query(limit=3)), 3)
+
+        cutoff = sorted(ref.load()["settings"]["filter_1_cutoff"] for ref in self.index.query())[3]
+        low = self.index.query(conditions=[("filter_1_cutoff", "<=", cutoff)])
+        self.assertEqual(len(low), 4)
+        self.assertTrue(all(ref.load()["settings"]["filter_1_cutoff"] <= cutoff for ref in low))
+
+        preset = pads[0].load()
+        destination, source = next((m["destination"], m["source"]) for m in preset["settings"]["modulations"] if m["source"])
+        routed = self.index.query(routings=[(destination, source)])
+        self.assertIn(pads[0], routed)
+        for ref in routed:
+            self.assertIn({"destination": destination, "source": source}, ref.load()["settings"]["modulations"])
+        self.assertGreaterEqual(len(self.index.query(routings=[(None, source)])), len(routed))
+
+    def test_parsers(self):
+        self.assertEqual(parse_condition("filter_1_cutoff<=40"), ("filter_1_cutoff", "<=", 40.0))
+        self.assertEqual(parse_routing("*:lfo_1"), (None, "lfo_1"))
+        with self.assertRaises(ValueError):
+            parse_condition("filter_1_cutoff~40")
+
+if __name__ == "__main__":
+    unittest.main()
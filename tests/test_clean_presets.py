@@ -0,0 +1,163 @@
+import os
+import sys
+import tempfile
+import unittest
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from clean_presets import (
+    CLEANED, FAILED, MANIFEST_NAME, SKIPPED, CleanManifest,
+    clean_all_presets, clean_files, clean_preset, clean_preset_data, clean_vitalbank, is_clean,
+)
+from preset_serializer import serialize_preset
+from random_vital_preset import generate_random_preset
+
+# Truncated mid-sample: it fails is_clean, so it is parsed, and parsing fails
+_BROKEN = b'{"settings": {"sample": {"samples": "AAAA'
+
+def _dirty(seed):
+    """A preset carrying sample and wave data, as Vital saves them"""
+    preset = generate_random_preset(seed=seed)
+    preset["settings"]["sample"]["samples"] = "AAAA" * 256
+    for wavetable in preset["settings"]["wavetables"]:
+        for keyframe in wavetable["groups"][0]["components"][0]["keyframes"]:
+            keyframe["wave_data"] = "BBBB" * 256
+    return serialize_preset(preset)
+
+def _clean(seed):
+    return serialize_preset(clean_preset_data(generate_random_preset(seed=seed)))
+
+class CleanTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.root = self.dir.name
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def write(self, name, data):
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def read(self, path):
+        with open(path, "rb") as f:
+            return f.read()
+
+class CleanPresetTest(CleanTestCase):
+    def test_is_clean(self):
+        self.assertTrue(is_clean(_clean(1)))
+        self.assertFalse(is_clean(_dirty(1)))
+
+    def test_dirty_preset_is_cleaned(self):
+        path = self.write("a.vital", _dirty(1))
+        size = os.path.getsize(path)
+        result = clean_preset(path)
+        self.assertEqual(result.status, CLEANED)
+        self.assertEqual(result.bytes_saved, size - os.path.getsize(path))
+        self.assertEqual(self.read(path), _clean(1))
+
+    def test_clean_preset_is_left_untouched(self):
+        path = self.write("a.vital", _clean(1))
+        os.utime(path, ns=(1, 1))
+        self.assertEqual(clean_preset(path).status, SKIPPED)
+        self.assertEqual(os.stat(path).st_mtime_ns, 1)
+
+    def test_broken_preset_fails(self):
+        result = clean_preset(self.write("a.vital", _BROKEN))
+        self.assertEqual(result.status, FAILED)
+        self.assertIsNone(result.entry)
+
+class CleanVitalbankTest(CleanTestCase):
+    def bank(self, name, members):
+        path = os.path.join(self.root, name)
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as bank:
+            for member, data in members.items():
+                bank.writestr(member, data)
+        return path
+
+    def test_only_dirty_members_change(self):
+        members = {"Bank/Presets/a.vital": _dirty(1), "Bank/Presets/b.vital": _clean(2), "Bank/readme.txt": b"hello"}
+        path = self.bank("a.vitalbank", members)
+        self.assertEqual(clean_vitalbank(path).status, CLEANED)
+        with zipfile.ZipFile(path) as bank:
+            self.assertIsNone(bank.testzip())
+            self.assertEqual(bank.namelist(), list(members))
+            self.assertEqual(bank.read("Bank/Presets/a.vital"), _clean(1))
+            self.assertEqual(bank.read("Bank/Presets/b.vital"), members["Bank/Presets/b.vital"])
+            self.assertEqual(bank.read("Bank/readme.txt"), b"hello")
+
+    def test_clean_bank_is_left_untouched(self):
+        path = self.bank("a.vitalbank", {"Bank/Presets/a.vital": _clean(1)})
+        before = self.read(path)
+        self.assertEqual(clean_vitalbank(path).status, SKIPPED)
+        self.assertEqual(self.read(path), before)
+        self.assertEqual([name for name in os.listdir(self.root) if name.endswith(".tmp")], [])
+
+class CleanManifestTest(CleanTestCase):
+    def setUp(self):
+        super().setUp()
+        self.dirty = self.write("dirty.vital", _dirty(1))
+        self.clean = self.write("sub/clean.vital", _clean(2))
+        self.broken = self.write("broken.vital", _BROKEN)
+
+    def run_clean(self, **options):
+        return clean_all_presets(self.root, jobs=1, **options)
+
+    def test_second_run_skips_unchanged_files(self):
+        first = self.run_clean()
+        self.assertEqual((first["scanned"], first["cleaned"], first["skipped"], first["failed"]), (3, 1, 1, 1))
+        second = self.run_clean()
+        # Failed files are not recorded, so they are tried again
+        self.assertEqual((second["unchanged"], second["failed"], second["cleaned"], second["skipped"]), (2, 1, 0, 0))
+
+    def test_touched_file_is_recognised_by_its_hash(self):
+        self.run_clean()
+        os.utime(self.clean, ns=(1, 1))
+        summary = self.run_clean()
+        self.assertEqual((summary["unchanged"], summary["skipped"]), (1, 1))
+        # The new mtime is recorded, so the next run skips it outright
+        self.assertEqual(self.run_clean()["unchanged"], 2)
+
+    def test_changed_file_is_cleaned_again(self):
+        self.run_clean()
+        self.write("sub/clean.vital", _dirty(3))
+        summary = self.run_clean()
+        self.assertEqual((summary["unchanged"], summary["cleaned"]), (1, 1))
+        self.assertEqual(self.read(self.clean), _clean(3))
+
+    def test_removed_files_are_pruned(self):
+        self.run_clean()
+        os.remove(self.dirty)
+        self.run_clean()
+        with CleanManifest(self.root) as manifest:
+            self.assertEqual(set(manifest.entries), {os.path.join("sub", "clean.vital")})
+
+    def test_worker_processes_give_the_same_summary(self):
+        serial = clean_all_presets(self.root, jobs=1, use_index=False)
+        self.write("dirty.vital", _dirty(1))
+        self.assertEqual(clean_all_presets(self.root, jobs=2, use_index=False), serial)
+
+    def test_rebuild_and_no_index(self):
+        self.run_clean()
+        self.assertEqual(self.run_clean(rebuild_index=True)["unchanged"], 0)
+        self.assertEqual(self.run_clean(use_index=False)["unchanged"], 0)
+
+    def test_records_survive_an_interrupted_run(self):
+        # Each batch is committed as it finishes
+        manifest = CleanManifest(self.root)
+        clean_files([self.dirty, self.clean], jobs=1, manifest=manifest)
+        manifest._db.close()  # no close(): the process died here
+        with CleanManifest(self.root) as reopened:
+            self.assertEqual(len(reopened.entries), 2)
+
+    def test_manifest_is_not_cleaned(self):
+        self.run_clean()
+        self.assertTrue(os.path.exists(os.path.join(self.root, MANIFEST_NAME)))
+        self.assertEqual(self.run_clean()["scanned"], 3)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import os
+import pickle
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compact_preset import LAYOUT, Preset, generate_compact_batch, generate_compact_preset
+from modulation_sampler import ModulationSampler
+from preset_batch import generate_preset_batch
+from preset_serializer import serialize_preset
+from random_vital_preset import generate_random_preset
+
+class CompactPresetTest(unittest.TestCase):
+    def test_round_trip(self):
+        rng = random.Random(1)
+        for preset in [generate_random_preset(rng=rng) for _ in range(10)] + [generate_random_preset(seed=2, empty_mod_chance=0)]:
+            packed = Preset.from_dict(preset)
+            self.assertEqual(packed.to_dict(), preset)
+            # Same types too, so the serialized bytes match
+            self.assertEqual(packed.serialize(), serialize_preset(preset))
+
+    def test_generate_compact_preset(self):
+        self.assertEqual(generate_compact_preset(seed=3).to_dict(), generate_random_preset(seed=3))
+
+    def test_compact_batch_matches_dict_batch(self):
+        sampler = ModulationSampler(unique=True)
+        for options in ({}, {"preset_style": "Drums", "empty_mod_chance": 10, "polyphony_range": (2, 6)}, {"modulation_sampler": sampler}):
+            expected = generate_preset_batch(25, rng=4, **options)
+            self.assertEqual([preset.to_dict() for preset in generate_compact_batch(25, rng=4, **options)], expected, options)
+
+    def test_item_access(self):
+        packed = Preset.from_dict(generate_random_preset(seed=5))
+        packed["volume"] = 1234.0
+        self.assertEqual(packed["volume"], 1234.0)
+        self.assertEqual(packed.to_dict()["settings"]["volume"], 1234.0)
+        self.assertIsNone(packed.get("no_such_setting"))
+        self.assertEqual(len(packed.values), len(LAYOUT.keys))
+
+    def test_pickle(self):
+        packed = generate_compact_batch(1, rng=6)[0]
+        self.assertEqual(pickle.loads(pickle.dumps(packed)).to_dict(), packed.to_dict())
+
+    def test_unpackable_presets(self):
+        preset = generate_random_preset(seed=7)
+        preset["settings"]["sample"]["samples"] = "AAAA"
+        with self.assertRaises(ValueError):
+            Preset.from_dict(preset)
+        preset = generate_random_preset(seed=7)
+        preset["settings"]["modulations"][0] = {"destination": "nowhere", "source": "lfo_1"}
+        with self.assertRaisesRegex(ValueError, "nowhere"):
+            Preset.from_dict(preset)
+        preset = generate_random_preset(seed=7)
+        preset["settings"]["extra"] = 1.0
+        with self.assertRaises(ValueError):
+            Preset.from_dict(preset)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import pickle
+import random
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modulation_sampler import EMPTY, AliasTable, ModulationSampler
+from random_vital_preset import PRESET_SCHEMA, generate_random_preset
+
+WEIGHTS = [5.0, 0.0, 1.0, 2.5, 0.5, 1.0]
+DRAWS = 200_000
+
+class AliasTableTest(unittest.TestCase):
+    def assertFrequencies(self, counts, weights):
+        # Every outcome within 5 standard deviations of its expected count
+        p = np.array(weights) / sum(weights)
+        expected = counts.sum() * p
+        tolerance = 5 * np.sqrt(counts.sum() * p * (1 - p)) + 1e-9
+        self.assertTrue((np.abs(counts - expected) <= tolerance).all(), (counts, expected))
+
+    def test_sample_frequencies(self):
+        table = AliasTable(WEIGHTS)
+        indices = table.sample(DRAWS, np.random.default_rng(1))
+        self.assertFrequencies(np.bincount(indices, minlength=len(WEIGHTS)), WEIGHTS)
+
+    def test_draw_frequencies(self):
+        table = AliasTable(WEIGHTS)
+        rng = random.Random(1)
+        counts = np.bincount([table.draw(rng) for _ in range(DRAWS)], minlength=len(WEIGHTS))
+        self.assertFrequencies(counts, WEIGHTS)
+        self.assertEqual(counts[1], 0)
+
+    def test_single_and_uniform_weights(self):
+        self.assertEqual(set(AliasTable([0, 0, 3]).sample(1000, np.random.default_rng(2)).tolist()), {2})
+        counts = np.bincount(AliasTable([1] * 7).sample(DRAWS, np.random.default_rng(3)))
+        self.assertFrequencies(counts, [1] * 7)
+
+    def test_bad_weights(self):
+        for weights in ([], [0, 0], [1, -1]):
+            with self.assertRaises(ValueError, msg=weights):
+                AliasTable(weights)
+
+    def test_pickle(self):
+        table = AliasTable(WEIGHTS)
+        copy = pickle.loads(pickle.dumps(table))
+        self.assertEqual(copy.sample(10, np.random.default_rng(4)).tolist(), table.sample(10, np.random.default_rng(4)).tolist())
+
+class ModulationSamplerTest(unittest.TestCase):
+    def test_weighted_matrix(self):
+        destinations = PRESET_SCHEMA.mod_destinations
+        weights = {name: 0.0 for name in destinations}
+        weights[destinations[0]], weights[destinations[1]] = 3.0, 1.0
+        sampler = ModulationSampler(destination_weights=weights)
+        destination_index, source_index = sampler.sample_matrix(2000, 25, np.random.default_rng(5))
+        empty = destination_index == EMPTY
+        self.assertTrue(((source_index == EMPTY) == empty).all())
+        self.assertAlmostEqual(empty.mean(), 0.25, delta=0.01)
+        counts = np.bincount(destination_index[~empty], minlength=2)
+        self.assertEqual(len(counts), 2)
+        self.assertAlmostEqual(counts[0] / counts.sum(), 0.75, delta=0.01)
+
+    def test_no_matrix_targets(self):
+        sampler = ModulationSampler(matrix_targets=False)
+        destination_index, _ = sampler.sample_matrix(500, 0, np.random.default_rng(6))
+        names = {PRESET_SCHEMA.mod_destinations[i] for i in np.unique(destination_index)}
+        self.assertFalse(any(name.startswith("modulation_") for name in names))
+
+    def test_unique_routings(self):
+        sampler = ModulationSampler(unique=True)
+        destination_index, source_index = sampler.sample_matrix(300, 0, np.random.default_rng(7))
+        for row in zip(destination_index.tolist(), source_index.tolist()):
+            pairs = list(zip(*row))
+            self.assertEqual(len(set(pairs)), len(pairs))
+        modulations = generate_random_preset(seed=8, empty_mod_chance=0, modulation_sampler=sampler)["settings"]["modulations"]
+        self.assertEqual(len({(m["destination"], m["source"]) for m in modulations}), len(modulations))
+
+    def test_unknown_names(self):
+        with self.assertRaisesRegex(ValueError, "no_such_source"):
+            ModulationSampler(source_weights={"no_such_source": 1.0})
+
+if __name__ == "__main__":
+    unittest.main()
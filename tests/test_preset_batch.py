@@ -0,0 +1,71 @@
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modulation_sampler import ModulationSampler
+from preset_batch import generate_preset_batch
+from random_vital_preset import FLOAT, INT, PRESET_SCHEMA, generate_random_preset
+
+def _shape(value):
+    """Keys, key order and leaf types of a preset, without the values"""
+    if isinstance(value, dict):
+        return {key: _shape(item) for key, item in value.items()}, tuple(value)
+    if isinstance(value, list):
+        return [_shape(item) for item in value]
+    return type(value)
+
+class PresetBatchTest(unittest.TestCase):
+    def assertSameLayout(self, preset, reference):
+        settings, expected = preset["settings"], reference["settings"]
+        self.assertEqual(list(preset), list(reference))
+        self.assertEqual(list(settings), list(expected))
+        for key, value in expected.items():
+            if key in ("lfos", "wavetables"):
+                # LFO point counts and keyframe counts are random, so compare one item's layout
+                self.assertEqual(len(settings[key]), len(value), key)
+                self.assertEqual(list(settings[key][0]), list(value[0]), key)
+            else:
+                self.assertEqual(_shape(settings[key]), _shape(value), key)
+
+    def test_layout_and_types_match_generate_random_preset(self):
+        reference = generate_random_preset(seed=1, empty_mod_chance=0)
+        for preset in generate_preset_batch(20, rng=1, empty_mod_chance=0):
+            self.assertSameLayout(preset, reference)
+
+    def test_values_stay_in_schema_ranges(self):
+        presets = generate_preset_batch(200, rng=2, preset_style="Bass", polyphony_range=(2, 3))
+        for spec in PRESET_SCHEMA.settings_specs:
+            if spec.kind in (FLOAT, INT):
+                values = np.array([preset["settings"][spec.key] for preset in presets])
+                self.assertTrue(((values >= spec.low) & (values <= spec.high)).all(), spec.key)
+        self.assertEqual({preset["settings"]["polyphony"] for preset in presets} - {2.0, 3.0}, set())
+        self.assertEqual({preset["preset_style"] for preset in presets}, {"Bass"})
+
+    def test_lfo_and_keyframe_invariants(self):
+        for preset in generate_preset_batch(50, rng=3):
+            for lfo in preset["settings"]["lfos"]:
+                self.assertEqual(len(lfo["points"]), 2 * lfo["num_points"])
+                self.assertEqual(len(lfo["powers"]), lfo["num_points"])
+            for wavetable in preset["settings"]["wavetables"]:
+                positions = [frame["position"] for frame in wavetable["groups"][0]["components"][0]["keyframes"]]
+                self.assertEqual(positions, sorted(positions))
+                self.assertTrue(2 <= len(positions) <= 8)
+
+    def test_seed_is_reproducible(self):
+        self.assertEqual(generate_preset_batch(5, rng=7), generate_preset_batch(5, rng=7))
+        self.assertNotEqual(generate_preset_batch(5, rng=7), generate_preset_batch(5, rng=8))
+
+    def test_modulation_sampler(self):
+        destination, source = PRESET_SCHEMA.mod_destinations[0], PRESET_SCHEMA.mod_sources[0]
+        sampler = ModulationSampler(
+            destination_weights={name: float(name == destination) for name in PRESET_SCHEMA.mod_destinations},
+            source_weights={name: float(name == source) for name in PRESET_SCHEMA.mod_sources})
+        for preset in generate_preset_batch(10, rng=4, empty_mod_chance=0, modulation_sampler=sampler):
+            self.assertEqual({(m["destination"], m["source"]) for m in preset["settings"]["modulations"]}, {(destination, source)})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import itertools
+import json
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compact_preset import Preset
+from preset_diversity import DiversityIndex, preset_features
+from random_vital_preset import generate_random_preset, iter_serialized_presets
+
+class DiversityIndexTest(unittest.TestCase):
+    def test_near_duplicates_are_rejected(self):
+        vector = preset_features(generate_random_preset(seed=1))
+        index = DiversityIndex(0.1)
+        self.assertTrue(index.add(vector))
+        self.assertFalse(index.add(vector.copy()))
+        self.assertFalse(index.add(vector + 0.01 / np.sqrt(len(vector))))
+        self.assertTrue(index.add(preset_features(generate_random_preset(seed=2))))
+        self.assertEqual((index.size, index.rejected), (2, 2))
+
+    def test_kept_vectors_are_min_distance_apart(self):
+        vectors = [preset_features(generate_random_preset(seed=seed)) for seed in range(200)]
+        # Clusters of near copies around every tenth preset
+        vectors += [vectors[i] + 0.001 * (j + 1) for i in range(0, 200, 10) for j in range(3)]
+        index = DiversityIndex(0.3)
+        kept = [vector for vector in vectors if index.add(vector)]
+        self.assertGreaterEqual(index.rejected, 60)
+        for a, b in itertools.combinations(kept, 2):
+            self.assertGreaterEqual(np.linalg.norm(a - b), 0.3)
+
+    def test_min_distance_must_be_positive(self):
+        with self.assertRaises(ValueError):
+            DiversityIndex(0)
+
+    def test_compact_preset_has_the_same_features(self):
+        preset = generate_random_preset(seed=3)
+        np.testing.assert_array_equal(preset_features(Preset.from_dict(preset)), preset_features(preset))
+
+class DiverseBankTest(unittest.TestCase):
+    def test_bank_skips_rejected_candidates(self):
+        # Pads without modulations sit closer together than random presets
+        options = {"preset_style": "Pad", "empty_mod_chance": 100}
+        index = DiversityIndex(0.33)
+        kept = list(iter_serialized_presets(30, seed=1, preset_options=options, min_distance=index))
+        self.assertEqual((len(kept), index.size), (30, 30))
+        self.assertGreater(index.rejected, 0)
+        # The bank is the unfiltered stream with the rejected candidates left out
+        candidates = iter_serialized_presets(30 + index.rejected, seed=1, preset_options=options)
+        replay = DiversityIndex(0.33)
+        expected = [(name, data) for name, data in candidates if replay.add(preset_features(json.loads(data), options))]
+        self.assertEqual(kept, expected)
+
+    def test_unreachable_distance_gives_up(self):
+        with self.assertRaisesRegex(RuntimeError, "lower the minimum distance"):
+            list(iter_serialized_presets(5, seed=1, min_distance=10.0))
+
+if __name__ == "__main__":
+    unittest.main()
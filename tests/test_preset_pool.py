@@ -0,0 +1,49 @@
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from preset_pool import PresetPool, pool_key
+
+def _wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.01)
+
+class PresetPoolTest(unittest.TestCase):
+
+    def test_bad_options_fail_before_refilling(self):
+        with PresetPool(4, 2) as pool:
+            for options in ({"polyphony_range": (5, 1)}, {"volume_range": (0, float("nan"))},
+                            {"preset_style": "Nope"}, {"mod_amount_range": (1.0,)}):
+                with self.assertRaises(ValueError):
+                    pool.take(**options)
+            self.assertIsNone(pool._thread)
+
+    def test_failed_refill_keeps_other_pools_refilling(self):
+        with PresetPool(4, 2) as pool:
+            generate = pool._generate
+            bad_key = pool_key(empty_mod_chance=10)
+
+            def failing(key, rng):
+                if key == bad_key:
+                    raise RuntimeError("broken")
+                return generate(key, rng)
+
+            pool._generate = failing
+            self.assertIsNone(pool.take(empty_mod_chance=10))
+            _wait_for(lambda: pool.stats()["refill_errors"] == 1)
+            self.assertEqual(pool.stats()["last_refill_error"], "RuntimeError: broken")
+            self.assertFalse(pool._pools[bad_key].refilling)
+
+            pool.warm(empty_mod_chance=20)
+            _wait_for(lambda: pool.stats()["refills"] == 1)
+            self.assertTrue(pool._thread.is_alive())
+            self.assertIsNotNone(pool.take(empty_mod_chance=20))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import io
+import json
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from preset_serializer import _has_orjson, dumps_preset, serialize_preset, write_preset
+from random_vital_preset import generate_random_preset
+
+def _odd_preset():
+    """A preset with the values the template encoder has to spell like json.dumps"""
+    preset = generate_random_preset(seed=3)
+    preset["comments"] = "café \"quoted\" \\ \n\t \U0001f3b9"
+    settings = preset["settings"]
+    settings.update({
+        "volume": 1e-05,
+        "voice_tune": -0.0,
+        "filter_1_cutoff": 1e16,
+        "velocity_track": float("nan"),
+        "portamento_time": float("inf"),
+        "pitch_bend_range": -float("inf"),
+        "legato": True,
+        "bypass": None,
+    })
+    settings["lfos"][0]["points"] = []
+    settings["modulations"][0] = {}
+    return preset
+
+class SerializePresetTest(unittest.TestCase):
+    def test_matches_json_dumps(self):
+        rng = random.Random(1)
+        for preset in [generate_random_preset(rng=rng) for _ in range(20)] + [_odd_preset()]:
+            expected = json.dumps(preset, indent=2)
+            self.assertEqual(dumps_preset(preset), expected)
+            self.assertEqual(serialize_preset(preset), expected.encode("utf-8"))
+
+    def test_compact_matches_json_dumps(self):
+        preset = _odd_preset()
+        self.assertEqual(serialize_preset(preset, compact=True),
+                         json.dumps(preset, separators=(",", ":")).encode("utf-8"))
+
+    def test_write_preset(self):
+        preset = generate_random_preset(seed=5)
+        out = io.BytesIO()
+        size = write_preset(preset, out)
+        self.assertEqual(out.getvalue(), serialize_preset(preset))
+        self.assertEqual(size, len(out.getvalue()))
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            serialize_preset(generate_random_preset(seed=1), backend="yaml")
+
+    def test_orjson_loads_back_equal(self):
+        if not _has_orjson():
+            self.skipTest("orjson is not installed")
+        preset = generate_random_preset(seed=2)
+        for compact in (False, True):
+            self.assertEqual(json.loads(serialize_preset(preset, compact, "orjson")), preset)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+import asyncio
+import io
+import os
+import sys
+import unittest
+import zipfile
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from preset_server import PresetServer
+from random_vital_preset import generate_vitalbank
+
+TIMESTAMP = "2024-01-01T00:00:00"
+
+class PresetServerTest(unittest.IsolatedAsyncioTestCase):
+    """Drives a PresetServer on a free local port with a bare HTTP/1.1 client"""
+
+    async def asyncSetUp(self):
+        self.server = PresetServer(max_concurrent=1)
+        self.listener = await self.server.start(port=0)
+        self.port = self.listener.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        self.listener.close()
+        await self.listener.wait_closed()
+        self.server.close()
+
+    async def _open(self, target, method="GET"):
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+        writer.write(f"{method} {target} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode("latin-1"))
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            key, value = line.split(":", 1)
+            headers[key.strip().lower()] = value.strip()
+        return reader, writer, status, headers
+
+    async def _request(self, target, method="GET"):
+        reader, writer, status, headers = await self._open(target, method)
+        if headers.get("transfer-encoding") == "chunked":
+            body = bytearray()
+            while True:
+                size = int(await reader.readline(), 16)
+                if not size:
+                    await reader.readline()
+                    break
+                body += await reader.readexactly(size)
+                await reader.readline()
+        else:
+            body = await reader.readexactly(int(headers["content-length"]))
+        writer.close()
+        await writer.wait_closed()
+        return status, headers, bytes(body)
+
+    async def _wait_idle(self):
+        for _ in range(200):
+            if not self.server.active:
+                return
+            await asyncio.sleep(0.05)
+        self.fail("bank generation did not stop")
+
+    async def test_chunked_bank(self):
+        status, headers, body = await self._request(f"/bank?count=3&seed=1&timestamp={TIMESTAMP}")
+        self.assertEqual(status, 200)
+        self.assertEqual(headers["transfer-encoding"], "chunked")
+        self.assertIn('filename="random_1.vitalbank"', headers["content-disposition"])
+        with zipfile.ZipFile(io.BytesIO(body)) as bank:
+            self.assertIsNone(bank.testzip())
+            self.assertEqual(len(bank.namelist()), 3)
+
+    async def test_seeded_bank_is_byte_identical(self):
+        target = f"/bank?count=4&seed=7&timestamp={TIMESTAMP}&preset_style=Pad"
+        _, _, first = await self._request(target)
+        _, _, second = await self._request(target)
+        expected = io.BytesIO()
+        generate_vitalbank(4, output=expected, seed=7, timestamp=datetime.fromisoformat(TIMESTAMP),
+                           preset_options={"preset_style": "Pad"})
+        self.assertEqual(first, second)
+        self.assertEqual(first, expected.getvalue())
+
+    async def test_unseeded_bank_is_named_after_its_seed(self):
+        _, headers, body = await self._request(f"/bank?count=2&timestamp={TIMESTAMP}")
+        seed = int(headers["content-disposition"].split("random_")[1].split(".")[0])
+        expected = io.BytesIO()
+        generate_vitalbank(2, output=expected, seed=seed, timestamp=datetime.fromisoformat(TIMESTAMP))
+        self.assertEqual(body, expected.getvalue())
+
+    async def test_bad_query(self):
+        for query in ("polyphony_range=5,1", "count=0", "volume_range=1,nan", "colour=red"):
+            status, _, _ = await self._request(f"/bank?{query}")
+            self.assertEqual(status, 400, query)
+
+    async def test_method_not_allowed(self):
+        status, _, _ = await self._request("/bank", "POST")
+        self.assertEqual(status, 405)
+
+    async def test_not_found(self):
+        status, _, _ = await self._request("/nope")
+        self.assertEqual(status, 404)
+
+    async def test_busy(self):
+        # The first client reads nothing, so backpressure keeps its bank in progress
+        reader, writer, status, _ = await self._open("/bank?count=5000&seed=1")
+        self.assertEqual(status, 200)
+        try:
+            status, headers, _ = await self._request("/bank?count=1")
+            self.assertEqual(status, 503)
+            self.assertEqual(headers["retry-after"], "1")
+        finally:
+            writer.close()
+            await writer.wait_closed()
+        await self._wait_idle()
+
+    async def test_client_disconnect_mid_stream(self):
+        reader, writer, status, _ = await self._open("/bank?count=5000&seed=1")
+        self.assertEqual(status, 200)
+        await reader.read(1024)
+        writer.transport.abort()
+        await self._wait_idle()
+        # The worker gave up its bank, so the single slot serves the next request
+        status, _, body = await self._request("/bank?count=2&seed=2")
+        self.assertEqual(status, 200)
+        with zipfile.ZipFile(io.BytesIO(body)) as bank:
+            self.assertEqual(len(bank.namelist()), 2)
+
+if __name__ == "__main__":
+    unittest.main()
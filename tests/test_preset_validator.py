@@ -0,0 +1,91 @@
+import copy
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compact_preset import Preset, generate_compact_batch
+from preset_batch import generate_preset_batch
+from preset_validator import (
+    FIX, KEYFRAME_ORDER, LFO_POINT_COUNT, LFO_X_ORDER, NOT_A_LIST, NOT_A_NUMBER,
+    NOT_INTEGER, OUT_OF_RANGE, REJECT, validate_preset, validate_presets,
+)
+from random_vital_preset import generate_random_preset
+
+def _broken(seed):
+    """A generated preset with one of every problem the validator fixes"""
+    preset = generate_random_preset(seed=seed)
+    settings = preset["settings"]
+    settings["volume"] = 1e9
+    settings["polyphony"] = 3.5
+    settings["voice_tune"] = "sharp"
+    del settings["legato"]
+    lfo = settings["lfos"][0]
+    lfo["points"] = lfo["points"][2:] + lfo["points"][:2]
+    settings["lfos"][1]["powers"].append(0.0)
+    keyframes = settings["wavetables"][0]["groups"][0]["components"][0]["keyframes"]
+    keyframes.reverse()
+    keyframes[0]["position"] = 300
+    return preset
+
+def _problems(issues):
+    return {(issue.key, issue.problem) for issue in issues}
+
+class ValidatorTest(unittest.TestCase):
+    def test_generated_presets_are_valid(self):
+        rng = random.Random(1)
+        self.assertTrue(validate_presets([generate_random_preset(rng=rng) for _ in range(100)]).ok)
+        self.assertTrue(validate_presets(generate_preset_batch(500, rng=1)).ok)
+        self.assertTrue(validate_presets(generate_compact_batch(500, rng=1)).ok)
+
+    def test_problems_are_reported(self):
+        problems = _problems(validate_preset(_broken(1)))
+        self.assertLessEqual({
+            ("volume", OUT_OF_RANGE), ("polyphony", NOT_INTEGER), ("voice_tune", NOT_A_NUMBER),
+            ("legato", NOT_A_NUMBER), ("lfos[0]", LFO_X_ORDER), ("lfos[1]", LFO_POINT_COUNT),
+            ("wavetables[0]", KEYFRAME_ORDER),
+        }, problems)
+
+    def test_fix_leaves_no_violations(self):
+        presets = [_broken(seed) for seed in range(20)] + generate_preset_batch(20, rng=2)
+        report = validate_presets(presets, FIX)
+        self.assertEqual(report.invalid, list(range(20)))
+        self.assertEqual(validate_presets(report.presets).summary()["problems"], {})
+
+    def test_fix_compact_presets(self):
+        presets = [Preset.from_dict(preset) for preset in generate_preset_batch(10, rng=3)]
+        presets[4]["volume"] = -5.0
+        presets[4]["delay_tempo"] = 4.4
+        self.assertEqual(validate_presets(presets, FIX).invalid, [4])
+        self.assertTrue(validate_presets(presets).ok)
+        self.assertEqual((presets[4]["volume"], presets[4]["delay_tempo"]), (0.0, 4.0))
+
+    def test_reject_keeps_valid_presets(self):
+        presets = generate_preset_batch(6, rng=4)
+        presets[2] = _broken(2)
+        report = validate_presets(presets, REJECT)
+        self.assertEqual(report.invalid, [2])
+        self.assertEqual(report.presets, presets[:2] + presets[3:])
+
+    def test_missing_sections_are_violations(self):
+        preset = generate_random_preset(seed=5)
+        del preset["settings"]["lfos"]
+        preset["settings"]["wavetables"] = None
+        self.assertEqual(_problems(validate_preset(copy.deepcopy(preset))), {("lfos", NOT_A_LIST), ("wavetables", NOT_A_LIST)})
+        self.assertEqual(validate_presets([preset], FIX).invalid, [0])
+
+    def test_chunks_and_issue_limit(self):
+        presets = [_broken(seed) for seed in range(10)]
+        report = validate_presets(presets, max_issues=5, chunk_size=3)
+        self.assertEqual(report.invalid, list(range(10)))
+        self.assertEqual(len(report.issues), 5)
+        self.assertEqual(report.counts["volume", OUT_OF_RANGE], 10)
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            validate_presets([], "ignore")
+
+if __name__ == "__main__":
+    unittest.main()
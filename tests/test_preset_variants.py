@@ -0,0 +1,70 @@
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from preset_serializer import serialize_preset
+from preset_variants import SECTION_SPECS, SECTIONS, VariantGenerator, generate_variants, write_variant_bank
+from random_vital_preset import generate_random_preset
+
+class VariantTest(unittest.TestCase):
+    def setUp(self):
+        self.base = generate_random_preset(seed=1)
+
+    def test_frame_matches_serialize_preset(self):
+        for sections in (["envelopes"], ["lfos", "modulations"], ["wavetables", "effects"], list(SECTIONS)):
+            for compact in (False, True):
+                generator = VariantGenerator(self.base, sections, compact=compact)
+                for seed in range(3):
+                    variant = generator.variant(seed=seed)
+                    self.assertEqual(generator.serialize(variant), serialize_preset(variant, compact), (sections, compact))
+
+    def test_frame_with_sections_the_base_lacks(self):
+        base = json.loads(json.dumps(self.base))
+        del base["settings"]["lfos"]
+        del base["settings"]["env_1_attack"]
+        generator = VariantGenerator(base, ["lfos", "envelopes"])
+        variant = generator.variant(seed=1)
+        self.assertEqual(list(variant["settings"])[-2:], ["lfos", "env_1_attack"])
+        self.assertEqual(generator.serialize(variant), serialize_preset(variant))
+
+    def test_only_chosen_sections_are_redrawn(self):
+        redrawn = {spec.key for spec in SECTION_SPECS["envelopes"]}
+        variant = VariantGenerator(self.base, ["envelopes"]).variant(seed=2)
+        for key, value in self.base["settings"].items():
+            if key in redrawn:
+                continue
+            self.assertIs(variant["settings"][key], value, key)
+        self.assertNotEqual({key: variant["settings"][key] for key in redrawn},
+                            {key: self.base["settings"][key] for key in redrawn})
+        self.assertEqual(self.base, generate_random_preset(seed=1))
+
+    def test_seed_is_reproducible(self):
+        self.assertEqual(generate_variants(self.base, ["filters"], 3, seed=5),
+                         generate_variants(self.base, ["filters"], 3, seed=5))
+        generator = VariantGenerator(self.base, ["filters"], name="base")
+        self.assertEqual([name for name, _ in generator.iter_serialized(2, seed=5)], ["base_0001", "base_0002"])
+
+    def test_unknown_section(self):
+        with self.assertRaisesRegex(ValueError, "chorus"):
+            VariantGenerator(self.base, ["chorus"])
+
+    def test_variant_bank_from_file(self):
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, "Warm Pad.vital")
+            with open(path, "wb") as f:
+                f.write(serialize_preset(self.base))
+            out = io.BytesIO()
+            write_variant_bank(path, ["oscillators"], 3, out, seed=1)
+        with zipfile.ZipFile(out) as bank:
+            self.assertIsNone(bank.testzip())
+            names = [os.path.basename(name) for name in bank.namelist()]
+        self.assertEqual(names, ["Warm Pad_0001.vital", "Warm Pad_0002.vital", "Warm Pad_0003.vital"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import io
+import os
+import random
+import sys
+import unittest
+import zipfile
+from datetime import datetime
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from preset_serializer import serialize_preset
+from random_vital_preset import (
+    check_preset_options, check_range, derive_seed, generate_random_preset,
+    generate_vitalbank, iter_serialized_presets, seeded_preset,
+)
+
+TIMESTAMP = datetime(2024, 1, 1)
+
+def _bank(count, **options):
+    out = io.BytesIO()
+    generate_vitalbank(count, output=out, timestamp=TIMESTAMP, **options)
+    return out.getvalue()
+
+class SeedTest(unittest.TestCase):
+    def test_seed_gives_the_same_preset(self):
+        preset = generate_random_preset(seed=11)
+        self.assertEqual(generate_random_preset(seed=11), preset)
+        self.assertIn("(seed 11)", preset["comments"])
+        # Only a seed that created the rng is recorded
+        self.assertEqual(generate_random_preset(rng=random.Random(11))["settings"], preset["settings"])
+        self.assertNotEqual(generate_random_preset(seed=12)["settings"], preset["settings"])
+
+    def test_numpy_generator(self):
+        self.assertEqual(generate_random_preset(rng=np.random.default_rng(4)),
+                         generate_random_preset(rng=np.random.default_rng(4)))
+
+    def test_rng_does_not_touch_global_state(self):
+        random.seed(5)
+        expected = random.random()
+        random.seed(5)
+        generate_random_preset(rng=random.Random(1))
+        self.assertEqual(random.random(), expected)
+
+    def test_seeded_preset_matches_bank_members(self):
+        names_and_data = list(iter_serialized_presets(3, seed=9))
+        for index, (name, data) in enumerate(names_and_data):
+            seed_name, preset = seeded_preset(derive_seed(9, index))
+            self.assertEqual((name, data), (seed_name, serialize_preset(preset)))
+
+class VitalbankSeedTest(unittest.TestCase):
+    def test_jobs_give_identical_banks(self):
+        # Enough presets for several bank chunks, so every worker gets some
+        expected = _bank(150, seed=3)
+        for jobs in (2, 4):
+            self.assertEqual(_bank(150, seed=3, jobs=jobs), expected, jobs)
+        self.assertNotEqual(_bank(150, seed=4), expected)
+
+    def test_members_are_numbered(self):
+        with zipfile.ZipFile(io.BytesIO(_bank(3, seed=1))) as bank:
+            names = [os.path.splitext(os.path.basename(name))[0] for name in bank.namelist()]
+        self.assertEqual([name.rsplit("_", 1)[1] for name in names], ["0001", "0002", "0003"])
+
+class CheckOptionsTest(unittest.TestCase):
+    def test_check_range(self):
+        self.assertEqual(check_range([1, 2]), (1, 2))
+        for value in ((2, 1), (1, float("nan")), (1,), "ab", (1, "2")):
+            with self.assertRaises(ValueError, msg=value):
+                check_range(value)
+
+    def test_check_preset_options(self):
+        check_preset_options()
+        with self.assertRaisesRegex(ValueError, "polyphony_range"):
+            check_preset_options(polyphony_range=(8, 4))
+        with self.assertRaisesRegex(ValueError, "empty_mod_chance"):
+            check_preset_options(empty_mod_chance=float("inf"))
+
+if __name__ == "__main__":
+    unittest.main()
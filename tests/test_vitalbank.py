@@ -0,0 +1,113 @@
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+import zipfile
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import vitalbank
+from random_vital_preset import generate_random_preset
+from vitalbank import VitalbankWriter, compress_member, copy_member, read_raw_member, write_raw_member
+
+TIMESTAMP = datetime(2024, 1, 1)
+
+def _bank(count, **options):
+    out = io.BytesIO()
+    with VitalbankWriter(out, timestamp=TIMESTAMP, **options) as writer:
+        for i in range(count):
+            writer.add_preset(f"preset_{i}", generate_random_preset(seed=i))
+    out.seek(0)
+    return out
+
+class RawMemberTest(unittest.TestCase):
+    """write_raw_member/read_raw_member lean on zipfile internals, so check them both ways"""
+
+    def setUp(self):
+        self._supported = vitalbank._raw_members
+
+    def tearDown(self):
+        vitalbank._raw_members = self._supported
+
+    def _round_trip(self):
+        data = json.dumps(generate_random_preset(seed=1), indent=2).encode("utf-8")
+        for compress_type in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            compressed, crc = compress_member(data, compress_type)
+            zinfo = zipfile.ZipInfo("Bank/Presets/a.vital", (2024, 1, 1, 0, 0, 0))
+            zinfo.compress_type = compress_type
+            zinfo.compress_size = len(compressed)
+            zinfo.file_size = len(data)
+            zinfo.CRC = crc
+            out = io.BytesIO()
+            with zipfile.ZipFile(out, "w") as zipf:
+                write_raw_member(zipf, zinfo, compressed)
+            with zipfile.ZipFile(out) as zipf:
+                self.assertIsNone(zipf.testzip())
+                self.assertEqual(zipf.read("Bank/Presets/a.vital"), data)
+                raw = read_raw_member(zipf, zipf.getinfo("Bank/Presets/a.vital"))
+                self.assertEqual(vitalbank._decompress_member(raw, compress_type), data)
+
+    def _copy(self):
+        src = _bank(3)
+        out = io.BytesIO()
+        with zipfile.ZipFile(src) as source, zipfile.ZipFile(out, "w") as dest:
+            for zinfo in source.infolist():
+                copy_member(source, zinfo, dest)
+        with zipfile.ZipFile(src) as source, zipfile.ZipFile(out) as copied:
+            self.assertIsNone(copied.testzip())
+            self.assertEqual(copied.namelist(), source.namelist())
+            for name in source.namelist():
+                self.assertEqual(copied.read(name), source.read(name))
+
+    def test_internals_probe_passes(self):
+        self.assertTrue(vitalbank.raw_members_supported())
+
+    def test_round_trip(self):
+        self._round_trip()
+
+    def test_copy_member(self):
+        self._copy()
+
+    def test_round_trip_without_internals(self):
+        vitalbank._raw_members = False
+        self._round_trip()
+
+    def test_copy_member_without_internals(self):
+        vitalbank._raw_members = False
+        self._copy()
+
+    def test_writer_without_internals(self):
+        expected = _bank(4).getvalue()
+        vitalbank._raw_members = False
+        with zipfile.ZipFile(io.BytesIO(expected)) as a, zipfile.ZipFile(_bank(4)) as b:
+            self.assertEqual([(i.filename, a.read(i)) for i in a.infolist()],
+                             [(i.filename, b.read(i)) for i in b.infolist()])
+
+class AbortTest(unittest.TestCase):
+    """A writer that fails partway must not leave a bank that looks complete"""
+
+    def _fail_writing(self, dest, **options):
+        with self.assertRaises(RuntimeError):
+            with VitalbankWriter(dest, timestamp=TIMESTAMP, **options) as writer:
+                for i in range(5):
+                    writer.add_preset(f"preset_{i}", generate_random_preset(seed=i))
+                raise RuntimeError("generation failed")
+
+    def test_path_is_deleted(self):
+        for compress_jobs in (1, 3):
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, "bank.vitalbank")
+                self._fail_writing(path, compress_jobs=compress_jobs)
+                self.assertFalse(os.path.exists(path))
+
+    def test_stream_is_not_a_valid_bank(self):
+        out = io.BytesIO()
+        self._fail_writing(out)
+        with self.assertRaises(zipfile.BadZipFile):
+            zipfile.ZipFile(out)
+
+if __name__ == "__main__":
+    unittest.main()
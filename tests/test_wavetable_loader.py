@@ -0,0 +1,44 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import wavetable_loader
+from wavetable_data import WAVETABLE_DATA
+
+class SidecarTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "wavetable_data.json.gz")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_current_sidecar_is_read(self):
+        wavetable_loader.write_sidecar(self.path)
+        data = wavetable_loader._read_sidecar(self.path, wavetable_loader._source_digest())
+        self.assertEqual(data, WAVETABLE_DATA)
+
+    def test_stale_sidecar_is_ignored(self):
+        wavetable_loader.write_sidecar(self.path, digest="0" * 32)
+        self.assertIsNone(wavetable_loader._read_sidecar(self.path, wavetable_loader._source_digest()))
+
+    def test_missing_or_corrupt_sidecar_is_ignored(self):
+        self.assertIsNone(wavetable_loader._read_sidecar(self.path, None))
+        with open(self.path, "wb") as f:
+            f.write(b"not gzip")
+        self.assertIsNone(wavetable_loader._read_sidecar(self.path, None))
+
+    def test_source_edit_changes_digest(self):
+        source = os.path.join(self.dir.name, "wavetable_data.py")
+        with open(source, "w") as f:
+            f.write("WAVETABLE_DATA = {}\n")
+        before = wavetable_loader._source_digest(source)
+        with open(source, "a") as f:
+            f.write("# edited\n")
+        self.assertNotEqual(wavetable_loader._source_digest(source), before)
+
+if __name__ == "__main__":
+    unittest.main()
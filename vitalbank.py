@@ -0,0 +1,404 @@
+import copy
+import io
+import os
+import pickle
+import struct
+import tempfile
+import zipfile
+import zlib
+from collections import deque
+from datetime import datetime
+
+from preset_serializer import serialize_preset
+
+def bank_folder_name(timestamp=None):
+    """Top-level folder Vital expects inside a bank, e.g. RANDOM_20240101_120000"""
+    timestamp = timestamp or datetime.now()
+    return f"RANDOM_{timestamp.strftime('%Y%m%d_%H%M%S')}"
+
+# zipfile has no public API for moving compressed bytes between archives, so
+# _read_raw/_write_raw use its header layout and writer state directly. Those
+# internals can change in any Python release, so they are only used once a
+# round trip through them checks out; otherwise members go through
+# zipfile's public read/writestr and get decompressed and recompressed.
+_raw_members = None  # whether the zipfile internals work, once probed
+
+def _read_raw(zipf, zinfo):
+    with zipf._lock:
+        zipf.fp.seek(zinfo.header_offset)
+        header = zipf.fp.read(zipfile.sizeFileHeader)
+        fields = struct.unpack(zipfile.structFileHeader, header)
+        if fields[zipfile._FH_SIGNATURE] != zipfile.stringFileHeader:
+            raise zipfile.BadZipFile(f"Bad magic number for member {zinfo.filename}")
+        # The local header's name and extra field lengths can differ from the central directory's
+        zipf.fp.seek(fields[zipfile._FH_FILENAME_LENGTH] + fields[zipfile._FH_EXTRA_FIELD_LENGTH], 1)
+        return zipf.fp.read(zinfo.compress_size)
+
+def _write_raw(zipf, zinfo, data):
+    # Sizes are known up front, so no data descriptor follows the data
+    zinfo.flag_bits &= ~zipfile._MASK_USE_DATA_DESCRIPTOR
+    # Drop any zip64 field carried over from the source; FileHeader adds its own
+    zinfo.extra = zipfile._strip_extra(zinfo.extra, (1,))
+    zip64 = zinfo.file_size > zipfile.ZIP64_LIMIT or zinfo.compress_size > zipfile.ZIP64_LIMIT
+    if zip64 and not zipf._allowZip64:
+        raise zipfile.LargeZipFile("Member would require ZIP64 extensions")
+    with zipf._lock:
+        if zipf._writing:
+            raise ValueError("Can't write to the ZIP file while another write handle is open on it")
+        if zipf._seekable:
+            zipf.fp.seek(zipf.start_dir)
+        zinfo.header_offset = zipf.fp.tell()
+        zipf._writecheck(zinfo)
+        zipf._didModify = True
+        zipf.fp.write(zinfo.FileHeader(zip64))
+        zipf.fp.write(data)
+        zipf.start_dir = zipf.fp.tell()
+        zipf.filelist.append(zinfo)
+        zipf.NameToInfo[zinfo.filename] = zinfo
+
+def _probe_raw_members():
+    """True if a member written by _write_raw reads back through zipfile and _read_raw"""
+    data = b'{"probe": true}' * 16
+    compressed, crc = compress_member(data)
+    zinfo = zipfile.ZipInfo("probe.vital", (2024, 1, 1, 0, 0, 0))
+    zinfo.compress_type = zipfile.ZIP_DEFLATED
+    zinfo.compress_size = len(compressed)
+    zinfo.file_size = len(data)
+    zinfo.CRC = crc
+    buffer = io.BytesIO()
+    try:
+        with zipfile.ZipFile(buffer, "w") as zipf:
+            _write_raw(zipf, zinfo, compressed)
+        with zipfile.ZipFile(buffer) as zipf:
+            return zipf.read("probe.vital") == data and _read_raw(zipf, zipf.getinfo("probe.vital")) == compressed
+    except Exception:
+        return False
+
+def raw_members_supported():
+    """Whether members are moved still compressed on this Python (probed once)"""
+    global _raw_members
+    if _raw_members is None:
+        _raw_members = _probe_raw_members()
+    return _raw_members
+
+def _decompress_member(data, compress_type):
+    if compress_type == zipfile.ZIP_STORED:
+        return data
+    if compress_type != zipfile.ZIP_DEFLATED:
+        raise ValueError("Only stored and deflated members are supported")
+    return zlib.decompress(data, -15)
+
+def read_raw_member(zipf, zinfo):
+    """Return the still compressed bytes of member `zinfo` of an archive open for reading
+
+    Without raw member support, the member is decompressed and compressed
+    again, so the bytes may differ from the stored ones (but not their content).
+    """
+    if raw_members_supported():
+        return _read_raw(zipf, zinfo)
+    return compress_member(zipf.read(zinfo), zinfo.compress_type)[0]
+
+def write_raw_member(zipf, zinfo, data):
+    """Append already compressed `data` as a member of an archive open for writing.
+
+    `zinfo` must describe `data`: compress_type, compress_size, CRC and
+    file_size of the uncompressed content. It is copied, so a ZipInfo read
+    from another archive can be passed as is. Without raw member support,
+    `data` is decompressed and written with writestr.
+    """
+    zinfo = copy.copy(zinfo)
+    if raw_members_supported():
+        _write_raw(zipf, zinfo, data)
+    else:
+        zipf.writestr(zinfo, _decompress_member(data, zinfo.compress_type))
+    return zinfo
+
+def copy_member(src, zinfo, dest):
+    """Copy member `zinfo` from archive `src` to `dest` without recompressing it"""
+    return write_raw_member(dest, zinfo, read_raw_member(src, zinfo))
+
+# Central directory entries spooled in memory before they move to a temp file
+_SPOOL_MAX_BYTES = 8 << 20
+
+class _SpooledFileList:
+    """Stand-in for ZipFile.filelist that keeps the written members' ZipInfos in a temp file.
+
+    A ZipFile holds on to every member's ZipInfo until close() writes the
+    central directory from them. This list only supports what writing
+    needs (append, len and one pass of iteration at close), so an archive's
+    memory use no longer grows with its member count.
+    """
+
+    def __init__(self):
+        self._file = tempfile.SpooledTemporaryFile(max_size=_SPOOL_MAX_BYTES)
+        self._count = 0
+
+    def append(self, zinfo):
+        pickle.dump(zinfo, self._file, pickle.HIGHEST_PROTOCOL)
+        self._count += 1
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        self._file.seek(0)
+        for _ in range(self._count):
+            yield pickle.load(self._file)
+
+    def close(self):
+        self._file.close()
+
+class _UnindexedNames(dict):
+    """Stand-in for ZipFile.NameToInfo that forgets names once written"""
+
+    def __setitem__(self, name, zinfo):
+        pass
+
+def streaming_zipfile(dest, compression=zipfile.ZIP_DEFLATED):
+    """A ZipFile open for writing whose memory use stays flat however many members it gets.
+
+    Members' ZipInfos are spooled to a temp file until close() writes the
+    central directory, with ZIP64 records once the archive needs them. The
+    archive can only be written: it cannot list or read its own members,
+    nor tell that a name was already written, so callers keep names unique.
+    """
+    zipf = zipfile.ZipFile(dest, 'w', compression, allowZip64=True)
+    zipf.filelist = _SpooledFileList()
+    zipf.NameToInfo = _UnindexedNames()
+    return zipf
+
+def close_streaming_zipfile(zipf):
+    """Close a streaming_zipfile and its spool"""
+    try:
+        zipf.close()
+    finally:
+        zipf.filelist.close()
+
+def discard_streaming_zipfile(zipf):
+    """Drop a streaming_zipfile without writing its central directory; its file is left open"""
+    # ZipFile.close() (also run by __del__) does nothing once it has no file
+    zipf.fp = None
+    zipf.filelist.close()
+
+# Named compression settings: (compress type, zlib level or None for zlib's default)
+COMPRESSION_LEVELS = {
+    "store": (zipfile.ZIP_STORED, None),
+    "fast": (zipfile.ZIP_DEFLATED, 1),
+    "default": (zipfile.ZIP_DEFLATED, None),
+    "best": (zipfile.ZIP_DEFLATED, 9),
+}
+
+def compress_member(data, compression=zipfile.ZIP_DEFLATED, compresslevel=None):
+    """Return (compressed bytes, CRC-32) of a member's content, as zipfile would compress it.
+
+    zlib releases the GIL while it works, so this can run on many threads at once.
+    """
+    crc = zlib.crc32(data)
+    if compression == zipfile.ZIP_STORED:
+        return data, crc
+    if compression != zipfile.ZIP_DEFLATED:
+        raise ValueError("Only stored and deflated members are supported")
+    level = zlib.Z_DEFAULT_COMPRESSION if compresslevel is None else compresslevel
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush(), crc
+
+class VitalbankWriter:
+    """Write presets straight into a .vitalbank archive.
+
+    `dest` may be a path or a binary file object (an open file, a BytesIO, a
+    socket wrapper...). Every preset is serialized in memory and stored as
+    <folder>/Presets/<name>.vital, so no intermediate .vital files are written.
+    The archive is a streaming_zipfile, so a bank of any size is written in
+    bounded memory (ZIP64 past 65535 presets).
+
+    Members are compressed with `compression` at `compresslevel` (as for
+    zipfile.ZipFile) and appended already compressed. With
+    `compress_jobs` > 1 they are compressed on that many threads while
+    earlier ones are written, still in the order they were added.
+
+    If writing fails, abort() (or leaving the with block on an exception)
+    drops the members still pending and deletes a `dest` path, so a failed
+    run never leaves a truncated bank that looks complete. A file object
+    is left without a central directory, which readers reject.
+    """
+
+    def __init__(self, dest, folder_name=None, timestamp=None, compression=zipfile.ZIP_DEFLATED, compact=False, backend="json", compresslevel=None, compress_jobs=1):
+        self.timestamp = timestamp or datetime.now()
+        self.folder_name = folder_name or bank_folder_name(self.timestamp)
+        self.compression = compression
+        self.compresslevel = compresslevel
+        self.compact = compact
+        self.backend = backend
+        self.num_presets = 0
+        self.bytes_written = 0  # uncompressed preset bytes
+        self._executor = None
+        self._max_pending = 4 * compress_jobs
+        self._pending = deque()  # (zinfo, future of compress_member)
+        if compress_jobs > 1:
+            from concurrent.futures import ThreadPoolExecutor
+            self._executor = ThreadPoolExecutor(max_workers=compress_jobs)
+        # A path is opened here rather than by zipfile, so abort() can drop it unfinished
+        self._path = dest if isinstance(dest, (str, os.PathLike)) else None
+        self._file = open(dest, "wb") if self._path is not None else None
+        self._zipf = streaming_zipfile(self._file or dest, compression)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def member_name(self, name):
+        return f"{self.folder_name}/Presets/{name}.vital"
+
+    def add_preset(self, name, preset):
+        """Serialize a preset dict and store it as `name`.vital"""
+        self.add_serialized_preset(name, serialize_preset(preset, self.compact, self.backend))
+
+    def add_serialized_preset(self, name, data):
+        """Store already serialized preset bytes as `name`.vital; names must be unique"""
+        member = self.member_name(name)
+        # Every member shares the bank timestamp so identical input gives an identical archive
+        zinfo = zipfile.ZipInfo(member, date_time=self.timestamp.timetuple()[:6])
+        zinfo.compress_type = self.compression
+        zinfo.external_attr = 0o644 << 16
+        zinfo.file_size = len(data)
+        self.num_presets += 1
+        self.bytes_written += len(data)
+        if self._executor is None:
+            self._write_member(zinfo, *compress_member(data, self.compression, self.compresslevel))
+            return
+        if len(self._pending) >= self._max_pending:
+            self._write_pending()
+        self._pending.append((zinfo, self._executor.submit(compress_member, data, self.compression, self.compresslevel)))
+
+    def _write_pending(self):
+        zinfo, future = self._pending.popleft()
+        self._write_member(zinfo, *future.result())
+
+    def _write_member(self, zinfo, compressed, crc):
+        zinfo.CRC = crc
+        zinfo.compress_size = len(compressed)
+        write_raw_member(self._zipf, zinfo, compressed)
+
+    def close(self):
+        """Write the members still pending and the central directory; on failure, abort()"""
+        try:
+            while self._pending:
+                self._write_pending()
+        except BaseException:
+            self.abort()
+            raise
+        if self._executor is not None:
+            self._executor.shutdown()
+        try:
+            close_streaming_zipfile(self._zipf)
+        finally:
+            if self._file is not None:
+                self._file.close()
+
+    def abort(self):
+        """Drop the members still pending and the unfinished archive, deleting a `dest` path"""
+        for _, future in self._pending:
+            future.cancel()
+        self._pending.clear()
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+        discard_streaming_zipfile(self._zipf)
+        if self._file is not None:
+            self._file.close()
+            try:
+                os.remove(self._path)
+            except FileNotFoundError:
+                pass
+
+def volume_path(path, index):
+    """Path of volume `index` (from 1) of a bank split from `path`, e.g. pads_001.vitalbank"""
+    root, ext = os.path.splitext(path)
+    return f"{root}_{index:03d}{ext or '.vitalbank'}"
+
+class VitalbankVolumes:
+    """Write presets into consecutive banks of at most `presets_per_volume` presets.
+
+    Volume i (from 1) is written to volume_path(`path`, i) with its own
+    top-level folder, <folder>_<i>, so Vital imports the volumes side by
+    side. Only one volume is open at a time; `paths` lists those written so
+    far. Closing without any preset still writes one empty volume, and
+    abort() deletes every volume written so far.
+    """
+
+    def __init__(self, path, presets_per_volume, folder_name=None, timestamp=None, compression=zipfile.ZIP_DEFLATED, compact=False, backend="json", compresslevel=None, compress_jobs=1):
+        if presets_per_volume < 1:
+            raise ValueError("presets_per_volume must be at least 1")
+        self.path = path
+        self.presets_per_volume = presets_per_volume
+        self.timestamp = timestamp or datetime.now()
+        self.folder_name = folder_name or bank_folder_name(self.timestamp)
+        self.compression = compression
+        self.compresslevel = compresslevel
+        self.compress_jobs = compress_jobs
+        self.compact = compact
+        self.backend = backend
+        self.num_presets = 0
+        self.bytes_written = 0
+        self.paths = []
+        self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _next_volume(self):
+        if self._writer is not None:
+            self._writer.close()
+        index = len(self.paths) + 1
+        self.paths.append(volume_path(self.path, index))
+        self._writer = VitalbankWriter(self.paths[-1], f"{self.folder_name}_{index:03d}", self.timestamp,
+                                       self.compression, self.compact, self.backend,
+                                       self.compresslevel, self.compress_jobs)
+
+    def add_preset(self, name, preset):
+        """Serialize a preset dict and store it as `name`.vital in the current volume"""
+        self.add_serialized_preset(name, serialize_preset(preset, self.compact, self.backend))
+
+    def add_serialized_preset(self, name, data):
+        """Store already serialized preset bytes, starting a new volume when the current one is full"""
+        if self._writer is None or self._writer.num_presets == self.presets_per_volume:
+            self._next_volume()
+        self._writer.add_serialized_preset(name, data)
+        self.num_presets += 1
+        self.bytes_written += len(data)
+
+    def close(self):
+        try:
+            if self._writer is None:
+                self._next_volume()
+            self._writer.close()
+        except BaseException:
+            self.abort()
+            raise
+
+    def abort(self):
+        """Drop the open volume and delete the ones already written"""
+        if self._writer is not None:
+            self._writer.abort()
+        for path in self.paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+def write_vitalbank(presets, dest, folder_name=None, timestamp=None):
+    """Write (name, preset) pairs to `dest` and return the number of presets written"""
+    with VitalbankWriter(dest, folder_name, timestamp) as writer:
+        for name, preset in presets:
+            writer.add_preset(name, preset)
+    return writer.num_presets
@@ -0,0 +1,74 @@
+import hashlib
+import json
+import os
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+SOURCE_PATH = os.path.join(_HERE, "wavetable_data.py")
+# Optional compressed copy of WAVETABLE_DATA, written by `python wavetable_loader.py`
+SIDECAR_PATH = os.path.join(_HERE, "wavetable_data.json.gz")
+
+_wavetable_data = None
+
+def _source_digest(path=SOURCE_PATH):
+    """Hex blake2b-128 digest of wavetable_data.py, or None when it is not shipped"""
+    try:
+        with open(path, "rb") as f:
+            return hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+    except FileNotFoundError:
+        return None
+
+def _read_sidecar(path, digest):
+    """WAVETABLE_DATA from the sidecar, or None if it is missing or was written from another source"""
+    import gzip
+    try:
+        with gzip.open(path, "rt", encoding="ascii") as f:
+            sidecar = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(sidecar, dict) or "data" not in sidecar:
+        return None  # written before the sidecar carried its source digest
+    if digest is not None and sidecar.get("source_digest") != digest:
+        return None
+    return sidecar["data"]
+
+def load_wavetable_data():
+    """Return WAVETABLE_DATA, loading it on first use.
+
+    Reads the compressed sidecar when it was written from the current
+    wavetable_data.py. Otherwise imports the module, and rebuilds a stale
+    sidecar from it when the directory is writable.
+    """
+    global _wavetable_data
+    if _wavetable_data is None:
+        digest = _source_digest()
+        data = _read_sidecar(SIDECAR_PATH, digest)
+        if data is None:
+            from wavetable_data import WAVETABLE_DATA
+            data = WAVETABLE_DATA
+            if os.path.exists(SIDECAR_PATH):
+                try:
+                    write_sidecar(digest=digest)
+                except OSError:
+                    pass  # read-only install: keep using the module
+        _wavetable_data = data
+    return _wavetable_data
+
+def write_sidecar(path=SIDECAR_PATH, digest=None):
+    """Write the compressed sidecar from the wavetable_data module, keyed on the digest of its source"""
+    import gzip
+    from wavetable_data import WAVETABLE_DATA
+    if digest is None:
+        digest = _source_digest()
+    # Write next to the target and swap it in, so readers never see half a file
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with gzip.open(temp_path, "wt", encoding="ascii", compresslevel=9) as f:
+            json.dump({"source_digest": digest, "data": WAVETABLE_DATA}, f)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return path
+
+if __name__ == "__main__":
+    print(f"Wrote {write_sidecar()}")